@@ -1,7 +1,10 @@
-import random
 import torch
 import numpy as np
-from CodeBase.DQNModel import AgentNetwork, ReplayBuffer
+from CodeBase.DQNModel import AgentNetwork, ReplayBuffer, PrioritizedReplayBuffer
+from CodeBase.GameState import GameState
+from CodeBase.LearnerSchedule import LearnerSchedule
+from CodeBase.PolicyExport import valid_action_masks, export_policy, build_backend, load_backend
+from CodeBase.RandomStream import RandomStream
 
 # Define agent types as constants
 AGENT_TYPE_RL = "RL"
@@ -15,21 +18,29 @@ class Agent:
     shared_optimizer = None
     shared_memory = None
     shared_update_counter = 0
+    shared_schedule = None  # LearnerSchedule
+    shared_inference = None  # frozen masked policy (PolicyExport) used instead of the eager network when set
+    shared_target_version = 0  # bumped whenever the target network's weights change
+    shared_policy_version = 0  # bumped whenever the policy network's weights change
+    frozen_policy = None  # (backend, number of agents, policy version) and the policy frozen from them
 
-    def __init__(self, agent_id, number_of_agents, health_list, settings, agent_type=None):
+    def __init__(self, agent_id, number_of_agents, health_list, settings, agent_type=None,
+                 state=None, stable_state=None, random_stream=None):
         self.number_of_agents = number_of_agents
         self.agent_id = agent_id
-        self.health_list = list(health_list) # this is reset over training loops
-        self.stable_health_list = list(health_list) #this is the actual game-variable
+        # random draws come from the owning simulation's stream
+        self.random_stream = random_stream if random_stream is not None else RandomStream(settings.seed)
+        # The agent is a view over the game's struct-of-arrays state:
+        # state is reset over training loops, stable_state is the actual game-variable
+        if state is None:
+            state = GameState(number_of_agents, health_list, settings.health_granularity)
+        if stable_state is None:
+            stable_state = GameState(number_of_agents, health_list, settings.health_granularity)
+        self.state = state
+        self.stable_state = stable_state
         self.actions = self.create_actions(agent_id, number_of_agents)
         self.latest_action = None
-        self.alliance_status = 1  # this is 1 by default, will change to 1.5 with alliance formations
-        self.stable_alliance_status = 1
         self.proposal_request = None
-        self.alliance_pair = None  # this agent object is updated as per alliance formation/breakups
-        self.stable_alliance_pair = None
-        self.is_alive = True
-        self.stable_is_alive = True
         
         # Neural network parameters
         self.settings = settings
@@ -38,6 +49,11 @@ class Agent:
         
         # Check if MPS (Metal Performance Shaders) is available for Apple Silicon
         self.device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+
+        # Valid-action mask over the whole action space (self-actions removed)
+        self.action_mask = torch.zeros(self.action_size, dtype=torch.bool)
+        self.action_mask[self.actions] = True
+        self.action_mask = self.action_mask.to(self.device)
         
         # Determine agent type based on settings or parameter
         if agent_type is None:
@@ -57,20 +73,10 @@ class Agent:
             # Initialize shared policy networks if they don't exist yet
             if Agent.shared_policy_net is None:
                 print(f"Agent {agent_id}: Initializing shared RL policy network")
-                Agent.shared_policy_net = AgentNetwork(self.state_size, settings.hidden_size, self.action_size).to(self.device)
-                Agent.shared_target_net = AgentNetwork(self.state_size, settings.hidden_size, self.action_size).to(self.device)
-                Agent.shared_target_net.load_state_dict(Agent.shared_policy_net.state_dict())
-                
-                # Use alpha for learning rate if it's meant for RL learning
-                learning_rate = settings.alpha if settings.alpha >= 0.001 else settings.learning_rate
-                Agent.shared_optimizer = torch.optim.Adam(Agent.shared_policy_net.parameters(), lr=learning_rate)
-                Agent.shared_memory = ReplayBuffer(settings.replay_buffer_size)
+                Agent.init_shared_policy(self.state_size, self.action_size, settings, self.device)
             
             # All RL agents use the shared networks
-            self.policy_net = Agent.shared_policy_net
-            self.target_net = Agent.shared_target_net
-            self.optimizer = Agent.shared_optimizer
-            self.memory = Agent.shared_memory
+            self.use_shared_policy()
         
         # Exploration parameters
         self.epsilon = settings.initial_epsilon
@@ -86,7 +92,84 @@ class Agent:
         self.Q_table = []  # Kept for compatibility but not used
         self.s_index = None  # Kept for compatibility but not used
         self.snext_index = None  # Kept for compatibility but not used
-        self.val_snext = 0
+
+    # Views over this agent's entries of the working and stable game state:
+    @property
+    def health_ticks(self):
+        # this agent's knowledge of every agent's health in integer ticks (a writable view)
+        return self.state.observed_ticks[self.agent_id]
+
+    @property
+    def health_list(self):
+        # float health values, converted from the ticks
+        return self.state.to_health(self.state.observed_ticks[self.agent_id])
+
+    @health_list.setter
+    def health_list(self, values):
+        self.state.observed_ticks[self.agent_id] = self.state.to_ticks(values)
+        self.state.touch()
+
+    @property
+    def stable_health_list(self):
+        return self.stable_state.to_health(self.stable_state.observed_ticks[self.agent_id])
+
+    @stable_health_list.setter
+    def stable_health_list(self, values):
+        self.stable_state.observed_ticks[self.agent_id] = self.stable_state.to_ticks(values)
+
+    @property
+    def is_alive(self):
+        return bool(self.state.alive[self.agent_id])
+
+    @is_alive.setter
+    def is_alive(self, value):
+        self.state.set_alive(self.agent_id, value)
+
+    @property
+    def stable_is_alive(self):
+        return bool(self.stable_state.alive[self.agent_id])
+
+    @stable_is_alive.setter
+    def stable_is_alive(self, value):
+        self.stable_state.set_alive(self.agent_id, value)
+
+    @property
+    def alliance_status(self):
+        # this is 1 by default, will change to alliance_status_weight with alliance formations
+        return float(self.state.alliance_status[self.agent_id])
+
+    @alliance_status.setter
+    def alliance_status(self, value):
+        self.state.alliance_status[self.agent_id] = value
+
+    @property
+    def stable_alliance_status(self):
+        return float(self.stable_state.alliance_status[self.agent_id])
+
+    @stable_alliance_status.setter
+    def stable_alliance_status(self, value):
+        self.stable_state.alliance_status[self.agent_id] = value
+
+    @property
+    def alliance_pair(self):
+        # this agent object is updated as per alliance formation/breakups
+        return self.state.partner_of(self.agent_id)
+
+    @alliance_pair.setter
+    def alliance_pair(self, other):
+        self.state.set_partner(self.agent_id, other)
+
+    @property
+    def stable_alliance_pair(self):
+        return self.stable_state.partner_of(self.agent_id)
+
+    @stable_alliance_pair.setter
+    def stable_alliance_pair(self, other):
+        self.stable_state.set_partner(self.agent_id, other)
+
+    def observe(self):
+        """Current state: health list + alliance status, as a new array"""
+        return np.append(self.health_list, self.alliance_status)
 
     def create_actions(self, agent_id, number_of_agents):
         acts = []
@@ -108,7 +191,7 @@ class Agent:
             return self.agent_id
             
         # Current state
-        self.current_state = self.health_list + [self.alliance_status]
+        self.current_state = self.observe()
         
         # Simple heuristic strategy:
         # 1. If health is low (≤ 1), try to recover
@@ -116,7 +199,8 @@ class Agent:
         # 3. If there's a strong opponent (health = 2), try to form alliance
         # 4. Otherwise defend
         
-        my_health = self.health_list[self.agent_id]
+        health_list = self.health_list
+        my_health = health_list[self.agent_id]
         
         # If health is low, try to recover
         if my_health <= 1:
@@ -126,14 +210,14 @@ class Agent:
         min_health = float('inf')
         weakest_opponent = None
         
-        for i in range(len(self.health_list)):
-            if i != self.agent_id and self.health_list[i] > 0:  # Skip self and dead agents
+        for i in range(len(health_list)):
+            if i != self.agent_id and health_list[i] > 0:  # Skip self and dead agents
                 # Don't attack alliance partner
                 if self.alliance_pair is not None and i == self.alliance_pair.agent_id:
                     continue
                     
-                if self.health_list[i] < min_health:
-                    min_health = self.health_list[i]
+                if health_list[i] < min_health:
+                    min_health = health_list[i]
                     weakest_opponent = i
         
         # If found a weak opponent, attack them
@@ -144,10 +228,10 @@ class Agent:
         max_health = 0
         strongest_agent = None
         
-        for i in range(len(self.health_list)):
-            if i != self.agent_id and self.health_list[i] > 0:  # Skip self and dead agents
-                if self.health_list[i] > max_health:
-                    max_health = self.health_list[i]
+        for i in range(len(health_list)):
+            if i != self.agent_id and health_list[i] > 0:  # Skip self and dead agents
+                if health_list[i] > max_health:
+                    max_health = health_list[i]
                     strongest_agent = i
                     
         # If found a strong agent and don't already have an alliance, propose alliance
@@ -161,12 +245,12 @@ class Agent:
         chosen_action = self.agent_id
         if self.is_alive == True:
             # Current state is health list + alliance status
-            self.current_state = self.health_list + [self.alliance_status]
+            self.current_state = self.observe()
             
             # Choose action based on agent type
             if self.agent_type == AGENT_TYPE_RANDOM:
                 # Random agent always chooses randomly
-                chosen_action = random.choice(self.actions)
+                chosen_action = self.random_stream.choice(self.actions)
                 
             elif self.agent_type == AGENT_TYPE_HEURISTIC:
                 # Heuristic agent uses rule-based strategy
@@ -176,26 +260,29 @@ class Agent:
                 # RL agent uses neural network with exploration
                 # Use a percentage of max_iteration instead of hardcoded 1000
                 explore_threshold = min(1000, int(self.settings.max_iteration * 0.2))
-                if t < explore_threshold or random.random() < self.epsilon:
-                    chosen_action = random.choice(self.actions)
+                if t < explore_threshold or self.random_stream.uniform() < self.epsilon:
+                    chosen_action = self.random_stream.choice(self.actions)
                 else:
                     # Use neural network for decision making
                     state_tensor = self.state_to_tensor(self.current_state)
                     with torch.no_grad():
-                        q_values = self.policy_net(state_tensor)
-                        # Filter only valid actions
-                        valid_q_values = torch.full((self.action_size,), float('-inf'))
-                        for action in self.actions:
-                            valid_q_values[action] = q_values[action]
+                        if Agent.shared_inference is not None:
+                            # the frozen policy filters the valid actions itself
+                            valid_q_values = Agent.shared_inference(
+                                state_tensor.cpu()[None], torch.tensor([self.agent_id]))[0]
+                        else:
+                            q_values = self.policy_net(state_tensor)
+                            # Filter only valid actions
+                            valid_q_values = q_values.masked_fill(~self.action_mask, float('-inf'))
                         
                         # With 95% probability choose the best action, 5% choose randomly from top 3
-                        if random.random() < 0.95:
+                        if self.random_stream.uniform() < 0.95:
                             chosen_action = valid_q_values.argmax().item()
                         else:
                             # Get top 3 actions (or fewer if not enough actions)
                             top_k = min(3, len(self.actions))
                             _, top_indices = torch.topk(valid_q_values, top_k)
-                            chosen_action = top_indices[random.randint(0, top_k-1)].item()
+                            chosen_action = top_indices[self.random_stream.integers(top_k)].item()
                 
                 # Decay epsilon only for the RL agent
                 if self.epsilon > self.min_epsilon:
@@ -203,22 +290,129 @@ class Agent:
                 
         self.latest_action = chosen_action
 
-    def compute_val_snext(self):
-        """Calculate value of next state using target network (compatible with original logic)"""
+    @property
+    def val_snext(self):
+        """Value of the agent's current observation under the target network, evaluated on first use"""
         if not self.uses_rl:
-            # For non-RL agents, just set a default value
-            self.val_snext = 0
+            return 0
+        return Agent.next_state_values(self.state)[self.agent_id]
+
+    def compute_val_snext(self):
+        """Compatibility with original logic: val_snext is now lazy, this just evaluates it"""
+        return self.val_snext
+
+    @staticmethod
+    def next_state_values(state):
+        """Target-network values of every RL agent's observation of a GameState (0 for other agents).
+
+        All RL agents are evaluated in one batched forward pass, and the result is
+        cached on the state until the state or the target network changes.
+        """
+        key = (state.version, Agent.shared_target_version)
+        if state.value_cache is not None and state.value_cache[0] == key:
+            return state.value_cache[1]
+
+        values = np.zeros(state.number_of_agents)
+        rl_agents = [agent for agent in state.agents if agent.uses_rl]
+        if rl_agents:
+            device = rl_agents[0].device
+            states_tensor = torch.as_tensor(np.stack([agent.observe() for agent in rl_agents]),
+                                            dtype=torch.float32, device=device)
+            mask = torch.stack([agent.action_mask for agent in rl_agents])
+            with torch.no_grad():
+                q_values = Agent.shared_target_net(states_tensor)
+                # Filter only valid actions
+                valid_q_values = q_values.masked_fill(~mask, float('-inf'))
+                values[[agent.agent_id for agent in rl_agents]] = valid_q_values.max(dim=1)[0].cpu().numpy()
+        state.value_cache = (key, values)
+        return values
+
+    @staticmethod
+    def init_shared_policy(state_size, action_size, settings, device):
+        """Create the shared policy and target networks, optimizer, learner schedule and replay buffer"""
+        # seeding the weight initialization without touching the global torch generator
+        with torch.random.fork_rng(devices=[]):
+            if settings.seed is not None:
+                torch.manual_seed(settings.seed)
+            Agent.shared_policy_net = AgentNetwork(state_size, settings.hidden_size, action_size).to(device)
+            Agent.shared_target_net = AgentNetwork(state_size, settings.hidden_size, action_size).to(device)
+        Agent.shared_target_net.load_state_dict(Agent.shared_policy_net.state_dict())
+        Agent.shared_policy_version += 1
+        Agent.shared_target_version += 1
+
+        # Use alpha for learning rate if it's meant for RL learning
+        learning_rate = settings.alpha if settings.alpha >= 0.001 else settings.learning_rate
+        Agent.shared_optimizer = torch.optim.Adam(Agent.shared_policy_net.parameters(), lr=learning_rate)
+        Agent.shared_schedule = LearnerSchedule(settings)
+        if settings.prioritized_replay:
+            Agent.shared_memory = PrioritizedReplayBuffer(
+                settings.replay_buffer_size, settings.per_alpha, settings.per_beta,
+                settings.per_beta_increment, settings.per_epsilon)
+        else:
+            Agent.shared_memory = ReplayBuffer(settings.replay_buffer_size)
+
+    def use_shared_policy(self):
+        """Point this RL agent at the shared networks, optimizer and replay buffer"""
+        self.policy_net = Agent.shared_policy_net
+        self.target_net = Agent.shared_target_net
+        self.optimizer = Agent.shared_optimizer
+        self.memory = Agent.shared_memory
+
+    @staticmethod
+    def reset_shared_policy(agents_list, settings):
+        """Replace the shared RL state of earlier simulations in this process with a freshly initialized
+        one sized for agents_list, so the next training starts from scratch"""
+        rl_agents = [agent for agent in agents_list if agent.uses_rl]
+        Agent.shared_update_counter = 0
+        Agent.shared_inference = None
+        if not rl_agents:
+            Agent.shared_policy_net = Agent.shared_target_net = Agent.shared_optimizer = None
+            Agent.shared_memory = Agent.shared_schedule = None
             return
-            
-        next_state_tensor = self.state_to_tensor(self.health_list + [self.alliance_status])
-        with torch.no_grad():
-            q_values = self.target_net(next_state_tensor)
-            # Filter only valid actions
-            valid_q_values = torch.full((self.action_size,), float('-inf'))
-            for action in self.actions:
-                valid_q_values[action] = q_values[action]
-            self.val_snext = valid_q_values.max().item()
-    
+        Agent.init_shared_policy(rl_agents[0].state_size, rl_agents[0].action_size, settings, rl_agents[0].device)
+        for agent in rl_agents:
+            agent.use_shared_policy()
+
+    @staticmethod
+    def attach_shared_policy(policy_net, agents_list, settings):
+        """Make policy_net (e.g. a network in shared memory) the RL agents' shared policy.
+
+        The target network is reloaded from it and a new optimizer is built over
+        its parameters; the replay buffer stays this process's own.
+        """
+        Agent.shared_policy_net = policy_net
+        Agent.shared_policy_version += 1
+        Agent.shared_target_net.load_state_dict(policy_net.state_dict())
+        Agent.shared_target_version += 1
+        learning_rate = settings.alpha if settings.alpha >= 0.001 else settings.learning_rate
+        Agent.shared_optimizer = torch.optim.Adam(policy_net.parameters(), lr=learning_rate)
+        for agent in agents_list:
+            if agent.uses_rl:
+                agent.policy_net = Agent.shared_policy_net
+                agent.optimizer = Agent.shared_optimizer
+
+    @staticmethod
+    def use_inference_backend(backend, number_of_agents, path=None):
+        """Choose how the RL agents' actions are computed.
+
+        "eager", the default of settings.inference_backend, runs
+        shared_policy_net; "torchscript", "onnx" and "quantized" run a frozen
+        masked policy, loaded from the artifact exported next to path's .pth
+        or, without a path, frozen from the current shared_policy_net. A
+        frozen policy is reused until the policy's weights change. Nothing is
+        exported unless settings.export_formats names formats (default ()).
+        """
+        if backend == "eager":
+            Agent.shared_inference = None
+        elif path is not None:
+            Agent.shared_inference = load_backend(path, backend)
+        else:
+            key = (backend, number_of_agents, Agent.shared_policy_version)
+            if Agent.frozen_policy is None or Agent.frozen_policy[0] != key:
+                Agent.frozen_policy = (key, build_backend(backend, Agent.shared_policy_net,
+                                                          valid_action_masks(number_of_agents)))
+            Agent.shared_inference = Agent.frozen_policy[1]
+
     def learn(self, state, action, reward, next_state, done):
         """Learn from experience using neural network"""
         # Only RL agents learn from experience
@@ -228,53 +422,69 @@ class Agent:
         # Store experience in shared replay buffer
         self.memory.push(state, action, reward, next_state, done)
         
-        # Need enough samples for a batch and only train periodically to reduce computation
-        if len(self.memory) < self.settings.batch_size or Agent.shared_update_counter % 3 != 0:
-            Agent.shared_update_counter += 1
+        # Only train as often as the learner schedule says, and once there are enough samples for a batch
+        triggers = Agent.shared_schedule.triggers(Agent.shared_update_counter)
+        Agent.shared_update_counter += 1
+        if len(self.memory) < self.settings.batch_size:
             return
-            
-        # Sample random batch
-        states, actions, rewards, next_states, dones = self.memory.sample(self.settings.batch_size)
-        
-        # Convert to tensors
-        states_tensor = torch.FloatTensor(states).to(self.device)
-        actions_tensor = torch.LongTensor(actions).to(self.device)
-        rewards_tensor = torch.FloatTensor(rewards).to(self.device)
-        next_states_tensor = torch.FloatTensor(next_states).to(self.device)
-        dones_tensor = torch.FloatTensor(dones).to(self.device)
-        
-        # Get current Q values
-        current_q_values = self.policy_net(states_tensor).gather(1, actions_tensor.unsqueeze(1))
+        for _ in range(triggers * Agent.shared_schedule.gradient_steps):
+            self.gradient_step()
+
+    def gradient_step(self):
+        """One gradient step of the shared policy on a sampled batch, then the target network update"""
+        schedule = Agent.shared_schedule
+
+        # Sample a batch (uniformly, or by priority with importance-sampling weights), gathered straight into tensors
+        with schedule.phase("sample"):
+            batch, indices, weights_tensor = self.memory.sample_weighted(
+                self.settings.batch_size, self.random_stream, as_tensors=True, device=self.device)
+            states_tensor, actions_tensor, rewards_tensor, next_states_tensor, dones_tensor = batch
         
-        # Compute target Q values
-        with torch.no_grad():
-            max_next_q_values = self.target_net(next_states_tensor).max(1)[0]
-            target_q_values = rewards_tensor + (1 - dones_tensor) * self.settings.beta * max_next_q_values
-            
-        # Compute loss and optimize
-        loss = torch.nn.MSELoss()(current_q_values.squeeze(), target_q_values)
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+        with schedule.phase("optimize"):
+            # Get current Q values
+            current_q_values = self.policy_net(states_tensor).gather(1, actions_tensor.unsqueeze(1)).squeeze(1)
+
+            # Compute target Q values
+            with torch.no_grad():
+                max_next_q_values = self.target_net(next_states_tensor).max(1)[0]
+                target_q_values = rewards_tensor + (1 - dones_tensor) * self.settings.beta * max_next_q_values
+
+            # Compute the (importance-weighted) squared TD error loss and optimize
+            td_errors = target_q_values - current_q_values
+            loss = (weights_tensor * td_errors.pow(2)).mean()
+            self.optimizer.zero_grad()
+            loss.backward()
+            schedule.clip_gradients(self.policy_net.parameters())
+            self.optimizer.step()
+            Agent.shared_policy_version += 1
+
+        # Re-prioritize the sampled experiences by their new TD errors
+        with schedule.phase("priorities"):
+            self.memory.update_priorities(indices, td_errors.detach().abs().cpu().numpy())
         
-        # Update target network periodically
-        Agent.shared_update_counter += 1
-        if Agent.shared_update_counter % self.settings.target_update_frequency == 0:
-            self.target_net.load_state_dict(self.policy_net.state_dict())
+        # Update target network (hard copy periodically, or soft after every step)
+        with schedule.phase("target"):
+            if schedule.update_target(self.policy_net, self.target_net):
+                Agent.shared_target_version += 1
     
     def save_model(self, path):
         """Save the trained model"""
         if self.uses_rl:
-            # Save only once for all RL agents (using agent 0)
-            if self.agent_id == 0:
+            # The policy is shared by all RL agents, so this saves all of them
+            if Agent.shared_policy_net is not None:
                 torch.save(Agent.shared_policy_net.state_dict(), f"{path}_shared_policy.pth")
                 print(f"Saved shared RL policy to {path}_shared_policy.pth")
+                for filename in export_policy(path, Agent.shared_policy_net, valid_action_masks(self.number_of_agents),
+                                              self.settings.export_formats):
+                    print(f"Exported shared RL policy to {filename}")
 
     def load_model(self, path):
         """Load a trained model"""
         if self.uses_rl:
-            # Load only once for all RL agents (using agent 0)
-            if self.agent_id == 0 and Agent.shared_policy_net is not None:
+            # The policy is shared by all RL agents, so this loads all of them
+            if Agent.shared_policy_net is not None:
                 Agent.shared_policy_net.load_state_dict(torch.load(f"{path}_shared_policy.pth", map_location=self.device))
+                Agent.shared_policy_version += 1
                 Agent.shared_target_net.load_state_dict(Agent.shared_policy_net.state_dict())
+                Agent.shared_target_version += 1
                 print(f"Loaded shared RL policy from {path}_shared_policy.pth")
\ No newline at end of file
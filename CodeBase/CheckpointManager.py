@@ -0,0 +1,115 @@
+import copy
+import glob
+import os
+import threading
+import torch
+from CodeBase.Agent import Agent
+
+
+class CheckpointManager:
+    """Periodic, resumable snapshots of the full training state.
+
+    A checkpoint holds everything a training run needs to continue where it
+    stopped: the shared policy and target networks, the optimizer state, the
+    replay buffer, the learner counters, every agent's exploration rate, the
+    simulation's random stream and the number of subgames played. Training
+    subgames always return to the initial game state, so the game itself
+    needs no saving.
+
+    save() copies the state on the training thread and writes it on a
+    background thread, to a temporary file renamed into place with
+    os.replace, so a checkpoint on disk is always complete. At most one
+    write is in flight, and only the newest keep checkpoints are kept.
+    """
+
+    def __init__(self, directory, keep=3):
+        if keep < 1:
+            raise ValueError(f"checkpoint_keep must be at least 1, got {keep}")
+        self.directory = directory
+        self.keep = keep
+        self.writer = None
+        self.error = None
+
+    def snapshot(self, simulation, subgame_count):
+        """Copy of the training state after subgame_count subgames"""
+        state = {
+            "subgame_count": subgame_count,
+            "max_subgames": simulation.max_subgames,
+            "epsilons": [agent.epsilon for agent in simulation.env.agents_list],
+            "random_stream": simulation.random_stream.state_dict(),
+            "update_counter": Agent.shared_update_counter,
+        }
+        if Agent.shared_policy_net is not None:
+            state.update(
+                policy={name: tensor.detach().cpu().clone()
+                        for name, tensor in Agent.shared_policy_net.state_dict().items()},
+                target={name: tensor.detach().cpu().clone()
+                        for name, tensor in Agent.shared_target_net.state_dict().items()},
+                optimizer=copy.deepcopy(Agent.shared_optimizer.state_dict()),
+                memory=Agent.shared_memory.state_dict(),
+                schedule=Agent.shared_schedule.state_dict(),
+            )
+        return state
+
+    def path(self, subgame_count):
+        return os.path.join(self.directory, f"checkpoint_{subgame_count:06d}.pt")
+
+    def save(self, simulation, subgame_count):
+        """Snapshot the training state now and write it in the background"""
+        state = self.snapshot(simulation, subgame_count)
+        self.wait()
+        self.writer = threading.Thread(target=self.write, args=(state, self.path(subgame_count)), daemon=True)
+        self.writer.start()
+
+    def write(self, state, path):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = path + ".tmp"
+            torch.save(state, temporary)
+            os.replace(temporary, path)
+            checkpoints = self.checkpoints()
+            for old in checkpoints[:len(checkpoints) - self.keep]:
+                os.remove(old)
+        except Exception as error:
+            self.error = error
+
+    def wait(self):
+        """Wait for the checkpoint being written, and re-raise its failure"""
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def checkpoints(self):
+        """Checkpoint files in the directory, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, "checkpoint_*.pt")))
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def restore(self, simulation, path=None):
+        """Load a checkpoint (the latest by default) into the simulation and the shared RL state;
+        returns the number of subgames it had played, 0 if there is none"""
+        path = path if path is not None else self.latest()
+        if path is None:
+            return 0
+        # the checkpoint holds numpy arrays and random generator states, not only tensors:
+        state = torch.load(path, map_location="cpu", weights_only=False)
+        simulation.max_subgames = state["max_subgames"]
+        for agent, epsilon in zip(simulation.env.agents_list, state["epsilons"]):
+            agent.epsilon = epsilon
+        simulation.random_stream.load_state_dict(state["random_stream"])
+        Agent.shared_update_counter = state["update_counter"]
+        if Agent.shared_policy_net is not None and "policy" in state:
+            Agent.shared_policy_net.load_state_dict(state["policy"])
+            Agent.shared_policy_version += 1
+            Agent.shared_target_net.load_state_dict(state["target"])
+            Agent.shared_optimizer.load_state_dict(state["optimizer"])
+            Agent.shared_memory.load_state_dict(state["memory"])
+            Agent.shared_schedule.load_state_dict(state["schedule"])
+            Agent.shared_target_version += 1
+        print(f"Resumed training from {path} after {state['subgame_count']} subgames")
+        return state["subgame_count"]
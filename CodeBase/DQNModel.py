@@ -20,24 +20,200 @@ class AgentNetwork(nn.Module):
         return self.network(x)
 
 class ReplayBuffer:
-    """Experience replay buffer for storing and sampling agent experiences"""
+    """Experience replay buffer for storing and sampling agent experiences.
+
+    Experiences live in fixed-dtype arrays preallocated at capacity (states,
+    actions, rewards, next_states, dones) and written as a ring, so a push is
+    a single slot write. The arrays are allocated on the first push, once the
+    state size is known. Sampling gathers a batch with one index array per
+    field; with as_tensors=True the gather runs on torch tensors that share
+    memory with the buffer, so the batch is copied once, straight into tensors.
+    """
     def __init__(self, capacity):
         self.capacity = capacity
-        self.buffer = []
         self.position = 0
-    
+        self.size = 0
+        self.arrays = None
+        self.tensors = None
+
+    def allocate(self, state):
+        """Preallocate the storage arrays for states shaped like the given one"""
+        state_shape = (self.capacity,) + np.shape(state)
+        self.states = np.zeros(state_shape, dtype=np.float32)
+        self.actions = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.next_states = np.zeros(state_shape, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=np.float32)
+        self.arrays = (self.states, self.actions, self.rewards, self.next_states, self.dones)
+        # torch views over the same memory:
+        self.tensors = tuple(torch.from_numpy(array) for array in self.arrays)
+
     def push(self, state, action, reward, next_state, done):
         """Add a new experience to the buffer"""
-        if len(self.buffer) < self.capacity:
-            self.buffer.append(None)
-        self.buffer[self.position] = (state, action, reward, next_state, done)
-        self.position = (self.position + 1) % self.capacity
-    
-    def sample(self, batch_size):
-        """Sample a random batch of experiences"""
-        batch = random.sample(self.buffer, min(len(self.buffer), batch_size))
-        state, action, reward, next_state, done = map(np.stack, zip(*batch))
-        return state, action, reward, next_state, done
-    
+        if self.arrays is None:
+            self.allocate(state)
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample_indices(self, batch_size, random_stream=None):
+        """Indices of a random batch, optionally drawn from a simulation's RandomStream"""
+        count = min(self.size, batch_size)
+        if random_stream is not None:
+            return np.asarray(random_stream.sample_indices(self.size, count), dtype=np.int64)
+        return np.array(random.sample(range(self.size), count), dtype=np.int64)
+
+    def gather(self, indices, as_tensors=False, device=None):
+        """The experiences at the given indices, as arrays or as torch tensors"""
+        if as_tensors:
+            index = torch.from_numpy(indices)
+            batch = tuple(tensor[index] for tensor in self.tensors)
+            if device is not None:
+                batch = tuple(tensor.to(device) for tensor in batch)
+            return batch
+        return tuple(array[indices] for array in self.arrays)
+
+    def sample(self, batch_size, random_stream=None, as_tensors=False, device=None):
+        """Sample a random batch of experiences (state, action, reward, next_state, done)"""
+        return self.gather(self.sample_indices(batch_size, random_stream), as_tensors, device)
+
+    def importance_weights(self, indices):
+        """Importance-sampling weights of sampled indices (all 1 for uniform sampling)"""
+        return np.ones(len(indices), dtype=np.float32)
+
+    def sample_weighted(self, batch_size, random_stream=None, as_tensors=False, device=None):
+        """Sample a batch together with its indices and importance-sampling weights"""
+        indices = self.sample_indices(batch_size, random_stream)
+        weights = self.importance_weights(indices)
+        if as_tensors:
+            weights = torch.from_numpy(weights)
+            if device is not None:
+                weights = weights.to(device)
+        return self.gather(indices, as_tensors, device), indices, weights
+
+    def update_priorities(self, indices, td_errors):
+        """Uniform sampling does not use priorities"""
+        pass
+
+    def state_dict(self):
+        """Copy of the stored experiences and ring position, for checkpoints"""
+        arrays = None if self.arrays is None else tuple(array.copy() for array in self.arrays)
+        return {"position": self.position, "size": self.size, "arrays": arrays}
+
+    def load_state_dict(self, state):
+        self.position = state["position"]
+        self.size = state["size"]
+        if state["arrays"] is None:
+            self.arrays = None
+            self.tensors = None
+            return
+        self.allocate(state["arrays"][0][0])
+        for array, saved in zip(self.arrays, state["arrays"]):
+            np.copyto(array, saved)
+
     def __len__(self):
-        return len(self.buffer) 
\ No newline at end of file
+        return self.size
+
+
+class SumTree:
+    """Binary tree of priority sums stored in a flat array.
+
+    Leaf i is tree[leaf_offset + i] and every inner node holds the sum of its
+    two children (the root, tree[1], is the total), so updating priorities
+    and finding the leaf that covers a prefix sum both take O(log n).
+    """
+    def __init__(self, capacity):
+        self.leaf_offset = 2
+        while self.leaf_offset < capacity:
+            self.leaf_offset *= 2
+        self.tree = np.zeros(2 * self.leaf_offset)
+
+    def total(self):
+        return self.tree[1]
+
+    def leaves(self, indices):
+        return self.tree[np.asarray(indices) + self.leaf_offset]
+
+    def update(self, indices, priorities):
+        """Set the priorities of the given leaves and refresh the sums above them, level by level"""
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaf_offset
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while True:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """Leaf index covering each prefix sum in values, descending all of them at once"""
+        values = np.minimum(np.asarray(values, dtype=float), np.nextafter(self.total(), 0))
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_offset:
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = np.where(go_right, values - self.tree[left], values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.leaf_offset
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay buffer sampling experiences in proportion to their TD error.
+
+    Each experience has priority (|TD error| + epsilon) ** alpha, kept in a
+    SumTree; new experiences get the largest priority seen so far so they are
+    replayed at least once. A batch is drawn stratified over the total
+    priority, and importance-sampling weights (N * P(i)) ** -beta, normalized
+    by their maximum, correct the bias; beta is annealed towards 1.
+    """
+    def __init__(self, capacity, alpha=0.6, beta=0.4, beta_increment=0.001, epsilon=1e-5):
+        super(PrioritizedReplayBuffer, self).__init__(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def push(self, state, action, reward, next_state, done):
+        """Add a new experience with the maximum priority"""
+        index = self.position
+        super(PrioritizedReplayBuffer, self).push(state, action, reward, next_state, done)
+        self.tree.update([index], [self.max_priority ** self.alpha])
+
+    def sample_indices(self, batch_size, random_stream=None):
+        """Indices of a batch drawn in proportion to priority, one from each equal slice of the total"""
+        count = min(self.size, batch_size)
+        draws = random_stream.uniform(count) if random_stream is not None else np.random.random(count)
+        segment = self.tree.total() / count
+        indices = self.tree.find((np.arange(count) + draws) * segment)
+        return np.minimum(indices, self.size - 1)
+
+    def importance_weights(self, indices):
+        """Normalized importance-sampling weights of sampled indices; anneals beta"""
+        probabilities = self.tree.leaves(indices) / self.tree.total()
+        weights = (self.size * probabilities) ** (-self.beta)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return (weights / weights.max()).astype(np.float32)
+
+    def state_dict(self):
+        state = super(PrioritizedReplayBuffer, self).state_dict()
+        state.update(tree=self.tree.tree.copy(), beta=self.beta, max_priority=self.max_priority)
+        return state
+
+    def load_state_dict(self, state):
+        super(PrioritizedReplayBuffer, self).load_state_dict(state)
+        np.copyto(self.tree.tree, state["tree"])
+        self.beta = state["beta"]
+        self.max_priority = state["max_priority"]
+
+    def update_priorities(self, indices, td_errors):
+        """Set new priorities from the absolute TD errors of a learned batch"""
+        priorities = np.abs(np.asarray(td_errors, dtype=float)) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
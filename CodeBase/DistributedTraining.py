@@ -0,0 +1,294 @@
+import contextlib
+import copy
+import os
+import traceback
+from queue import Empty
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from CodeBase.Agent import Agent, AGENT_TYPE_RL
+from CodeBase.DQNModel import AgentNetwork
+
+
+def split_subgames(max_subgames, num_workers):
+    """Number of subgames of each worker, as even as possible"""
+    return [max_subgames // num_workers + (worker_id < max_subgames % num_workers)
+            for worker_id in range(num_workers)]
+
+
+def worker_settings(settings, worker_id):
+    """Copy of the settings for one worker process, with its own seed"""
+    settings = copy.copy(settings)
+    if settings.seed is not None:
+        settings.seed = settings.seed + worker_id + 1
+    return settings
+
+
+def supervise_workers(queue, processes, max_subgames, on_transitions=None, progress=None, poll_interval=1.0):
+    """Merge the workers' messages until they all finish: report subgame progress (also to
+    progress(subgames_completed, max_subgames)), pass transition batches to on_transitions,
+    and re-raise a worker's failure. A worker that exits without reporting 'done' (killed,
+    out of memory) is a failure too; it is detected within two poll_interval seconds.
+    Returns each worker's final RL-agent exploration rates, as reported with its 'done'"""
+    subgame_count = 0
+    finished = {}
+    exited = set()  # workers found dead while the queue was empty
+    try:
+        while len(finished) < len(processes):
+            try:
+                message = queue.get(timeout=poll_interval)
+            except Empty:
+                # a dead worker's last messages are flushed before it exits, so a worker that was
+                # already dead at the previous empty poll and still has not finished never will:
+                for worker_id, process in enumerate(processes):
+                    if worker_id in finished or process.is_alive():
+                        continue
+                    if worker_id in exited:
+                        raise RuntimeError(f"Worker {worker_id} exited with code {process.exitcode} "
+                                           f"before finishing its subgames")
+                    exited.add(worker_id)
+                continue
+            kind, worker_id = message[0], message[1]
+            if kind == 'transitions':
+                if on_transitions is not None:
+                    on_transitions(message[2:])
+            elif kind == 'subgame':
+                subgame_count += 1
+                # Only print progress every 5 subgames to reduce console output
+                if subgame_count % 5 == 0 or subgame_count == max_subgames:
+                    print(f"Training progress: {subgame_count}/{max_subgames} subgames completed")
+                if progress is not None:
+                    progress(subgame_count, max_subgames)
+            elif kind == 'done':
+                finished[worker_id] = message[2] if len(message) > 2 else None
+            elif kind == 'error':
+                raise RuntimeError(f"Worker {worker_id} failed:\n{message[2]}")
+    finally:
+        for worker_id, process in enumerate(processes):
+            if worker_id not in finished:
+                process.terminate()
+            process.join()
+    return [finished[worker_id] for worker_id in range(len(processes))]
+
+
+def final_epsilons(simulation):
+    """The exploration rates a worker reports when it finishes, one per agent (None for non-RL agents)"""
+    return [agent.epsilon if agent.agent_type == AGENT_TYPE_RL else None for agent in simulation.env.agents_list]
+
+
+def merge_epsilons(simulation, worker_epsilons):
+    """Give the simulation's RL agents the exploration rates of all workers' decay together.
+
+    Every worker starts from settings.initial_epsilon and decays it over its own share of the
+    subgames, so the decay factors multiply to that of one process playing all of them
+    (floored at min_epsilon, where a single process stops decaying).
+    """
+    initial = simulation.settings.initial_epsilon
+    for agent_id, agent in enumerate(simulation.env.agents_list):
+        if agent.agent_type != AGENT_TYPE_RL:
+            continue
+        epsilon = initial
+        for epsilons in worker_epsilons:
+            if epsilons is not None:
+                epsilon *= epsilons[agent_id] / initial
+        agent.epsilon = max(agent.min_epsilon, epsilon)
+
+
+def start_workers(context, target, settings, max_subgames, num_workers, *args):
+    """Start num_workers processes running target(worker_id, settings, subgames, *args)"""
+    processes = []
+    for worker_id, subgames in enumerate(split_subgames(max_subgames, num_workers)):
+        process = context.Process(target=target,
+                                  args=(worker_id, worker_settings(settings, worker_id), subgames) + args,
+                                  daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def load_simulation(settings):
+    """A worker process's own Simulation, built without console output"""
+    from CodeBase.Simulation import Simulation
+    # one core per worker; the workers already run in parallel:
+    torch.set_num_threads(1)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return Simulation(settings)
+
+
+class Actor:
+    """One actor process of the distributed training mode.
+
+    Runs its own Simulation and plays training subgames with a read-only copy
+    of the learner's policy. The RL agents' transitions are sent to the
+    learner in batches instead of being learned from; after every batch the
+    actor reloads the policy if the learner has broadcast new weights.
+    """
+
+    def __init__(self, worker_id, settings, queue, broadcast_net, weights_version, weights_lock):
+        self.worker_id = worker_id
+        self.queue = queue
+        self.broadcast_net = broadcast_net
+        self.weights_version = weights_version
+        self.weights_lock = weights_lock
+        self.local_version = -1
+        self.batch_size = settings.transition_batch_size
+        self.transitions = []
+        self.simulation = load_simulation(settings)
+        self.sync_weights()
+
+    def sync_weights(self):
+        """Load the broadcast weights into the policy if they changed since the last load"""
+        if Agent.shared_policy_net is None or self.weights_version.value == self.local_version:
+            return
+        with self.weights_lock:
+            Agent.shared_policy_net.load_state_dict(self.broadcast_net.state_dict())
+            Agent.shared_policy_version += 1
+            self.local_version = self.weights_version.value
+
+    def record(self, agent, state, action, reward, next_state, done):
+        """Transition sink of Simulation.play_training_subgame"""
+        self.transitions.append((state, action, reward, next_state, done))
+        if len(self.transitions) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the pending transitions to the learner as one batch of stacked arrays"""
+        if not self.transitions:
+            return
+        states, actions, rewards, next_states, dones = zip(*self.transitions)
+        self.queue.put(('transitions', self.worker_id, np.stack(states), np.array(actions),
+                        np.array(rewards), np.stack(next_states), np.array(dones)))
+        self.transitions = []
+        self.sync_weights()
+
+    def run(self, subgames):
+        for _ in range(subgames):
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                self.simulation.play_training_subgame(learn=self.record)
+            self.flush()
+            self.queue.put(('subgame', self.worker_id))
+        return final_epsilons(self.simulation)
+
+
+def run_actor(worker_id, settings, subgames, queue, broadcast_net, weights_version, weights_lock):
+    """Entry point of an actor process; failures are reported to the learner instead of hanging it"""
+    try:
+        epsilons = Actor(worker_id, settings, queue, broadcast_net, weights_version, weights_lock).run(subgames)
+    except Exception:
+        queue.put(('error', worker_id, traceback.format_exc()))
+    else:
+        queue.put(('done', worker_id, epsilons))
+
+
+class DistributedTrainer:
+    """Learner side of the actor/learner training mode.
+
+    num_workers actor processes (see Actor) each play their share of the
+    training subgames on their own Simulation, so the game stepping runs on
+    as many cores. This process is the learner: it owns the optimizer, the
+    target network and the replay buffer of the given simulation's agents,
+    learns from every transition the actors stream in (with Agent.learn, so
+    the update cadence is the single-process one), and every
+    broadcast_interval transitions copies the policy weights into a
+    shared-memory network that the actors load from.
+    """
+
+    def __init__(self, simulation, num_workers):
+        self.simulation = simulation
+        self.settings = simulation.settings
+        self.num_workers = num_workers
+        rl_agents = [agent for agent in simulation.env.agents_list if agent.agent_type == AGENT_TYPE_RL]
+        self.learner = rl_agents[0] if rl_agents else None
+
+        # actors are spawned, so they never inherit the learner's torch threads:
+        self.context = mp.get_context('spawn')
+        self.queue = self.context.Queue(maxsize=4 * num_workers)
+        self.weights_version = self.context.Value('i', 0)
+        self.weights_lock = self.context.Lock()
+        self.broadcast_net = None
+        if self.learner is not None:
+            self.broadcast_net = AgentNetwork(self.learner.state_size, self.settings.hidden_size,
+                                              self.learner.action_size)
+            self.broadcast_net.share_memory()
+            self.broadcast()
+
+    def broadcast(self):
+        """Publish the learner's current policy weights to the actors"""
+        with self.weights_lock:
+            self.broadcast_net.load_state_dict(Agent.shared_policy_net.state_dict())
+            self.weights_version.value += 1
+
+    def learn(self, transitions):
+        """Learn from a batch of streamed transitions, broadcasting the weights when due"""
+        if self.learner is None:
+            return
+        for transition in zip(*transitions):
+            self.learner.learn(*transition)
+        self.since_broadcast += len(transitions[0])
+        if self.since_broadcast >= self.settings.broadcast_interval:
+            self.broadcast()
+            self.since_broadcast = 0
+
+    def train(self, max_subgames, progress=None):
+        """Run the actors until they have played max_subgames subgames between them"""
+        self.since_broadcast = 0
+        processes = start_workers(self.context, run_actor, self.settings, max_subgames, self.num_workers,
+                                  self.queue, self.broadcast_net, self.weights_version, self.weights_lock)
+        worker_epsilons = supervise_workers(self.queue, processes, max_subgames, self.learn, progress)
+        # the actors explored (and decayed epsilon) on this simulation's behalf:
+        merge_epsilons(self.simulation, worker_epsilons)
+
+
+def run_hogwild_worker(worker_id, settings, subgames, queue, policy_net):
+    """Entry point of a Hogwild worker: plays and learns from its subgames on the shared policy"""
+    try:
+        simulation = load_simulation(settings)
+        if policy_net is not None:
+            Agent.attach_shared_policy(policy_net, simulation.env.agents_list, settings)
+        for _ in range(subgames):
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                simulation.play_training_subgame()
+            queue.put(('subgame', worker_id))
+    except Exception:
+        queue.put(('error', worker_id, traceback.format_exc()))
+    else:
+        queue.put(('done', worker_id, final_epsilons(simulation)))
+
+
+class HogwildTrainer:
+    """Lock-free parallel training on a policy network in shared memory (Hogwild).
+
+    The RL agents' shared policy network is moved to shared memory and
+    num_workers processes each play their share of the training subgames on
+    their own Simulation, learning as usual with their own replay buffer,
+    target network and optimizer, but all applying their gradient steps
+    without locks to the same parameters. The network must be on the CPU.
+    """
+
+    def __init__(self, simulation, num_workers):
+        self.simulation = simulation
+        self.settings = simulation.settings
+        self.num_workers = num_workers
+        self.context = mp.get_context('spawn')
+        self.queue = self.context.Queue()
+        if Agent.shared_policy_net is not None:
+            Agent.shared_policy_net.share_memory()
+
+    def train(self, max_subgames, progress=None):
+        """Run the workers until they have played max_subgames subgames between them"""
+        processes = start_workers(self.context, run_hogwild_worker, self.settings, max_subgames,
+                                  self.num_workers, self.queue, Agent.shared_policy_net)
+        try:
+            worker_epsilons = supervise_workers(self.queue, processes, max_subgames, progress=progress)
+        except RuntimeError as error:
+            # the surviving workers were stopped part-way, so the shared policy is half-trained
+            # and must not be copied into the target network as a finished one:
+            raise RuntimeError("Hogwild training stopped before all subgames were played; "
+                               "the shared policy network holds a partial update") from error
+
+        # the workers trained this process's policy in place:
+        if Agent.shared_policy_net is not None:
+            Agent.shared_policy_version += 1
+            Agent.shared_target_net.load_state_dict(Agent.shared_policy_net.state_dict())
+            Agent.shared_target_version += 1
+        merge_epsilons(self.simulation, worker_epsilons)
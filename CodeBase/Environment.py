@@ -1,64 +1,111 @@
-import random
+import numpy as np
 from CodeBase.Agent import Agent
-import time
+from CodeBase.GameState import DoubleBufferedState
+from CodeBase.RandomStream import RandomStream
 
 class Environment:
 
-    def __init__(self, number_of_agents, health_list, settings):
+    def __init__(self, number_of_agents, health_list, settings, random_stream=None):
         self.number_of_agents = number_of_agents
-        self.health_list = list(health_list)
-        self.stable_health_list = list(health_list)
+        self.random_stream = random_stream if random_stream is not None else RandomStream(settings.seed)
+        # struct-of-arrays game state: state is reset over training loops, stable_state is the actual game
+        self.buffers = DoubleBufferedState(number_of_agents, health_list, settings.health_granularity)
+        self.state = self.buffers.working
+        self.stable_state = self.buffers.stable
         self.settings = settings
         self.agents_list = self.create_agents(number_of_agents, health_list, settings)
-        self.animosity_table = self.initialize_animosities(self.agents_list, settings)
-        self.stable_animosity_table = list(self.animosity_table)
+        self.state.agents = self.agents_list
+        self.stable_state.agents = self.agents_list
+        self.state.animosity[:] = self.initialize_animosities(self.agents_list, settings)
+        self.stable_state.copy_from(self.state)
         self.alpha = settings.alpha
         self.beta = settings.beta
         self.health_granularity = settings.health_granularity
         self.max_health = settings.max_health
+        self.max_health_ticks = int(round(settings.max_health / settings.health_granularity))
         # print('order of actions = n_attacks + n_alliances + defend + recover + n_accept_alliances')
 
-        print('\nInitializing the environment', end="")
-        time.sleep(1)
-        for i in range(4):
-            print('.', end="")
-            time.sleep(1)
-        print('\n')
+        print('\nInitializing the environment....\n')
 
     def create_agents(self, number_of_agents, health_list, settings):
         ags = []
         for agent_i in range(0, number_of_agents):
             # Create agent with the specified type from settings
             agent_type = settings.agent_types[agent_i] if agent_i < len(settings.agent_types) else "Random"
-            ags.append(Agent(agent_i, number_of_agents, health_list, settings, agent_type))
+            ags.append(Agent(agent_i, number_of_agents, health_list, settings, agent_type,
+                             state=self.state, stable_state=self.stable_state,
+                             random_stream=self.random_stream))
         return ags
 
     def initialize_animosities(self, agents_list, settings):
         anim_profile = settings.anim_profile
-        anim_table = []
-        for eachagent in agents_list:
-            animositylistofeachagent = []
-            for eachopponent in agents_list:
-                if eachagent == eachopponent:
-                    animositylistofeachagent.append('N/A')
-                elif anim_profile == 1:
-                    animositylistofeachagent.append(2)
-                elif anim_profile == 2:
-                    animositylistofeachagent.append(0)
-                elif anim_profile == 3:
-                    animositylistofeachagent.append(random.randrange(0, 3, 1))
-            anim_table.append(animositylistofeachagent)
+        n = len(agents_list)
+        anim_table = np.zeros((n, n), dtype=np.int8)
+        if anim_profile == 1:
+            anim_table[:] = 2
+        elif anim_profile == 3:
+            anim_table[:] = self.random_stream.integers(3, (n, n))
+        # no animosity towards oneself:
+        np.fill_diagonal(anim_table, 0)
         return anim_table
+
+    # Array views over the working and stable game state:
+    @property
+    def health_ticks(self):
+        # true health in integer ticks (a writable view)
+        return self.state.health_ticks
+
+    @property
+    def health_list(self):
+        # float health values, converted from the ticks
+        return self.state.health
+
+    @health_list.setter
+    def health_list(self, values):
+        self.state.health_ticks[:] = self.state.to_ticks(values)
+        self.state.touch()
+
+    @property
+    def stable_health_list(self):
+        return self.stable_state.health
+
+    @stable_health_list.setter
+    def stable_health_list(self, values):
+        self.stable_state.health_ticks[:] = self.stable_state.to_ticks(values)
+
+    @property
+    def animosity_table(self):
+        return self.state.animosity
+
+    @animosity_table.setter
+    def animosity_table(self, values):
+        self.state.animosity[:] = values
+        self.state.touch()
+
+    @property
+    def stable_animosity_table(self):
+        return self.stable_state.animosity
+
+    @stable_animosity_table.setter
+    def stable_animosity_table(self, values):
+        self.stable_state.animosity[:] = values
         
-    def adjust_health(self, health_value, increase=True):
-        """Adjust health according to granularity settings"""
+    def save_all_agent_models(self, path):
+        """Save the trained models; all RL agents share one policy, so it is saved once"""
+        for eachagent in self.agents_list:
+            if eachagent.uses_rl:
+                eachagent.save_model(path)
+                break
+
+    def adjust_health(self, health_ticks, increase=True):
+        """Adjust health by one tick of health_granularity"""
         if increase:
             # Increase health
-            new_health = health_value + self.health_granularity
+            new_health = health_ticks + 1
             # Cap at max health
-            return min(new_health, self.max_health)
+            return min(new_health, self.max_health_ticks)
         else:
             # Decrease health
-            new_health = health_value - self.health_granularity
+            new_health = health_ticks - 1
             # Floor at 0
             return max(new_health, 0)
\ No newline at end of file
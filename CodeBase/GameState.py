@@ -0,0 +1,197 @@
+import itertools
+import numpy as np
+
+
+class GameState:
+    """Struct-of-arrays container for the state of one game.
+
+    health_ticks      (N,)   true health of every agent, in int16 ticks of health_granularity
+    observed_ticks    (N, N) row i is agent i's knowledge of every agent's health, in ticks
+    alive             (N,)   alive mask
+    animosity         (N, N) int8 animosity levels, 0 on the diagonal
+    partner           (N,)   alliance partner index, -1 for none
+    alliance_status   (N,)   1 by default, alliance_status_weight while allied
+
+    Agents are thin views over one row/entry of these arrays, so resetting a
+    game is a handful of bulk array copies (copy_from) instead of per-agent
+    list copies.
+
+    Health is stored as whole ticks (0 .. max_health / health_granularity), so
+    it never drifts, compares exactly against 0 and indexes lookup tables
+    directly. health and observed_health convert ticks to float health values
+    for observations and display.
+
+    The state also keeps a live count and set of alive agents and the number
+    of alive agents in a mutual alliance with an alive partner. They are
+    updated only when an agent dies or an alliance forms or breaks, which
+    makes the termination check (outcome) O(1).
+
+    version identifies the state's content: it gets a new, globally unique
+    value whenever the state changes (touch) and is copied along with the
+    arrays, so values derived from a state (value_cache) can be cached per
+    version.
+    """
+
+    _versions = itertools.count()
+
+    def __init__(self, number_of_agents, health_list, health_granularity=1.0):
+        n = number_of_agents
+        self.number_of_agents = n
+        self.health_granularity = health_granularity
+        # dividing by a whole number of ticks per unit keeps values like 1.2 exact in decimal
+        self.ticks_per_unit = 1.0 / health_granularity
+        self.health_ticks = self.to_ticks(health_list)
+        self.observed_ticks = np.tile(self.health_ticks, (n, 1))
+        self.alive = np.ones(n, dtype=bool)
+        self.animosity = np.zeros((n, n), dtype=np.int8)
+        self.partner = np.full(n, -1, dtype=np.int32)
+        self.alliance_status = np.ones(n)
+        # agent objects viewing this state, used to resolve partner indices:
+        self.agents = []
+
+        # incremental alive-set and alliance tracking:
+        self.alive_count = n
+        self.alive_ids = set(range(n))
+        self.in_pair = np.zeros(n, dtype=bool)  # alive, allied, and the partner is alive and allied back
+        self.paired_count = 0
+
+        self.version = next(GameState._versions)
+        self.value_cache = None
+
+    def copy_from(self, other):
+        """Overwrite this state with another one in place, without allocating"""
+        np.copyto(self.health_ticks, other.health_ticks)
+        np.copyto(self.observed_ticks, other.observed_ticks)
+        np.copyto(self.alive, other.alive)
+        np.copyto(self.animosity, other.animosity)
+        np.copyto(self.partner, other.partner)
+        np.copyto(self.alliance_status, other.alliance_status)
+        np.copyto(self.in_pair, other.in_pair)
+        self.alive_count = other.alive_count
+        self.paired_count = other.paired_count
+        if self.alive_ids != other.alive_ids:
+            self.alive_ids.intersection_update(other.alive_ids)
+            self.alive_ids.update(other.alive_ids)
+        self.version = other.version
+        self.value_cache = other.value_cache
+
+    def touch(self):
+        """Give the state a new version after it changed"""
+        self.version = next(GameState._versions)
+
+    def to_ticks(self, health_values):
+        """int16 ticks of float health values"""
+        return np.rint(np.asarray(health_values, dtype=float) / self.health_granularity).astype(np.int16)
+
+    def to_health(self, ticks):
+        """Float health values of ticks"""
+        return ticks / self.ticks_per_unit
+
+    @property
+    def health(self):
+        """True health of every agent as floats (a new array)"""
+        return self.to_health(self.health_ticks)
+
+    @property
+    def observed_health(self):
+        """Every agent's knowledge of every agent's health as floats (a new array)"""
+        return self.to_health(self.observed_ticks)
+
+    def partner_of(self, agent_id):
+        """Agent object allied with agent_id, or None"""
+        partner = self.partner[agent_id]
+        return self.agents[partner] if partner >= 0 else None
+
+    def set_partner(self, agent_id, other):
+        """Point agent_id's alliance at another agent object (or None)"""
+        old_partner = self.partner[agent_id]
+        self.partner[agent_id] = other.agent_id if other is not None else -1
+        self._refresh_pairs((agent_id, old_partner, self.partner[agent_id]))
+        self.touch()
+
+    def set_alive(self, agent_id, value):
+        """Mark agent_id alive or dead, updating the alive set"""
+        if bool(self.alive[agent_id]) == bool(value):
+            return
+        self.alive[agent_id] = value
+        if value:
+            self.alive_count += 1
+            self.alive_ids.add(agent_id)
+        else:
+            self.alive_count -= 1
+            self.alive_ids.discard(agent_id)
+        self._refresh_pairs((agent_id, self.partner[agent_id]))
+        self.touch()
+
+    def record_bulk_update(self, alive_before, partner_before):
+        """Bring the tracking and version up to date after an engine wrote the state arrays directly"""
+        died = np.flatnonzero(alive_before & ~self.alive)
+        changed = np.flatnonzero(partner_before != self.partner)
+        self.touch()
+        if len(died) == 0 and len(changed) == 0:
+            return
+        self.alive_count -= len(died)
+        self.alive_ids.difference_update(died.tolist())
+        affected = np.concatenate([died, self.partner[died], partner_before[died],
+                                   changed, self.partner[changed], partner_before[changed]])
+        self._refresh_pairs(set(affected.tolist()))
+
+    def _refresh_pairs(self, agent_ids):
+        """Recompute the mutual-alliance flag of the given agents"""
+        for agent_id in agent_ids:
+            if agent_id < 0:
+                continue
+            partner = self.partner[agent_id]
+            paired = bool(self.alive[agent_id]) and partner >= 0 and \
+                bool(self.alive[partner]) and self.partner[partner] == agent_id
+            if paired != self.in_pair[agent_id]:
+                self.in_pair[agent_id] = paired
+                self.paired_count += 1 if paired else -1
+
+    def alive_agents(self):
+        """Alive agent objects in id order"""
+        return [self.agents[agent_id] for agent_id in sorted(self.alive_ids)]
+
+    def outcome(self):
+        """O(1) termination check.
+
+        Returns 'winner' when at most one agent is left, 'alliance' when the
+        last two agents are allied, 'all_paired' when every remaining agent
+        is allied in a pair, and None while the game is still on.
+        """
+        if self.alive_count <= 1:
+            return 'winner'
+        if self.paired_count == self.alive_count:
+            return 'alliance' if self.alive_count == 2 else 'all_paired'
+        return None
+
+
+class DoubleBufferedState:
+    """Two preallocated GameState buffers with a transactional commit/rollback API.
+
+    working is the state a step (or a training subgame) mutates; stable is the
+    last committed state. begin() opens a transaction, commit() keeps the
+    working state and rollback() discards it. Both are in-place bulk copies
+    that never allocate, and a rollback of an unchanged working state is free.
+    """
+
+    def __init__(self, number_of_agents, health_list, health_granularity=1.0):
+        self.working = GameState(number_of_agents, health_list, health_granularity)
+        self.stable = GameState(number_of_agents, health_list, health_granularity)
+        self.dirty = False  # True while working may differ from stable
+
+    def begin(self):
+        """Start a transaction from the last committed state"""
+        self.rollback()
+        self.dirty = True
+
+    def commit(self):
+        """Make the working state the new stable state"""
+        self.stable.copy_from(self.working)
+        self.dirty = False
+
+    def rollback(self):
+        """Discard the working state and return to the last committed state"""
+        if self.dirty:
+            self.working.copy_from(self.stable)
+            self.dirty = False
@@ -1,13 +1,21 @@
-import random
 import matplotlib.pyplot as plt
 import pandas as pd
+from CodeBase.RandomStream import RandomStream
+from CodeBase.TransitionTables import TransitionTables, CASE_DEFEND, CASE_RECOVER, CASE_ATTACK, CASE_ALLIANCE
 
 
 class GameStatusUpdate:
-    def __init__(self, settings):
+    def __init__(self, settings, random_stream=None, transition_tables=None):
         self.settings = settings
+        self.random_stream = random_stream if random_stream is not None else RandomStream(settings.seed)
+        self.tables = transition_tables if transition_tables is not None else TransitionTables(settings)
 
     def update(self, dynamic_env):
+        # pre-drawing every random number of this step in one block:
+        rand_health, rand_anim, rand_alliance = \
+            self.random_stream.step_draws(1, dynamic_env.number_of_agents)
+        rand_health, rand_anim, rand_alliance = rand_health[0], rand_anim[0], rand_alliance[0]
+
         # Track alliance proposals to detect cycles
         alliance_proposals = {}
         
@@ -45,7 +53,7 @@ class GameStatusUpdate:
             health_prob = 0 # default initialization #TODO: Check if the health_prob updates can be generalized
 
             for eachopponent in dynamic_env.agents_list:
-                rand_health_prob = random.uniform(0, 1)
+                rand_health_prob = rand_health[eachagent.agent_id, eachopponent.agent_id]
                 # checking if agent and opponent are not the same agent:
                 if eachagent.agent_id != eachopponent.agent_id:
                     # checking if the agent is still alive:
@@ -66,31 +74,29 @@ class GameStatusUpdate:
                         # agent is being attacked by this opponent:
                         if eachopponent.latest_action == eachagent.agent_id:  # attack of agent by the opponent
                             # updating agent's knowledge of opponent's actual health:
-                            eachagent.health_list[eachopponent.agent_id] \
-                                = dynamic_env.health_list[eachopponent.agent_id]
+                            eachagent.health_ticks[eachopponent.agent_id] \
+                                = dynamic_env.health_ticks[eachopponent.agent_id]
                             # checking for dead opponent after the above update:
                             if eachopponent.is_alive == False:
                                 continue
-                            health_prob = \
-                                self.settings.baseline_att_prob * dynamic_env.health_list[eachopponent.agent_id] * \
-                                dynamic_env.agents_list[eachopponent.agent_id].alliance_status * \
-                                self.settings.baseline_def_prob * \
-                                1 / dynamic_env.health_list[eachagent.agent_id] * \
-                                1 / dynamic_env.agents_list[eachagent.agent_id].alliance_status
+                            health_prob = self.tables.under_attack_prob(
+                                CASE_DEFEND,
+                                dynamic_env.health_ticks[eachopponent.agent_id], eachopponent.alliance_status,
+                                dynamic_env.health_ticks[eachagent.agent_id], eachagent.alliance_status)
                         # agent is not being attacked by this opponent:
                         else:
-                            health_prob = 0
+                            health_prob = self.tables.baseline[CASE_DEFEND]
                         # updating the agent's health:
                         if rand_health_prob < health_prob:
                             # updating environmental agent health:
-                            if dynamic_env.health_list[eachagent.agent_id] > 0:
-                                # Use health granularity for decreasing health
-                                dynamic_env.health_list[eachagent.agent_id] = dynamic_env.adjust_health(
-                                    dynamic_env.health_list[eachagent.agent_id], increase=False)
+                            if dynamic_env.health_ticks[eachagent.agent_id] > 0:
+                                # Decreasing health by one tick of health granularity
+                                dynamic_env.health_ticks[eachagent.agent_id] = dynamic_env.adjust_health(
+                                    dynamic_env.health_ticks[eachagent.agent_id], increase=False)
                                 # updating self agent health:
-                                eachagent.health_list[eachagent.agent_id] = dynamic_env.health_list[eachagent.agent_id]
+                                eachagent.health_ticks[eachagent.agent_id] = dynamic_env.health_ticks[eachagent.agent_id]
                             # checking if the agent is dead:
-                            if dynamic_env.health_list[eachagent.agent_id] == 0:
+                            if dynamic_env.health_ticks[eachagent.agent_id] == 0:
                                 eachagent.is_alive = False
                         # handling animosity:
                         # no change in animosity when the agent is defending against opponent
@@ -101,30 +107,29 @@ class GameStatusUpdate:
                         # agent is being attacked by this opponent:
                         if eachopponent.latest_action == eachagent.agent_id:  # attack of agent by the opponent
                             # updating agent's knowledge of opponent's actual health:
-                            eachagent.health_list[eachopponent.agent_id] \
-                                = dynamic_env.health_list[eachopponent.agent_id]
+                            eachagent.health_ticks[eachopponent.agent_id] \
+                                = dynamic_env.health_ticks[eachopponent.agent_id]
                             # checking for dead opponent after the above update:
                             if eachopponent.is_alive == False:
                                 continue
-                            health_prob = \
-                                self.settings.baseline_att_prob * \
-                                1 / dynamic_env.health_list[eachopponent.agent_id] * \
-                                1 / dynamic_env.agents_list[eachopponent.agent_id].alliance_status * \
-                                self.settings.baseline_recover_prob
+                            health_prob = self.tables.under_attack_prob(
+                                CASE_RECOVER,
+                                dynamic_env.health_ticks[eachopponent.agent_id], eachopponent.alliance_status,
+                                dynamic_env.health_ticks[eachagent.agent_id], eachagent.alliance_status)
                         # agent is not being attacked by this opponent:
                         else:
-                            health_prob = self.settings.baseline_recover_prob
+                            health_prob = self.tables.baseline[CASE_RECOVER]
                         # updating the agent's health:
                         if rand_health_prob < health_prob:
                             # updating environmental agent health:
-                            if dynamic_env.health_list[eachagent.agent_id] < dynamic_env.max_health and eachagent.is_alive == True:
-                                # Use health granularity for increasing health
-                                dynamic_env.health_list[eachagent.agent_id] = dynamic_env.adjust_health(
-                                    dynamic_env.health_list[eachagent.agent_id], increase=True)
+                            if dynamic_env.health_ticks[eachagent.agent_id] < dynamic_env.max_health_ticks and eachagent.is_alive == True:
+                                # Increasing health by one tick of health granularity
+                                dynamic_env.health_ticks[eachagent.agent_id] = dynamic_env.adjust_health(
+                                    dynamic_env.health_ticks[eachagent.agent_id], increase=True)
                                 # updating self agent health:
-                                eachagent.health_list[eachagent.agent_id] = dynamic_env.health_list[eachagent.agent_id]
+                                eachagent.health_ticks[eachagent.agent_id] = dynamic_env.health_ticks[eachagent.agent_id]
                         # handling animosity:
-                        rand_prob_recover = random.uniform(0, 1)
+                        rand_prob_recover = rand_anim[eachagent.agent_id, eachopponent.agent_id]
                         anim_level = dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id]
                         if rand_prob_recover < self.settings.animosity_decrease_prob:
                             if anim_level > 0:
@@ -140,36 +145,35 @@ class GameStatusUpdate:
                         # checking if the agent is attacking this particular opponent:
                         if eachagent.latest_action == eachopponent.agent_id:
                             # updating agent's knowledge of opponent's actual health:
-                            eachagent.health_list[eachopponent.agent_id] \
-                                = dynamic_env.health_list[eachopponent.agent_id]
+                            eachagent.health_ticks[eachopponent.agent_id] \
+                                = dynamic_env.health_ticks[eachopponent.agent_id]
                             # checking for dead opponent after the above update:
                             if eachopponent.is_alive == False:
                                 continue
                         # handling health_transition:
                         # agent is being attacked by this opponent:
                         if eachopponent.latest_action == eachagent.agent_id:  # attack of agent by the opponent
-                            health_prob = \
-                                self.settings.baseline_att_prob * \
-                                dynamic_env.health_list[eachopponent.agent_id] * \
-                                dynamic_env.agents_list[eachopponent.agent_id].alliance_status * \
-                                self.settings.baseline_underattack_attack_multiplier
+                            health_prob = self.tables.under_attack_prob(
+                                CASE_ATTACK,
+                                dynamic_env.health_ticks[eachopponent.agent_id], eachopponent.alliance_status,
+                                dynamic_env.health_ticks[eachagent.agent_id], eachagent.alliance_status)
                         # agent is not being attacked by this opponent:
                         else:
-                            health_prob = self.settings.baseline_notunderattack_attack_prob
+                            health_prob = self.tables.baseline[CASE_ATTACK]
                         # updating the agent's health:
                         if rand_health_prob < health_prob:
                             # updating environmental agent health:
-                            if dynamic_env.health_list[eachagent.agent_id] > 0:
-                                # Use health granularity for decreasing health
-                                dynamic_env.health_list[eachagent.agent_id] = dynamic_env.adjust_health(
-                                    dynamic_env.health_list[eachagent.agent_id], increase=False)
+                            if dynamic_env.health_ticks[eachagent.agent_id] > 0:
+                                # Decreasing health by one tick of health granularity
+                                dynamic_env.health_ticks[eachagent.agent_id] = dynamic_env.adjust_health(
+                                    dynamic_env.health_ticks[eachagent.agent_id], increase=False)
                                 # updating self agent health:
-                                eachagent.health_list[eachagent.agent_id] = dynamic_env.health_list[eachagent.agent_id]
+                                eachagent.health_ticks[eachagent.agent_id] = dynamic_env.health_ticks[eachagent.agent_id]
                             # checking if the agent is dead:
-                            if dynamic_env.health_list[eachagent.agent_id] == 0:
+                            if dynamic_env.health_ticks[eachagent.agent_id] == 0:
                                 eachagent.is_alive = False
                         # handling animosity:
-                        rand_prob_attack = random.uniform(0, 1)
+                        rand_prob_attack = rand_anim[eachagent.agent_id, eachopponent.agent_id]
                         anim_level = dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id]
                         if rand_prob_attack < self.settings.animosity_increase_prob:
                             if anim_level < 2:
@@ -186,27 +190,27 @@ class GameStatusUpdate:
                         # handling health_transition:
                         # agent is being attacked by this opponent:
                         if eachopponent.latest_action == eachagent.agent_id:  # attack of agent by the opponent
-                            health_prob = \
-                                self.settings.baseline_att_prob * \
-                                dynamic_env.health_list[eachopponent.agent_id] * \
-                                dynamic_env.agents_list[eachopponent.agent_id].alliance_status
+                            health_prob = self.tables.under_attack_prob(
+                                CASE_ALLIANCE,
+                                dynamic_env.health_ticks[eachopponent.agent_id], eachopponent.alliance_status,
+                                dynamic_env.health_ticks[eachagent.agent_id], eachagent.alliance_status)
                         # agent is not being attacked by this opponent:
                         else:
-                            health_prob = 0
+                            health_prob = self.tables.baseline[CASE_ALLIANCE]
                         # updating the agent's health:
                         if rand_health_prob < health_prob:
                             # updating environmental agent health:
-                            if dynamic_env.health_list[eachagent.agent_id] > 0:
-                                # Use health granularity for decreasing health
-                                dynamic_env.health_list[eachagent.agent_id] = dynamic_env.adjust_health(
-                                    dynamic_env.health_list[eachagent.agent_id], increase=False)
+                            if dynamic_env.health_ticks[eachagent.agent_id] > 0:
+                                # Decreasing health by one tick of health granularity
+                                dynamic_env.health_ticks[eachagent.agent_id] = dynamic_env.adjust_health(
+                                    dynamic_env.health_ticks[eachagent.agent_id], increase=False)
                                 # updating self agent health:
-                                eachagent.health_list[eachagent.agent_id] = dynamic_env.health_list[eachagent.agent_id]
+                                eachagent.health_ticks[eachagent.agent_id] = dynamic_env.health_ticks[eachagent.agent_id]
                             # checking if the agent is dead:
-                            if dynamic_env.health_list[eachagent.agent_id] == 0:
+                            if dynamic_env.health_ticks[eachagent.agent_id] == 0:
                                 eachagent.is_alive = False
                         # handling animosity:
-                        rand_prob_propose = random.uniform(0, 1)
+                        rand_prob_propose = rand_anim[eachagent.agent_id, eachopponent.agent_id]
                         anim_level = dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id]
                         # checking if the agent proposed alliance to this particular opponent:
                         if eachagent.latest_action == dynamic_env.number_of_agents + eachopponent.agent_id:
@@ -221,27 +225,27 @@ class GameStatusUpdate:
                         # handling health_transition:
                         # agent is being attacked by this opponent:
                         if eachopponent.latest_action == eachagent.agent_id:
-                            health_prob = \
-                                self.settings.baseline_att_prob * \
-                                dynamic_env.health_list[eachopponent.agent_id] * \
-                                dynamic_env.agents_list[eachopponent.agent_id].alliance_status
+                            health_prob = self.tables.under_attack_prob(
+                                CASE_ALLIANCE,
+                                dynamic_env.health_ticks[eachopponent.agent_id], eachopponent.alliance_status,
+                                dynamic_env.health_ticks[eachagent.agent_id], eachagent.alliance_status)
                         # agent is not being attacked by this opponent:
                         else:
-                            health_prob = 0
+                            health_prob = self.tables.baseline[CASE_ALLIANCE]
                         # updating the agent's health:
                         if rand_health_prob < health_prob:
                             # updating environmental agent health:
-                            if dynamic_env.health_list[eachagent.agent_id] > 0:
-                                # Use health granularity for decreasing health
-                                dynamic_env.health_list[eachagent.agent_id] = dynamic_env.adjust_health(
-                                    dynamic_env.health_list[eachagent.agent_id], increase=False)
+                            if dynamic_env.health_ticks[eachagent.agent_id] > 0:
+                                # Decreasing health by one tick of health granularity
+                                dynamic_env.health_ticks[eachagent.agent_id] = dynamic_env.adjust_health(
+                                    dynamic_env.health_ticks[eachagent.agent_id], increase=False)
                                 # updating self agent health:
-                                eachagent.health_list[eachagent.agent_id] = dynamic_env.health_list[eachagent.agent_id]
+                                eachagent.health_ticks[eachagent.agent_id] = dynamic_env.health_ticks[eachagent.agent_id]
                             # checking if the agent is dead:
-                            if dynamic_env.health_list[eachagent.agent_id] == 0:
+                            if dynamic_env.health_ticks[eachagent.agent_id] == 0:
                                 eachagent.is_alive = False
                         # handling animosity:
-                        rand_prob_accept = random.uniform(0, 1)
+                        rand_prob_accept = rand_anim[eachagent.agent_id, eachopponent.agent_id]
                         anim_level = dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id]
                         # checking if the agent accepted alliance from this particular opponent:
                         if eachagent.latest_action == 2 * dynamic_env.number_of_agents + 2 + eachopponent.agent_id:
@@ -250,7 +254,7 @@ class GameStatusUpdate:
                                     # decreasing the animosity level
                                     dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id] -= 1
                         # alliance_handling:
-                        rand_alliance_prob = random.uniform(0, 1)
+                        rand_alliance_prob = rand_alliance[eachagent.agent_id]
                         # checking if the agent accepted alliance from this particular opponent:
                         if eachagent.latest_action == 2 * dynamic_env.number_of_agents + 2 + eachopponent.agent_id:
                             # checking if the opponent proposed in the first place:
@@ -263,10 +267,7 @@ class GameStatusUpdate:
                                 # case where agent didn't propose, it depends on animosity:
                                 else:
                                     animos = dynamic_env.animosity_table[eachagent.agent_id][eachopponent.agent_id]
-                                    if animos != 0:
-                                        anim_alliance_prob = self.settings.alliance_prob_with_some_animosity_baseline / animos
-                                    else:
-                                        anim_alliance_prob = self.settings.alliance_prob_with_no_animosity
+                                    anim_alliance_prob = self.tables.alliance_prob[animos]
                                     # alliance formation
                                     if rand_alliance_prob < anim_alliance_prob:
                                         # First, properly dissolve any existing alliances
@@ -310,4 +311,7 @@ class GameStatusUpdate:
                     and eachagent.health_list[eachagent.latest_action] != 0:
                 c = 1/eachagent.health_list[eachagent.latest_action]
             eachagent.current_reward = a + b + c + E # (agent's own health + alliance member's health +
-            # opponent's health + action-based reward)
\ No newline at end of file
+            # opponent's health + action-based reward)
+
+        # the step changed the game state:
+        dynamic_env.state.touch()
\ No newline at end of file
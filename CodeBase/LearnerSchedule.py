@@ -0,0 +1,78 @@
+import collections
+import contextlib
+import math
+import time
+from fractions import Fraction
+import torch
+
+
+class LearnerSchedule:
+    """When and how the shared RL policy learns, configured by the Settings.
+
+    updates_per_step
+        learning triggers per environment transition passed to Agent.learn;
+        the triggers of transitions 0 .. k are floor(k * ratio) + 1, so the
+        default 1/3 learns on every third transition, starting with the first
+    gradient_steps
+        gradient steps (each on a freshly sampled batch) per trigger
+    soft_target_tau
+        0 copies the policy into the target network every
+        target_update_frequency gradient steps; tau > 0 moves the target
+        towards the policy by tau after every gradient step (Polyak averaging)
+    grad_clip_norm
+        maximum total gradient norm, None for no clipping
+
+    Target updates are done in place on the target network's parameters.
+    The wall time spent in each learning phase accumulates in timings.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.ratio = Fraction(settings.updates_per_step).limit_denominator(1000)
+        self.gradient_steps = settings.gradient_steps
+        self.soft_target_tau = settings.soft_target_tau
+        self.grad_clip_norm = settings.grad_clip_norm
+        self.target_update_frequency = settings.target_update_frequency
+        self.gradient_step_count = 0
+        self.timings = collections.defaultdict(float)
+
+    def triggers(self, transition_count):
+        """Number of learning triggers due on the given (0-based) transition"""
+        return math.floor(transition_count * self.ratio) - math.floor((transition_count - 1) * self.ratio)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a phase of learning into timings[name]"""
+        start = time.perf_counter()
+        yield
+        self.timings[name] += time.perf_counter() - start
+
+    def clip_gradients(self, parameters):
+        if self.grad_clip_norm is not None:
+            torch.nn.utils.clip_grad_norm_(parameters, self.grad_clip_norm)
+
+    def update_target(self, policy_net, target_net):
+        """Update the target network after a gradient step; True if its weights changed"""
+        self.gradient_step_count += 1
+        if self.soft_target_tau > 0:
+            with torch.no_grad():
+                for target_param, param in zip(target_net.parameters(), policy_net.parameters()):
+                    target_param.lerp_(param, self.soft_target_tau)
+            return True
+        if self.gradient_step_count % self.target_update_frequency == 0:
+            with torch.no_grad():
+                for target_param, param in zip(target_net.parameters(), policy_net.parameters()):
+                    target_param.copy_(param)
+            return True
+        return False
+
+    def state_dict(self):
+        """Position in the target update cycle, for checkpoints (timings describe one run only)"""
+        return {"gradient_step_count": self.gradient_step_count}
+
+    def load_state_dict(self, state):
+        self.gradient_step_count = state["gradient_step_count"]
+
+    def report(self):
+        """Wall time per learning phase, e.g. 'sample 0.41s, optimize 2.10s, target 0.05s'"""
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
@@ -0,0 +1,105 @@
+import contextlib
+import os
+import numpy as np
+import torch
+from CodeBase.Agent import Agent, AGENT_TYPE_RL
+from CodeBase.GameState import GameState
+from CodeBase.PolicyExport import valid_action_masks, build_backend
+
+
+class PolicyEvaluation:
+    """Compares an inference backend of the trained shared policy with the float policy.
+
+    Plays the same batch of final games on a (trained) Simulation once with
+    the eager float network and once with the backend: every game starts
+    from the simulation's initial state, with the same seed and the same
+    exploration rates for both. Reports the fraction of the float games'
+    RL decisions on which the backend picks the same greedy action, and
+    each model's win rate (games won by a single RL agent).
+    """
+
+    def __init__(self, simulation, games=20, seed=0):
+        self.simulation = simulation
+        self.games = games
+        self.seed = seed
+        self.env = simulation.env
+        self.rl_agents = [agent for agent in self.env.agents_list if agent.agent_type == AGENT_TYPE_RL]
+        self.action_masks = valid_action_masks(self.env.number_of_agents)
+
+        # snapshots to restart every game from:
+        state = self.env.state
+        self.initial_state = GameState(state.number_of_agents, [0.0] * state.number_of_agents,
+                                       self.env.health_granularity)
+        self.initial_state.copy_from(state)
+        self.initial_epsilons = [agent.epsilon for agent in self.rl_agents]
+
+    def restart(self, game):
+        """Reset the simulation to the initial state for the given game of the batch"""
+        buffers = self.env.buffers
+        buffers.working.copy_from(self.initial_state)
+        buffers.stable.copy_from(self.initial_state)
+        buffers.working.touch()
+        buffers.dirty = False
+        for agent, epsilon in zip(self.rl_agents, self.initial_epsilons):
+            agent.epsilon = epsilon
+        self.simulation.random_stream.reseed(self.seed + game)
+        self.simulation.stalemate_detector.reset()
+        self.simulation.game_is_on = True
+        self.simulation.current_step = 0
+
+    def play(self, inference, record=None):
+        """Play the batch of games with the given frozen policy (None = eager); returns the RL win rate"""
+        simulation = self.simulation
+        Agent.shared_inference = inference
+        wins = 0
+        for game in range(self.games):
+            self.restart(game)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                while simulation.game_is_on and simulation.current_step < simulation.max_iteration:
+                    if record is not None:
+                        for agent in self.rl_agents:
+                            if agent.is_alive:
+                                record.append((agent.observe(), agent.agent_id))
+                    simulation.update_time_step()
+                    simulation.current_step += 1
+            state = self.env.state
+            if state.outcome() == 'winner' and state.alive_agents()[0].agent_type == AGENT_TYPE_RL:
+                wins += 1
+        return wins / self.games
+
+    def greedy_actions(self, inference, states, agent_ids):
+        with torch.no_grad():
+            return inference(torch.as_tensor(states, dtype=torch.float32),
+                             torch.as_tensor(agent_ids, dtype=torch.int64)).argmax(dim=1).numpy()
+
+    def evaluate(self, backend="quantized"):
+        """Action agreement and win rates of a backend against the float policy;
+        leaves the simulation at its initial state"""
+        previous_inference = Agent.shared_inference
+        decisions = []
+        try:
+            float_win_rate = self.play(None, decisions)
+            inference = build_backend(backend, Agent.shared_policy_net, self.action_masks)
+            backend_win_rate = self.play(inference)
+        finally:
+            Agent.shared_inference = previous_inference
+            self.restart(0)
+
+        agreement = float('nan')
+        if decisions:
+            states = np.stack([observation for observation, _ in decisions])
+            agent_ids = [agent_id for _, agent_id in decisions]
+            reference = build_backend("torchscript", Agent.shared_policy_net, self.action_masks)
+            agreement = float(np.mean(self.greedy_actions(reference, states, agent_ids) ==
+                                      self.greedy_actions(inference, states, agent_ids)))
+        return {"backend": backend, "games": self.games, "decisions": len(decisions),
+                "action_agreement": agreement, "float_win_rate": float_win_rate,
+                "backend_win_rate": backend_win_rate}
+
+    def report(self, backend="quantized"):
+        """Evaluate a backend and print the comparison"""
+        result = self.evaluate(backend)
+        print(f"{backend} vs float policy over {result['games']} games: "
+              f"action agreement {result['action_agreement']:.1%} on {result['decisions']} decisions, "
+              f"RL win rate {result['backend_win_rate']:.1%} (float {result['float_win_rate']:.1%})")
+        return result
@@ -0,0 +1,125 @@
+import copy
+import io
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+
+EXPORT_SUFFIXES = {"torchscript": "_shared_policy.pt", "onnx": "_shared_policy.onnx",
+                   "quantized": "_shared_policy_int8.pt"}
+
+
+def valid_action_masks(number_of_agents):
+    """(N, 3N + 2) valid-action mask of every agent: all actions but its own attack, proposal and acceptance"""
+    n = number_of_agents
+    masks = np.ones((n, 3 * n + 2), dtype=bool)
+    ids = np.arange(n)
+    masks[ids, ids] = False
+    masks[ids, n + ids] = False
+    masks[ids, 2 * n + 2 + ids] = False
+    return masks
+
+
+class MaskedPolicy(nn.Module):
+    """Inference graph of the shared policy with the agents' valid-action masks fused in.
+
+    forward(states, agent_ids) returns the Q-values of a batch of observations,
+    with every action the observing agent cannot take set to -inf.
+    """
+
+    def __init__(self, policy_net, action_masks):
+        super(MaskedPolicy, self).__init__()
+        self.policy_net = copy.deepcopy(policy_net).cpu().eval()
+        self.register_buffer("action_masks", torch.as_tensor(action_masks, dtype=torch.bool))
+
+    def forward(self, states, agent_ids):
+        q_values = self.policy_net(states)
+        return q_values.masked_fill(~self.action_masks[agent_ids], float('-inf'))
+
+
+def freeze_policy(policy_net, action_masks):
+    """Frozen TorchScript graph of the masked policy"""
+    # newer torch releases deprecate TorchScript in favour of torch.export, which cannot be loaded without Python:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        module = torch.jit.script(MaskedPolicy(policy_net, action_masks).eval())
+        return torch.jit.freeze(module)
+
+
+def quantize_policy(policy_net):
+    """Copy of the policy with its Linear layers dynamically quantized to int8 (weights stored as int8,
+    activations quantized on the fly), for CPU inference"""
+    engines = torch.backends.quantized.supported_engines
+    if torch.backends.quantized.engine == "none":
+        torch.backends.quantized.engine = "qnnpack" if "qnnpack" in engines else engines[0]
+    # torch.ao.quantization moves to the torchao package in newer torch releases:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(policy_net).cpu().eval(),
+                                                      {nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(policy_net, action_masks, destination):
+    """Write the masked policy as an ONNX graph with a dynamic batch size to a filename or file object"""
+    module = MaskedPolicy(policy_net, action_masks).eval()
+    number_of_agents = len(action_masks)
+    example = (torch.zeros(1, number_of_agents + 1), torch.zeros(1, dtype=torch.int64))
+    torch.onnx.export(module, example, destination, input_names=["states", "agent_ids"],
+                      output_names=["q_values"],
+                      dynamic_axes={"states": {0: "batch"}, "agent_ids": {0: "batch"}, "q_values": {0: "batch"}},
+                      dynamo=False)
+
+
+def export_policy(path, policy_net, action_masks, formats=("torchscript",)):
+    """Export the masked policy next to the .pth written by Agent.save_model; returns the written files"""
+    written = []
+    for backend in formats:
+        if backend not in EXPORT_SUFFIXES:
+            raise ValueError(f"Unknown export format: {backend}")
+        filename = f"{path}{EXPORT_SUFFIXES[backend]}"
+        if backend in ("torchscript", "quantized"):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", FutureWarning)
+                torch.jit.save(build_backend(backend, policy_net, action_masks), filename)
+        else:
+            export_onnx(policy_net, action_masks, filename)
+        written.append(filename)
+    return written
+
+
+class OnnxPolicy:
+    """ONNX Runtime session with the MaskedPolicy call interface (needs the onnxruntime package)"""
+
+    def __init__(self, model):
+        import onnxruntime
+        self.session = onnxruntime.InferenceSession(model, providers=["CPUExecutionProvider"])
+
+    def __call__(self, states, agent_ids):
+        q_values = self.session.run(None, {"states": states.numpy().astype(np.float32),
+                                           "agent_ids": agent_ids.numpy().astype(np.int64)})[0]
+        return torch.from_numpy(q_values)
+
+
+def build_backend(backend, policy_net, action_masks):
+    """Inference backend frozen in memory from the current policy network"""
+    if backend == "torchscript":
+        return freeze_policy(policy_net, action_masks)
+    if backend == "quantized":
+        return freeze_policy(quantize_policy(policy_net), action_masks)
+    if backend == "onnx":
+        buffer = io.BytesIO()
+        export_onnx(policy_net, action_masks, buffer)
+        return OnnxPolicy(buffer.getvalue())
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def load_backend(path, backend="torchscript"):
+    """Inference backend loaded from an exported artifact, without any training-time objects"""
+    if backend not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    filename = f"{path}{EXPORT_SUFFIXES[backend]}"
+    if backend in ("torchscript", "quantized"):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            return torch.jit.load(filename, map_location="cpu")
+    return OnnxPolicy(filename)
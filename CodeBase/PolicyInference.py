@@ -0,0 +1,71 @@
+import numpy as np
+import torch
+from CodeBase.Agent import Agent, AGENT_TYPE_RL
+
+
+class PolicyInference:
+    """Step-level inference stage for the RL agents' shared policy.
+
+    Instead of one forward pass per RL agent, the observations of every RL
+    agent that exploits this step are stacked and Agent.shared_policy_net is
+    run once. Each row is restricted to its agent's valid actions by a mask
+    precomputed at construction, and the 95% argmax / 5% top-3 rule of
+    Agent.choose_action is applied to all rows at once.
+    """
+
+    def __init__(self, agents_list, settings, random_stream):
+        self.settings = settings
+        self.random_stream = random_stream
+        self.rl_agents = [agent for agent in agents_list if agent.agent_type == AGENT_TYPE_RL]
+        self.device = self.rl_agents[0].device if self.rl_agents else torch.device("cpu")
+        self.explore_threshold = min(1000, int(settings.max_iteration * 0.2))
+
+        # valid-action mask of every agent, indexed by agent id:
+        number_of_agents = len(agents_list)
+        self.action_masks = np.zeros((number_of_agents, number_of_agents * 3 + 2), dtype=bool)
+        for agent in agents_list:
+            self.action_masks[agent.agent_id, agent.actions] = True
+        self.action_masks_tensor = torch.as_tensor(self.action_masks, device=self.device)
+        self.top_k = min(3, int(self.action_masks.sum(axis=1).min()))
+
+    def select(self, states, agent_ids):
+        """Actions for stacked (M, state_size) observations of the given agents from one forward pass"""
+        with torch.no_grad():
+            if Agent.shared_inference is not None:
+                # the frozen policy has the masks fused in:
+                valid_q_values = Agent.shared_inference(torch.as_tensor(states, dtype=torch.float32),
+                                                        torch.as_tensor(agent_ids, dtype=torch.int64))
+            else:
+                state_tensor = torch.as_tensor(states, dtype=torch.float32, device=self.device)
+                mask = self.action_masks_tensor[torch.as_tensor(agent_ids, device=self.device)]
+                q_values = Agent.shared_policy_net(state_tensor)
+                valid_q_values = q_values.masked_fill(~mask, float('-inf'))
+            greedy = valid_q_values.argmax(dim=1).cpu().numpy()
+            # With 95% probability choose the best action, 5% choose randomly from top 3
+            top_indices = torch.topk(valid_q_values, self.top_k, dim=1).indices.cpu().numpy()
+        count = len(greedy)
+        pick = top_indices[np.arange(count), self.random_stream.integers(self.top_k, count)]
+        return np.where(self.random_stream.uniform(count) < 0.95, greedy, pick)
+
+    def choose_actions(self, t):
+        """Choose the action of every RL agent for time step t (t is the step until which they explore)"""
+        exploiting = []
+        for agent in self.rl_agents:
+            if not agent.is_alive:
+                agent.latest_action = agent.agent_id
+                continue
+            agent.current_state = agent.observe()
+            if t < self.explore_threshold or self.random_stream.uniform() < agent.epsilon:
+                agent.latest_action = self.random_stream.choice(agent.actions)
+            else:
+                exploiting.append(agent)
+
+            # Decay epsilon only for the RL agent
+            if agent.epsilon > agent.min_epsilon:
+                agent.epsilon *= agent.epsilon_decay
+
+        if exploiting:
+            states = np.stack([agent.current_state for agent in exploiting])
+            actions = self.select(states, [agent.agent_id for agent in exploiting])
+            for agent, action in zip(exploiting, actions):
+                agent.latest_action = int(action)
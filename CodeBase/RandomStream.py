@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class RandomStream:
+    """Seeded random stream owned by one Simulation.
+
+    Uniform numbers are generated in blocks by a single vectorized call to a
+    NumPy Generator and handed out in order, so a step's (or many steps')
+    worth of draws costs one call instead of one per agent pair. Every
+    consumer of a simulation (engine, agents, replay sampling) shares the
+    stream, so a given seed reproduces the same game bit for bit and
+    simulations running in the same process do not interfere.
+    """
+
+    def __init__(self, seed=None, block_size=1 << 16):
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.block = np.empty(0)
+        self.position = 0
+
+    def reseed(self, seed):
+        """Restart the stream from a seed, discarding the current block"""
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self.block = np.empty(0)
+        self.position = 0
+
+    def state_dict(self):
+        """Everything needed to continue the stream exactly, for checkpoints"""
+        return {"seed": self.seed, "generator": self.generator.bit_generator.state,
+                "block": self.block.copy(), "position": self.position}
+
+    def load_state_dict(self, state):
+        self.seed = state["seed"]
+        self.generator.bit_generator.state = state["generator"]
+        self.block = state["block"].copy()
+        self.position = state["position"]
+
+    def uniform(self, shape=None):
+        """Uniform numbers in [0, 1): a float, or an array of the given shape"""
+        count = 1 if shape is None else int(np.prod(shape))
+        if self.position + count > len(self.block):
+            # drawing the next block in one vectorized call:
+            self.block = self.generator.random(max(self.block_size, count))
+            self.position = 0
+        values = self.block[self.position:self.position + count]
+        self.position += count
+        if shape is None:
+            return float(values[0])
+        return values.reshape(shape)
+
+    def integers(self, high, shape=None):
+        """Integers in [0, high): an int, or an array of the given shape"""
+        if shape is None:
+            return min(int(self.uniform() * high), high - 1)
+        return np.minimum((self.uniform(shape) * high).astype(np.int64), high - 1)
+
+    def choice(self, sequence):
+        """A uniformly chosen element of a sequence"""
+        return sequence[self.integers(len(sequence))]
+
+    def sample_indices(self, population, count):
+        """count distinct indices from range(population)"""
+        return self.generator.choice(population, size=count, replace=False)
+
+    def binomial(self, counts, prob):
+        """Binomial draws for arrays of trial counts and success probabilities"""
+        return self.generator.binomial(counts, prob)
+
+    def step_draws(self, batch_size, number_of_agents):
+        """Every draw the combat engines need for one step of a batch of games:
+        per-pair health and animosity draws and a per-agent alliance draw"""
+        shape = (batch_size, number_of_agents, number_of_agents)
+        rand_health = self.uniform(shape)
+        rand_anim = self.uniform(shape)
+        rand_alliance = self.uniform((batch_size, number_of_agents))
+        return rand_health, rand_anim, rand_alliance
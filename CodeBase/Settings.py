@@ -75,7 +75,51 @@ class Settings:
         self.alliance_prob_with_some_animosity_baseline = 0.5 # Alliance probability with animosity
         self.alliance_prob_with_no_animosity = 0.8 # Alliance probability without animosity
         self.alliance_status_weight = 1.9 # Alliance status weight
-        
+
+        # Combat resolution engine
+        # "loop" = reference nested-loop engine (GameStatusUpdate)
+        # "vectorized" = the lockstep games' kernel (VectorizedGameStatusUpdate) run on one game; same
+        #                results as "loop" but slower, for checking the kernel (see num_parallel_games)
+        # "sparse" = engine resolving only the step's interaction edges (SparseGameStatusUpdate),
+        #            for battles with thousands of agents where most of them defend, propose or accept
+        #            (an attacking or recovering agent still updates its whole animosity row)
+        self.combat_engine = "loop"
+
+        # Number of training subgames stepped in lockstep on stacked arrays
+        # 1 = one subgame at a time, > 1 = VectorEnvironment with that many games resolved by one kernel
+        #     call per step; with the vectorized kernel, a few dozen stacked games step several times
+        #     faster per game than the loop engine
+        self.num_parallel_games = 1
+
+        # Training mode
+        # "local" = train in this process (see num_parallel_games)
+        # "distributed" = num_workers actor processes play the subgames and stream their
+        #                 transitions to this process, the learner (DistributedTrainer)
+        # "hogwild" = num_workers processes play and learn on one policy network in shared
+        #             memory, without locks (HogwildTrainer)
+        self.training_mode = "local"
+        self.num_workers = 2 # Worker processes of the parallel training modes
+        self.transition_batch_size = 64 # Transitions an actor sends to the learner at once
+        self.broadcast_interval = 256 # Transitions the learner learns from between weight broadcasts
+
+        # Random seed for the simulation's random stream (None = nondeterministic)
+        # A given seed reproduces the same game bit for bit
+        self.seed = None
+
+        # Stalemate detection (StalemateDetector), in every training mode and the final game
+        # A game ends once every state for stalemate_patience steps repeats one of the
+        # last stalemate_window states (identical states or cycles up to that length).
+        # Any revisit within the window counts, so cycling games end too;
+        # stalemate_window = 1 restores the original rule (no change for stalemate_patience steps)
+        self.stalemate_window = 8
+        self.stalemate_patience = 100
+
+        # Training checkpoints (CheckpointManager), for one-process training
+        self.checkpoint_interval = 0 # Subgames between checkpoints (0 = no checkpoints)
+        self.checkpoint_dir = "checkpoints" # Directory the checkpoints are written to
+        self.checkpoint_keep = 3 # Number of most recent checkpoints kept on disk (at least 1)
+        self.resume_training = False # Continue training from the latest checkpoint in checkpoint_dir
+
         # Neural network hyperparameters - optimized for faster learning
         self.learning_rate = 0.001 # Learning rate for neural network
         self.target_update_frequency = 10 # Target network update frequency (increased from 5)
@@ -86,6 +130,29 @@ class Settings:
         self.min_epsilon = 0.1 # Minimum exploration rate (increased from 0.05)
         self.hidden_size = 64 # Hidden layer size (reduced from 128)
 
+        # Learner update schedule (LearnerSchedule)
+        self.updates_per_step = 1/3 # Learning triggers per RL transition (1/3 = every third transition)
+        self.gradient_steps = 1 # Gradient steps, each on a new batch of batch_size, per trigger
+        self.soft_target_tau = 0.0 # 0 = copy to the target network every target_update_frequency
+                                   # gradient steps, > 0 = Polyak-average it by tau after every step
+        self.grad_clip_norm = None # Maximum gradient norm (None = no clipping)
+
+        # Inference
+        self.export_formats = () # Frozen policies Agent.save_model writes next to the .pth
+                                 # ("torchscript", "quantized", and "onnx" with the onnx package)
+        self.inference_backend = "eager" # How the final game runs the policy: "eager" (the training network),
+                                         # "torchscript" or "onnx" (frozen masked policy, see PolicyExport),
+                                         # "quantized" (frozen int8 dynamically quantized policy, for CPU serving;
+                                         # compare it with the float policy using PolicyEvaluation)
+
+        # Prioritized experience replay (PrioritizedReplayBuffer)
+        # False = uniform replay sampling
+        self.prioritized_replay = False
+        self.per_alpha = 0.6 # How strongly TD error shapes sampling (0 = uniform)
+        self.per_beta = 0.4 # Initial importance-sampling correction, annealed to 1
+        self.per_beta_increment = 0.001 # Beta increase per sampled batch
+        self.per_epsilon = 1e-5 # Added to |TD error| so no experience has zero priority
+
     def check_game_state(self):
         alive_agents = [agent for agent in self.env.agents_list if agent.is_alive]
         
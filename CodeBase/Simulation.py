@@ -3,12 +3,34 @@ import itertools
 import time
 import os
 import torch
+from CodeBase.Agent import Agent
 from CodeBase.Environment import Environment
 from CodeBase.GameStatusUpdate import GameStatusUpdate
+from CodeBase.VectorizedGameStatusUpdate import VectorizedGameStatusUpdate
+from CodeBase.SparseGameStatusUpdate import SparseGameStatusUpdate
+from CodeBase.VectorEnvironment import VectorEnvironment
+from CodeBase.RandomStream import RandomStream
+from CodeBase.StalemateDetector import StalemateDetector
+from CodeBase.TransitionTables import TransitionTables
+from CodeBase.PolicyInference import PolicyInference
+from CodeBase.DistributedTraining import DistributedTrainer, HogwildTrainer
+from CodeBase.CheckpointManager import CheckpointManager
 
 class Simulation:
     def __init__(self, settings):
-        self.game_status_update = GameStatusUpdate(settings)
+        # every random draw of this simulation comes from its own seeded stream:
+        self.random_stream = RandomStream(settings.seed)
+
+        # precomputing every transition probability for these settings:
+        self.transition_tables = TransitionTables(settings)
+
+        # selecting the combat resolution engine:
+        if settings.combat_engine == "vectorized":
+            self.game_status_update = VectorizedGameStatusUpdate(settings, self.random_stream, self.transition_tables)
+        elif settings.combat_engine == "sparse":
+            self.game_status_update = SparseGameStatusUpdate(settings, self.random_stream, self.transition_tables)
+        else:
+            self.game_status_update = GameStatusUpdate(settings, self.random_stream, self.transition_tables)
         self.settings = settings
         number_of_agents = self.settings.number_of_agents
 
@@ -25,7 +47,7 @@ class Simulation:
             for eachagent in range(number_of_agents):
                 # Generate random health with the specified granularity
                 steps = int(settings.max_health / settings.health_granularity) + 1
-                random_step = random.randrange(0, steps)
+                random_step = self.random_stream.integers(steps)
                 random_health = random_step * settings.health_granularity
                 start_health_list.append(random_health)
         elif starting_health_config == 4: #half-half
@@ -35,18 +57,28 @@ class Simulation:
                 else:
                     start_health_list.append(settings.max_health)
 
-        self.env = Environment(number_of_agents, start_health_list, self.settings)
+        self.env = Environment(number_of_agents, start_health_list, self.settings, self.random_stream)
+        # all RL agents choose their actions from one batched forward pass per step:
+        self.policy_inference = PolicyInference(self.env.agents_list, self.settings, self.random_stream)
         self.max_iteration = self.settings.max_iteration
         self.game_is_on = True
         self.max_subgames = 100  # Maximum number of subgames for training
         self.current_step = 0  # Track current time step
         
-        # Initialize state history tracking for stalemate detection
-        self.state_history = []
-        self.stalemate_counter = 0  # Counter for detecting stalemates
+        # Rolling-hash stalemate detection, shared by training and the final game
+        self.stalemate_detector = StalemateDetector(number_of_agents, self.settings)
+
+        # Training state snapshots for resuming interrupted runs
+        self.checkpoints = CheckpointManager(self.settings.checkpoint_dir, self.settings.checkpoint_keep)
+
+    def train(self, num_workers=None, progress=None):
+        """Train the agents for 100 subgames.
 
-    def train(self):
-        """Train the agents for 100 subgames"""
+        The parallel training modes split the subgames across num_workers
+        processes (settings.num_workers by default). progress, if given, is
+        called as progress(subgames_completed, max_subgames) after every
+        completed subgame.
+        """
         print('\n=== TRAINING PHASE ===')
         print('Agents are now training', end="")
         time.sleep(1)
@@ -68,85 +100,165 @@ class Simulation:
             self.max_subgames = 10
             
         print(f"Training {rl_agent_count} RL agents for {self.max_subgames} subgames")
+        training_started = time.perf_counter()
+        # training acts with the network being trained, never with a frozen copy:
+        Agent.use_inference_backend("eager", self.settings.number_of_agents)
         
+        if num_workers is None:
+            num_workers = self.settings.num_workers
+        if self.settings.training_mode in ("distributed", "hogwild"):
+            trainer_class = DistributedTrainer if self.settings.training_mode == "distributed" else HogwildTrainer
+            trainer_class(self, num_workers).train(self.max_subgames, progress)
+            self.finish_training(training_started)
+            return
+
+        if self.settings.num_parallel_games > 1:
+            self.train_vectorized(progress)
+            self.finish_training(training_started)
+            return
+
         subgame_count = 0
+        # continuing an interrupted run from its latest checkpoint:
+        if self.settings.resume_training:
+            subgame_count = self.checkpoints.restore(self)
         
         while subgame_count < self.max_subgames:
-            t = 0
-            reset = False
             subgame_count += 1
             print(f"\nTraining Subgame {subgame_count}/{self.max_subgames}")
-            
-            while t < self.max_iteration and not reset:
-                alive_list = []
-
-                # Collect current states for all agents
-                for eachagent in self.env.agents_list:
-                    eachagent.current_state = eachagent.health_list + [eachagent.alliance_status]
-
-                # choosing an action for each agent:
-                for eachagent in self.env.agents_list:
-                    eachagent.choose_action(t)
-
-                # updating the dummy game's state:
-                self.game_status_update.update(self.env)
-
-                # Collect next states and rewards - only for RL agents to save computation
-                for eachagent in self.env.agents_list:
-                    if eachagent.agent_type == "RL":
-                        eachagent.next_state = eachagent.health_list + [eachagent.alliance_status]
-                        eachagent.compute_val_snext()
-                        
-                        # Learn from experience using neural network
-                        done = not eachagent.is_alive
-                        eachagent.learn(
-                            eachagent.current_state,
-                            eachagent.latest_action,
-                            eachagent.current_reward,
-                            eachagent.next_state,
-                            done
-                        )
-
-                # checking how many agents are alive:
-                for eachagent in self.env.agents_list:
-                    if eachagent.is_alive == True:
-                        alive_list.append(eachagent)
-
-                # checking if members from only one alliance are left:
-                if len(alive_list) == 2:
-                    if alive_list[0].alliance_pair == alive_list[1]:
-                        reset = True
-
-                # checking if only one agent is left:
-                elif len(alive_list) == 1:
-                    reset = True
-
-                # resetting to the original state if the dummy game is over:
-                if reset == True:
-                    self.env.health_list = list(self.env.stable_health_list)
-                    self.animosity_table = list(self.env.stable_animosity_table)
-
-                    for eachagent in self.env.agents_list:
-                        eachagent.health_list = list(eachagent.stable_health_list)
-                        eachagent.alliance_status = eachagent.stable_alliance_status
-                        eachagent.alliance_pair = eachagent.stable_alliance_pair
-                        eachagent.is_alive = eachagent.stable_is_alive
-
-                t += 1
+            self.play_training_subgame()
             
             # Only print progress every 5 subgames to reduce console output
             if subgame_count % 5 == 0 or subgame_count == self.max_subgames:
                 print(f"Training progress: {subgame_count}/{self.max_subgames} subgames completed")
+            if progress is not None:
+                progress(subgame_count, self.max_subgames)
 
+            interval = self.settings.checkpoint_interval
+            if interval > 0 and (subgame_count % interval == 0 or subgame_count == self.max_subgames):
+                self.checkpoints.save(self, subgame_count)
+
+        self.checkpoints.wait()
+        self.finish_training(training_started)
+
+    def finish_training(self, training_started):
+        """Report the training's wall time, split into learning phases and the rest, and reset the environment"""
         print("\nTraining completed!")
+        elapsed = time.perf_counter() - training_started
+        schedule = Agent.shared_schedule
+        if schedule is not None and schedule.timings:
+            learning = sum(schedule.timings.values())
+            print(f"Training time {elapsed:.2f}s: learning ({schedule.report()}), "
+                  f"simulation and other {elapsed - learning:.2f}s")
+        else:
+            print(f"Training time {elapsed:.2f}s")
         self.reset_environment()
 
+    def play_training_subgame(self, learn=None):
+        """Play one training subgame from the initial state.
+
+        Every RL agent's transition of every step is passed to
+        learn(agent, state, action, reward, next_state, done), which defaults to
+        the agent's own Agent.learn.
+        """
+        t = 0
+        reset = False
+
+        # every subgame is a transaction on the environment's state:
+        self.env.buffers.begin()
+        self.stalemate_detector.reset()
+        
+        while t < self.max_iteration and not reset:
+            # Collect current states for all agents
+            for eachagent in self.env.agents_list:
+                eachagent.current_state = eachagent.observe()
+
+            # choosing an action for each agent:
+            self.choose_actions(t)
+
+            # updating the dummy game's state:
+            self.game_status_update.update(self.env)
+
+            # Collect next states and rewards - only for RL agents to save computation
+            # (val_snext is evaluated lazily, only if something reads it)
+            for eachagent in self.env.agents_list:
+                if eachagent.agent_type == "RL":
+                    eachagent.next_state = eachagent.observe()
+
+                    # Learn from experience using neural network
+                    done = not eachagent.is_alive
+                    if learn is None:
+                        eachagent.learn(eachagent.current_state, eachagent.latest_action,
+                                        eachagent.current_reward, eachagent.next_state, done)
+                    else:
+                        learn(eachagent, eachagent.current_state, eachagent.latest_action,
+                              eachagent.current_reward, eachagent.next_state, done)
+
+            # checking if only one agent, or members from only one alliance, are left:
+            if self.env.state.outcome() in ('winner', 'alliance'):
+                reset = True
+
+            # ending the dummy game early if it only revisits recent states:
+            elif self.stalemate_detector.observe(self.env.state):
+                reset = True
+
+            # resetting to the original state if the dummy game is over:
+            if reset == True:
+                self.env.buffers.rollback()
+
+            t += 1
+
+    def train_vectorized(self, progress=None):
+        """Train on several subgames at once, stepped in lockstep by a VectorEnvironment.
+
+        Checkpoints are written on the cadence of train(); a resumed run starts
+        fresh lockstep games, since the games in flight are not saved.
+        """
+        num_games = self.settings.num_parallel_games
+        print(f"Stepping {num_games} subgames in lockstep")
+        vector_env = VectorEnvironment(self.env, num_games, self.settings, self.transition_tables,
+                                       self.settings.combat_engine)
+
+        subgame_count = 0
+        # continuing an interrupted run from its latest checkpoint:
+        if self.settings.resume_training:
+            subgame_count = self.checkpoints.restore(self)
+
+        while subgame_count < self.max_subgames:
+            finished = vector_env.step()
+            if finished == 0:
+                continue
+            previous_count = subgame_count
+            subgame_count = min(self.max_subgames, subgame_count + finished)
+
+            # Only print progress every 5 subgames to reduce console output
+            if subgame_count // 5 > previous_count // 5 or subgame_count == self.max_subgames:
+                print(f"Training progress: {subgame_count}/{self.max_subgames} subgames completed")
+            if progress is not None:
+                progress(subgame_count, self.max_subgames)
+
+            # several games can finish in one step, so checkpoint whenever a multiple of the interval is passed:
+            interval = self.settings.checkpoint_interval
+            if interval > 0 and (subgame_count // interval > previous_count // interval
+                                 or subgame_count == self.max_subgames):
+                self.checkpoints.save(self, subgame_count)
+
+        self.checkpoints.wait()
+
+    def start_final_game(self):
+        """Prepare the final game: discard any uncommitted state, reset the step counter
+        and switch the RL agents to settings.inference_backend ("eager", the training network, by default)"""
+        self.env.buffers.rollback()
+        if Agent.shared_policy_net is not None:
+            Agent.use_inference_backend(self.settings.inference_backend, self.settings.number_of_agents)
+        self.game_is_on = True
+        self.current_step = 0  # Reset step counter
+        self.stalemate_detector.reset()
+
     def play_final_game(self):
         """Play a single final game with the trained agents"""
         print('\n=== FINAL GAME ===')
         print('Starting the final game with trained agents...')
-        self.game_is_on = True
-        self.current_step = 0  # Reset step counter
+        self.start_final_game()
         
         # Add a maximum iteration limit to prevent infinite loops
         max_iterations = self.max_iteration
@@ -166,14 +278,7 @@ class Simulation:
 
     def reset_environment(self):
         """Reset the environment to initial state"""
-        self.env.health_list = list(self.env.stable_health_list)
-        self.animosity_table = list(self.env.stable_animosity_table)
-        
-        for eachagent in self.env.agents_list:
-            eachagent.health_list = list(eachagent.stable_health_list)
-            eachagent.alliance_status = eachagent.stable_alliance_status
-            eachagent.alliance_pair = eachagent.stable_alliance_pair
-            eachagent.is_alive = eachagent.stable_is_alive
+        self.env.buffers.rollback()
 
     def run(self):
         """Main run method that handles both training and final game"""
@@ -183,38 +288,26 @@ class Simulation:
         # Then play the final game
         self.play_final_game()
 
+    def choose_actions(self, t):
+        """Choose every agent's action for time step t; RL agents go through the batched inference stage"""
+        for eachagent in self.env.agents_list:
+            if eachagent.agent_type != "RL":
+                eachagent.choose_action(t)
+        self.policy_inference.choose_actions(t)
+
     # executing the actions of each agent and taking the game to the next time step:
     def update_time_step(self):
-        alive_list_final = []
-
-        # refreshing environment health_list and animosity table with the original values:
-        self.env.health_list = list(self.env.stable_health_list)
-        self.animosity_table = list(self.env.stable_animosity_table)
-
-        # refreshing the attributes of the agent with original values:
-        for eachagent in self.env.agents_list:
-            eachagent.health_list = list(eachagent.stable_health_list)
-            eachagent.alliance_status = eachagent.stable_alliance_status
-            eachagent.alliance_pair = eachagent.stable_alliance_pair
-            eachagent.is_alive = eachagent.stable_is_alive
+        # starting the step from the last committed state:
+        self.env.buffers.begin()
 
         # choosing action for each agent:
-        for eachagent in self.env.agents_list:
-            eachagent.choose_action(999999999) # agents don't choose random actions anymore since learning is complete
+        self.choose_actions(999999999) # agents don't choose random actions anymore since learning is complete
 
         # updating the game:
         self.game_status_update.update(self.env)
 
-        # updating the environment health_list and animosity table:
-        self.env.stable_health_list = list(self.env.health_list)
-        self.env.stable_animosity_table = list(self.env.animosity_table)
-
-        # updating the state indirectly by updating the health list and alliance status:
-        for eachagent in self.env.agents_list:
-            eachagent.stable_health_list = list(eachagent.health_list)
-            eachagent.stable_alliance_status = eachagent.alliance_status
-            eachagent.stable_alliance_pair = eachagent.alliance_pair
-            eachagent.stable_is_alive = eachagent.is_alive
+        # committing the step as the new stable game state:
+        self.env.buffers.commit()
 
         # Check game state to see if we have a winner or all agents are allied
         self.check_game_state()
@@ -223,28 +316,19 @@ class Simulation:
         if not self.game_is_on:
             return
 
-        # Check for stalemate by comparing current state with history
-        current_state = self._get_current_game_state()
-        
-        # If we have state history and current state matches the previous state
-        if self.state_history and self._states_equal(current_state, self.state_history[-1]):
-            self.stalemate_counter += 1
-            if self.stalemate_counter >= 100:  # If state hasn't changed for 100 iterations
-                print("\nDetected a stalemate: Game state hasn't changed for 100 iterations.")
-                print("Ending simulation as agents appear to be in a stable equilibrium.")
-                self.game_is_on = False
-                return
-        else:
-            # Reset counter if state changed
-            self.stalemate_counter = 0
-            
-        # Add current state to history, keep only last 10 states
-        self.state_history.append(current_state)
-        if len(self.state_history) > 10:
-            self.state_history.pop(0)
+        # Check for stalemate from the rolling hash of recent game states
+        if self.stalemate_detector.observe(self.env.state):
+            detector = self.stalemate_detector
+            if detector.period == 1:
+                print(f"\nDetected a stalemate: Game state hasn't changed for {detector.patience} iterations.")
+            else:
+                print(f"\nDetected a stalemate: Game state has cycled every {detector.period} iterations for {detector.patience} iterations.")
+            print("Ending simulation as agents appear to be in a stable equilibrium.")
+            self.game_is_on = False
+            return
 
         # If no winners yet, print current game state
-        alive_list_final = [agent for agent in self.env.agents_list if agent.is_alive]
+        alive_list_final = self.env.state.alive_agents()
         print(f"\nTime Step {self.current_step}: {len(alive_list_final)} agents still alive")
         # List all alive agents with their health
         for agent in alive_list_final:
@@ -253,54 +337,27 @@ class Simulation:
         
     def check_game_state(self):
         """Check if the game has ended due to a winner or all agents being allied"""
-        alive_agents = [agent for agent in self.env.agents_list if agent.is_alive]
-        
-        # If only one agent remains, they win
-        if len(alive_agents) == 1:
-            self.game_is_on = False
-            print(f'\nTime Step {self.current_step}: The winner is Agent - {alive_agents[0].agent_id}')
+        state = self.env.state
+        outcome = state.outcome()
+        if outcome is None:
             return
-            
+
+        self.game_is_on = False
+        alive_agents = state.alive_agents()
+
+        # If only one agent remains, they win
+        if outcome == 'winner':
+            if alive_agents:
+                print(f'\nTime Step {self.current_step}: The winner is Agent - {alive_agents[0].agent_id}')
+            else:
+                print(f'\nTime Step {self.current_step}: No agents survived')
+
         # If two agents remain and they're allied, they win
-        elif len(alive_agents) == 2:
-            if alive_agents[0].alliance_pair == alive_agents[1]:
-                self.game_is_on = False
-                print(f'\nTime Step {self.current_step}: The winner is the team of Agents - {alive_agents[0].agent_id} and {alive_agents[1].agent_id}')
-                return
-                
+        elif outcome == 'alliance':
+            print(f'\nTime Step {self.current_step}: The winner is the team of Agents - {alive_agents[0].agent_id} and {alive_agents[1].agent_id}')
+
         # If all remaining agents are allied in pairs, end the game
-        elif len(alive_agents) > 2 and len(alive_agents) % 2 == 0:  # Even number of agents
-            all_allied = True
-            alliance_pairs = set()
-            
-            for agent in alive_agents:
-                # If an agent doesn't have an alliance or their ally is dead, not all are allied
-                if agent.alliance_pair is None or not agent.alliance_pair.is_alive:
-                    all_allied = False
-                    break
-                    
-                # Add alliance pair to set (in sorted order to avoid duplicates)
-                pair = tuple(sorted([agent.agent_id, agent.alliance_pair.agent_id]))
-                alliance_pairs.add(pair)
-            
-            # Check if number of unique pairs matches expected number
-            if all_allied and len(alliance_pairs) == len(alive_agents) // 2:
-                self.game_is_on = False
-                print(f'\nTime Step {self.current_step}: Game over - All remaining agents are allied in pairs')
-                print("Alliance pairs:", alliance_pairs)
-                return
-
-    def _get_current_game_state(self):
-        """Create a representation of the current game state for stalemate detection"""
-        state = []
-        for agent in self.env.agents_list:
-            if agent.is_alive:
-                # Include agent ID, health, alliance status, and alliance pair ID if any
-                alliance_pair_id = agent.alliance_pair.agent_id if agent.alliance_pair else -1
-                state.append((agent.agent_id, agent.health_list[agent.agent_id], 
-                             agent.alliance_status, alliance_pair_id))
-        return tuple(sorted(state))  # Sort to ensure consistent comparison
-        
-    def _states_equal(self, state1, state2):
-        """Compare two game states to check if they're identical"""
-        return state1 == state2
\ No newline at end of file
+        else:
+            alliance_pairs = {tuple(sorted((agent.agent_id, agent.alliance_pair.agent_id))) for agent in alive_agents}
+            print(f'\nTime Step {self.current_step}: Game over - All remaining agents are allied in pairs')
+            print("Alliance pairs:", alliance_pairs)
@@ -0,0 +1,256 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+from CodeBase.RandomStream import RandomStream
+from CodeBase.TransitionTables import TransitionTables, CASE_RECOVER
+
+
+class LivingAgents:
+    """The living agents during a step's turns: the ids alive at the start of the step, ascending, and the
+    ids that died since, ascending too since agents only die in their own turn. Counting or indexing the
+    agents alive now in a range of ids is a few binary searches instead of a pass over an alive array."""
+
+    def __init__(self, alive):
+        self.ids = np.flatnonzero(alive).tolist()
+        self.deaths = []
+
+    def kill(self, agent):
+        self.deaths.append(agent)
+
+    def count(self, start, end):
+        """Number of agents alive now with ids in [start, end)"""
+        return (bisect_left(self.ids, end) - bisect_left(self.ids, start)
+                - bisect_left(self.deaths, end) + bisect_left(self.deaths, start))
+
+    def nth(self, start, index, excluded):
+        """The index-th (from 0) agent alive now with an id from start on, not counting excluded"""
+        first = bisect_left(self.ids, start)
+        skipped = 0
+        while True:
+            # the candidate is right once the agents it skips are exactly the dead and excluded ones before it:
+            candidate = self.ids[first + index + skipped]
+            removed = bisect_right(self.deaths, candidate) - bisect_left(self.deaths, start) + \
+                (start <= excluded <= candidate)
+            if removed == skipped:
+                return candidate
+            skipped = removed
+
+
+class SparseGameStatusUpdate:
+    """Interaction-graph combat resolution engine.
+
+    Every agent takes exactly one action per step, so a step has at most one
+    attack, proposal or acceptance edge per agent. Agents take their turns in
+    id order as in GameStatusUpdate, so a turn sees the deaths, health and
+    alliances of the turns before it, and an agent that dies stops resolving
+    the pairs after the fatal one. Within a turn only the attack edges into
+    the agent are drawn one by one; the hits of the living opponents that do
+    not attack it come in runs between those edges, one binomial draw per run
+    (see turn_hits). The living agents are tracked across the turns (see
+    LivingAgents), so a turn's health resolution costs O(attackers + log N)
+    draws and operations; only the turn in which an agent dies also draws its
+    fatal pair among the run's hits, in O(run length).
+
+    The two row-wide animosity rules (an attacker's animosity may rise, and a
+    recovering agent's may fall, towards every living opponent) touch a whole
+    row by definition, O(N) per attacking or recovering agent; they are
+    applied to the rows of those agents only. A step of N agents of which A
+    attack or recover therefore costs O(N + E log N + A N), E being the
+    attack edges: the gain over the loop engine's N x N pairs is largest when
+    most agents defend, propose or accept.
+
+    Pairs use the same probabilities as GameStatusUpdate, looked up in the
+    TransitionTables, and every step outcome has the same distribution as in
+    the loop engine. The random draws differ, so a seeded game does not
+    repeat the loop engine's game step for step.
+    """
+
+    def __init__(self, settings, random_stream=None, transition_tables=None):
+        self.settings = settings
+        self.random_stream = random_stream if random_stream is not None else RandomStream(settings.seed)
+        self.tables = transition_tables if transition_tables is not None else TransitionTables(settings)
+
+    def update(self, dynamic_env):
+        """Drop-in replacement for GameStatusUpdate.update on a single Environment"""
+        agents = dynamic_env.agents_list
+        n = dynamic_env.number_of_agents
+        state = dynamic_env.state
+        actions = np.fromiter((agent.latest_action for agent in agents), dtype=np.int64, count=n)
+        alive_before = state.alive.copy()
+        partner_before = state.partner.copy()
+
+        rewards = self.resolve(state, actions)
+        state.record_bulk_update(alive_before, partner_before)
+        state.alliance_status[:] = np.where(state.partner >= 0, self.settings.alliance_status_weight, 1.0)
+
+        for agent in agents:
+            if n <= agent.latest_action < 2 * n:
+                agent.proposal_request = agent.latest_action - n
+            else:
+                agent.proposal_request = None
+            agent.current_reward = float(rewards[agent.agent_id])
+
+    def resolve(self, state, actions):
+        """Resolve one step of a GameState in place and return the rewards"""
+        return self.resolve_game(state.health_ticks, state.observed_ticks, state.partner, state.animosity,
+                                 state.alive, actions)
+
+    def resolve_batch(self, health, observed, partner, animosity, alive, actions):
+        """Resolve one step of a batch of games in place, one game at a time, and return the (B, N) rewards;
+        the arrays are shaped as for VectorizedGameStatusUpdate.resolve"""
+        return np.stack([self.resolve_game(health[b], observed[b], partner[b], animosity[b], alive[b], actions[b])
+                         for b in range(len(health))])
+
+    def resolve_game(self, health, observed, partner, animosity, alive, actions):
+        """Resolve one step of a single game's state arrays in place and return the rewards"""
+        s = self.settings
+        tables = self.tables
+        stream = self.random_stream
+        n = len(health)
+        case = tables.cases(actions, n)
+
+        # action categories (order of actions = n_attacks + n_alliances + defend + recover + n_accept_alliances):
+        defend = actions == 2 * n
+        recover = actions == 2 * n + 1
+        attack = actions < n
+        propose = (actions >= n) & (actions < 2 * n)
+        accept = actions >= 2 * n + 2
+        target = np.where(attack, actions,
+                          np.where(propose, actions - n,
+                                   np.where(accept, actions - 2 * n - 2, -1)))
+
+        # building the attack edges, grouped by the attacked agent in attacker order:
+        attacker = np.flatnonzero(alive & attack)
+        attacker = attacker[np.argsort(actions[attacker], kind='stable')]
+        bounds = np.searchsorted(actions[attacker], np.arange(n + 1))
+
+        ticks_per_unit = 1.0 / s.health_granularity
+        max_ticks = tables.number_of_levels - 1
+        living = LivingAgents(alive)
+        rewards = np.zeros(n)
+
+        # only an agent's own turn can kill it, so the agents alive now are the ones taking a turn:
+        for i in list(living.ids):
+            c = case[i]
+            t = target[i]
+            own = int(health[i])
+            attackers = attacker[bounds[i]:bounds[i + 1]]
+            attackers = attackers[alive[attackers]]
+
+            # an accepted proposal forms its alliance at the target's pair, so it is drawn first:
+            # the pairs after the target see the betrayed allies' reset statuses
+            forms = False
+            target_decrease = False
+            betrayed = ()
+            if accept[i] and alive[t]:
+                target_decrease = stream.uniform() < s.animosity_decrease_prob_alliance_proposal and \
+                    animosity[i, t] > 0
+                rand_alliance = stream.uniform()
+                if actions[t] == n + i:
+                    forms = rand_alliance < tables.alliance_prob[animosity[i, t] - target_decrease]
+                    betrayed = (partner[i], partner[t])
+
+            # handling health_transition, in opponent order until the agent dies:
+            hits, death = self.turn_hits(i, c, own, t, attackers, forms, betrayed, health, partner, alive, living)
+            if recover[i]:
+                new_health = min(own + hits, max_ticks)
+            else:
+                new_health = max(own - hits, 0)
+            # the agent resolved its pairs with the living opponents up to the one it died at:
+            last = n if death is None else death + 1
+            resolved_count = living.count(0, last) - (i < last)
+            target_resolved = t >= 0 and alive[t] and t < last
+
+            # updating agent's knowledge of opponents' actual health:
+            if defend[i] or recover[i]:
+                seen = attackers[attackers < last]
+                observed[i, seen] = health[seen]
+            elif attack[i] and target_resolved:
+                observed[i, t] = health[t]
+            if new_health != own:
+                health[i] = new_health
+                observed[i, i] = new_health
+
+            # handling animosity:
+            if recover[i] or attack[i]:
+                columns = np.flatnonzero(alive[:last])
+                columns = columns[columns != i]
+                levels = animosity[i, columns]
+                if recover[i]:
+                    change = (stream.uniform(len(columns)) < s.animosity_decrease_prob) & (levels > 0)
+                    animosity[i, columns] = levels - change
+                else:
+                    change = (stream.uniform(len(columns)) < s.animosity_increase_prob) & (levels < 2)
+                    animosity[i, columns] = levels + change
+            elif propose[i] and target_resolved:
+                if stream.uniform() < s.animosity_decrease_prob_alliance_proposal and animosity[i, t] > 0:
+                    animosity[i, t] -= 1
+            elif accept[i] and target_resolved and target_decrease:
+                animosity[i, t] -= 1
+
+            # action-based rewards, per resolved pair as in the loop engine:
+            E = 0.0
+            if attack[i]:
+                if not alive[t] and (death is None or t <= death):
+                    E -= s.attack_dead_opponent_penalty
+                if partner[i] >= 0 and t == partner[i]:
+                    E -= s.attack_alliance_member_penalty * resolved_count
+            elif propose[i]:
+                E -= s.propose_alliance_member_penalty * resolved_count
+
+            # alliance handling at the target's pair, dissolving existing alliances first:
+            if forms and target_resolved:
+                for member in (i, t):
+                    old_ally = partner[member]
+                    if old_ally >= 0:
+                        # increasing animosity with the betrayed ally:
+                        animosity[member, old_ally] = 2
+                        partner[old_ally] = -1
+                partner[i] = t
+                partner[t] = i
+            if death is not None:
+                alive[i] = False
+                living.kill(i)
+
+            # calculating the reward at the end of the turn, from the agent's perspective, in float health:
+            a = observed[i, i] / ticks_per_unit
+            b = observed[i, partner[i]] / ticks_per_unit if partner[i] >= 0 else 0.0
+            c_health = observed[i, t] / ticks_per_unit if attack[i] else 0.0
+            rewards[i] = a + b + (1.0 / c_health if c_health != 0 else 0.0) + E
+        return rewards
+
+    def turn_hits(self, i, case, own, t, attackers, forms, betrayed, health, partner, alive, living):
+        """Health ticks agent i gains or loses in its turn, and the opponent at whose pair it dies (None if
+        it survives). The living opponents that do not attack it act in runs between its attackers: each
+        run's hits are one binomial draw, and the pair of a fatal hit is a uniform choice among the run's."""
+        tables = self.tables
+        stream = self.random_stream
+        baseline = tables.baseline[case]
+        healing = case == CASE_RECOVER
+        remaining = max(own, 1)
+        hits = 0
+        start = 0
+        for a in list(attackers) + [None]:
+            # the run of non-attacking opponents before this attacker:
+            end = len(alive) if a is None else a
+            if baseline > 0 and end > start:
+                run = living.count(start, end) - (start <= i < end)
+                run_hits = int(stream.binomial(run, baseline))
+                if not healing and run_hits >= remaining:
+                    pairs = np.sort(stream.sample_indices(run, run_hits))
+                    return hits + remaining, living.nth(start, int(pairs[remaining - 1]), i)
+                hits += run_hits
+                remaining -= run_hits
+            if a is None:
+                break
+            # the attacker's own pair:
+            attacker_allied = partner[a] >= 0 and not (forms and a > t and a in betrayed)
+            # (only a defender's odds depend on its own, current, health)
+            current = own if healing else own - hits
+            prob = tables.under_attack[case, health[a], current, int(attacker_allied), int(partner[i] >= 0)]
+            if stream.uniform() < prob:
+                hits += 1
+                remaining -= 1
+                if not healing and remaining == 0:
+                    return hits, a
+            start = a + 1
+        return hits, None
@@ -0,0 +1,108 @@
+import numpy as np
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_DEAD = np.uint64(0xFFFFFFFFFFFFFFFF)  # state word of a dead agent, which contributes nothing
+
+
+def _mix(x):
+    """splitmix64 finalizer, vectorized over uint64 arrays"""
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+class StalemateDetector:
+    """Stops games that only revisit recent states.
+
+    Every step the game state (alive agents with their health ticks,
+    alliance partner and alliance status) is folded into a Zobrist-style
+    hash: each agent's state is packed into a 64-bit word, mixed with the
+    agent's key into its contribution, and the hash is the XOR of all
+    contributions. Only the agents whose word changed since the last step
+    are mixed again and XORed in and out. The last `window` hashes are kept
+    in a fixed-size ring buffer with a hash -> count index, which makes each
+    check O(1).
+
+    A step whose state already appears in the ring buffer is a repeat:
+    this covers a state that stays identical (cycle of length 1) as well
+    as short cycles A -> B -> A ... up to `window` steps long. After
+    `patience` consecutive repeats the game is declared a stalemate.
+    With window 1 only a state identical to the previous step's counts,
+    which is the original rule (no change for `patience` steps).
+    """
+
+    def __init__(self, number_of_agents, settings):
+        self.settings = settings
+        self.window = settings.stalemate_window
+        self.patience = settings.stalemate_patience
+        with np.errstate(over='ignore'):
+            self.agent_keys = _mix(np.arange(number_of_agents, dtype=np.uint64) * _GOLDEN + _GOLDEN)
+        self.ring = np.zeros(self.window, dtype=np.uint64)
+        self.reset()
+
+    def reset(self):
+        """Forget every state seen so far (start of a new game)"""
+        self.words = np.full(len(self.agent_keys), _DEAD, dtype=np.uint64)
+        self.components = np.zeros(len(self.agent_keys), dtype=np.uint64)
+        self.hash = 0
+        self.ring_position = 0
+        self.ring_size = 0
+        self.counts = {}
+        self.last_seen = {}
+        self.steps = 0
+        self.repeat_run = 0
+        self.period = 0
+
+    def state_words(self, health_ticks, partner, allied, alive):
+        """Per-agent packed state words (_DEAD for dead agents)"""
+        words = health_ticks.astype(np.uint64) | \
+            ((partner.astype(np.int64) + 1).astype(np.uint64) << np.uint64(16)) | \
+            (allied.astype(np.uint64) << np.uint64(48))
+        return np.where(alive, words, _DEAD)
+
+    def update_hash(self, health_ticks, partner, allied, alive):
+        """XOR the contributions of agents whose state changed in and out of the rolling hash"""
+        words = self.state_words(health_ticks, partner, allied, alive)
+        changed = np.flatnonzero(words != self.words)
+        if len(changed):
+            with np.errstate(over='ignore'):
+                components = np.where(words[changed] != _DEAD, _mix(words[changed] ^ self.agent_keys[changed]),
+                                      np.uint64(0))
+            self.hash ^= int(np.bitwise_xor.reduce(components ^ self.components[changed]))
+            self.components[changed] = components
+            self.words[changed] = words[changed]
+        return self.hash
+
+    def observe(self, state):
+        """Record the current GameState; returns True once the game is a stalemate"""
+        return self.observe_arrays(state.health_ticks, state.partner, state.alliance_status != 1, state.alive)
+
+    def observe_arrays(self, health_ticks, partner, allied, alive):
+        """Record the current state from its per-agent arrays; returns True once the game is a stalemate"""
+        state_hash = self.update_hash(health_ticks, partner, allied, alive)
+
+        # checking for a repeat of a state in the ring buffer:
+        if self.counts.get(state_hash, 0) > 0:
+            self.repeat_run += 1
+            self.period = self.steps - self.last_seen[state_hash]
+        else:
+            self.repeat_run = 0
+
+        # pushing the hash into the ring buffer, evicting the oldest one:
+        if self.ring_size == self.window:
+            oldest = int(self.ring[self.ring_position])
+            self.counts[oldest] -= 1
+            if self.counts[oldest] == 0:
+                del self.counts[oldest]
+                del self.last_seen[oldest]
+        else:
+            self.ring_size += 1
+        self.ring[self.ring_position] = state_hash
+        self.ring_position = (self.ring_position + 1) % self.window
+        self.counts[state_hash] = self.counts.get(state_hash, 0) + 1
+        self.last_seen[state_hash] = self.steps
+        self.steps += 1
+
+        return self.repeat_run >= self.patience
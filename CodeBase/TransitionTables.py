@@ -0,0 +1,73 @@
+import numpy as np
+
+# action cases of the agent whose health changes:
+CASE_DEFEND = 0
+CASE_RECOVER = 1
+CASE_ATTACK = 2
+CASE_ALLIANCE = 3  # proposing or accepting an alliance
+NUMBER_OF_CASES = 4
+
+MAX_ANIMOSITY = 2
+
+
+class TransitionTables:
+    """Lookup tables of every transition probability the combat engines use.
+
+    Health only takes the integer ticks 0 .. max_health / health_granularity
+    (see GameState) and alliance status only two values, so the health_prob
+    formulas of GameStatusUpdate reduce to a small table fixed by the
+    Settings. It is built once per Simulation; a step is then table lookups
+    compared against random draws.
+
+    under_attack[case, attacker ticks, defender ticks, attacker allied, defender allied]
+        probability that an opponent's attack changes the defender's health by one
+        tick (down, or up for CASE_RECOVER), given the defender's action case
+    baseline[case]
+        the same probability for each living opponent that is not attacking
+    alliance_prob[animosity level]
+        probability that an accepted proposal forms an alliance
+
+    Probabilities are clipped to [0, 1]; this also covers the divisions by a
+    zero health, which only dead agents can have.
+    """
+
+    def __init__(self, settings):
+        s = settings
+        self.number_of_levels = int(round(s.max_health / s.health_granularity)) + 1
+
+        # axes: attacker ticks, defender ticks, attacker allied, defender allied
+        health = np.arange(self.number_of_levels) * s.health_granularity
+        status = np.array([1.0, s.alliance_status_weight])
+        h_attacker = health[:, None, None, None]
+        h_defender = health[None, :, None, None]
+        s_attacker = status[None, None, :, None]
+        s_defender = status[None, None, None, :]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            attacker_prob = s.baseline_att_prob * h_attacker * s_attacker
+            under_attack = np.empty((NUMBER_OF_CASES, self.number_of_levels, self.number_of_levels, 2, 2))
+            under_attack[CASE_DEFEND] = attacker_prob * s.baseline_def_prob / h_defender / s_defender
+            under_attack[CASE_RECOVER] = s.baseline_att_prob / h_attacker / s_attacker * s.baseline_recover_prob
+            under_attack[CASE_ATTACK] = attacker_prob * s.baseline_underattack_attack_multiplier
+            under_attack[CASE_ALLIANCE] = attacker_prob
+        self.under_attack = np.clip(np.nan_to_num(under_attack, nan=1.0, posinf=1.0), 0.0, 1.0)
+
+        self.baseline = np.zeros(NUMBER_OF_CASES)
+        self.baseline[CASE_RECOVER] = s.baseline_recover_prob
+        self.baseline[CASE_ATTACK] = s.baseline_notunderattack_attack_prob
+        self.baseline = np.clip(self.baseline, 0.0, 1.0)
+
+        self.alliance_prob = np.empty(MAX_ANIMOSITY + 1)
+        self.alliance_prob[0] = s.alliance_prob_with_no_animosity
+        self.alliance_prob[1:] = s.alliance_prob_with_some_animosity_baseline / np.arange(1, MAX_ANIMOSITY + 1)
+
+    def cases(self, actions, number_of_agents):
+        """Action case of every action in an array"""
+        n = number_of_agents
+        return np.select([actions == 2 * n, actions == 2 * n + 1, actions < n],
+                         [CASE_DEFEND, CASE_RECOVER, CASE_ATTACK], CASE_ALLIANCE)
+
+    def under_attack_prob(self, case, attacker_ticks, attacker_status, defender_ticks, defender_status):
+        """Scalar lookup of under_attack from health ticks and alliance statuses"""
+        return self.under_attack[case, attacker_ticks, defender_ticks,
+                                 int(attacker_status != 1), int(defender_status != 1)]
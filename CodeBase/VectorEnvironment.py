@@ -0,0 +1,192 @@
+import numpy as np
+from CodeBase.Agent import AGENT_TYPE_RL, AGENT_TYPE_HEURISTIC, AGENT_TYPE_RANDOM
+from CodeBase.PolicyInference import PolicyInference
+from CodeBase.StalemateDetector import StalemateDetector
+from CodeBase.VectorizedGameStatusUpdate import VectorizedGameStatusUpdate
+from CodeBase.SparseGameStatusUpdate import SparseGameStatusUpdate
+
+
+class VectorEnvironment:
+    """Runs K independent games of one Environment in lockstep on stacked arrays.
+
+    The wrapped Environment provides the agents (types, action sets and the
+    shared RL policy) and the starting state. Each game keeps its own health,
+    observed health, alliance, animosity and alive arrays, shaped (K, N) or
+    (K, N, N), and all K games are resolved by a single call to the combat
+    kernel of the given engine (settings.combat_engine by default). The loop
+    engine cannot step stacked arrays, so it is served by the vectorized
+    kernel, which resolves the same turns with the same random draws; the
+    sparse engine resolves the games one after another. Every game has its
+    own StalemateDetector; finished games, including stalemates, are reset
+    on their own.
+    """
+
+    def __init__(self, env, num_games, settings, transition_tables=None, combat_engine=None):
+        self.env = env
+        self.settings = settings
+        self.num_games = num_games
+        self.number_of_agents = env.number_of_agents
+        self.agents_list = env.agents_list
+        self.random_stream = env.random_stream
+        self.ticks_per_unit = env.state.ticks_per_unit
+        self.combat_engine = combat_engine if combat_engine is not None else settings.combat_engine
+        if self.combat_engine == "sparse":
+            self.kernel = SparseGameStatusUpdate(settings, self.random_stream, transition_tables)
+            self.resolve = self.kernel.resolve_batch
+        else:
+            self.kernel = VectorizedGameStatusUpdate(settings, self.random_stream, transition_tables)
+            self.resolve = self.kernel.resolve
+        n = self.number_of_agents
+
+        # starting state of every game, taken from the environment's stable state:
+        stable_state = env.stable_state
+        self.initial_health = stable_state.health_ticks.copy()
+        self.initial_observed = stable_state.observed_ticks.copy()
+        self.initial_partner = stable_state.partner.copy()
+        self.initial_animosity = stable_state.animosity.copy()
+        self.initial_alive = stable_state.alive.copy()
+
+        # stacked per-game state, health in integer ticks:
+        self.health = np.empty((num_games, n), dtype=np.int16)
+        self.observed = np.empty((num_games, n, n), dtype=np.int16)
+        self.partner = np.empty((num_games, n), dtype=np.int32)
+        self.animosity = np.empty((num_games, n, n), dtype=np.int8)
+        self.alive = np.empty((num_games, n), dtype=bool)
+        self.actions = np.zeros((num_games, n), dtype=np.int64)
+        self.t = np.zeros(num_games, dtype=np.int64)
+        self.stalemate_detectors = [StalemateDetector(n, settings) for _ in range(num_games)]
+        self.reset()
+
+        # per-agent action sets, and the RL agents' batched inference stage:
+        self.action_arrays = [np.array(agent.actions, dtype=np.int64) for agent in self.agents_list]
+        self.rl_ids = [agent.agent_id for agent in self.agents_list if agent.agent_type == AGENT_TYPE_RL]
+        self.policy_inference = PolicyInference(self.agents_list, settings, self.random_stream)
+
+    def reset(self, games=None):
+        """Reset the selected games (all games by default) to the starting state"""
+        if games is None:
+            games = np.arange(self.num_games)
+        self.health[games] = self.initial_health
+        self.observed[games] = self.initial_observed
+        self.partner[games] = self.initial_partner
+        self.animosity[games] = self.initial_animosity
+        self.alive[games] = self.initial_alive
+        self.t[games] = 0
+        for k in games:
+            self.stalemate_detectors[k].reset()
+
+    def alliance_status(self):
+        """(K, N) alliance status of every agent in every game"""
+        return np.where(self.partner >= 0, self.settings.alliance_status_weight, 1.0)
+
+    def observations(self):
+        """(K, N, N + 1) state of every agent: its health list plus its alliance status"""
+        observed_health = self.observed / self.ticks_per_unit
+        return np.concatenate([observed_health, self.alliance_status()[:, :, None]], axis=2)
+
+    def choose_actions(self, states):
+        """Choose an action for every agent in every game"""
+        n = self.number_of_agents
+        for agent in self.agents_list:
+            i = agent.agent_id
+            if agent.agent_type == AGENT_TYPE_HEURISTIC:
+                self.actions[:, i] = self.choose_actions_heuristic(i)
+            elif agent.agent_type != AGENT_TYPE_RL:
+                self.actions[:, i] = self.random_actions(i)
+        if self.rl_ids:
+            self.choose_actions_rl(states)
+        # dead agents keep pointing at themselves, as in Agent.choose_action:
+        ids = np.broadcast_to(np.arange(n), self.actions.shape)
+        self.actions[...] = np.where(self.alive, self.actions, ids)
+        return self.actions
+
+    def random_actions(self, agent_id):
+        actions = self.action_arrays[agent_id]
+        return actions[self.random_stream.integers(len(actions), self.num_games)]
+
+    def choose_actions_heuristic(self, agent_id):
+        """Vectorized Agent.choose_action_heuristic over all games"""
+        n = self.number_of_agents
+        ids = np.arange(n)
+        health = self.observed[:, agent_id, :] / self.ticks_per_unit
+        others = (ids != agent_id)[None, :] & (health > 0)
+
+        # weakest opponent that is not the alliance partner:
+        attackable = others & (ids[None, :] != self.partner[:, agent_id][:, None])
+        weakest_health = np.where(attackable, health, np.inf)
+        weakest = weakest_health.argmin(axis=1)
+        min_health = weakest_health.min(axis=1)
+
+        # strongest living agent to propose an alliance to:
+        strongest_health = np.where(others, health, 0.0)
+        strongest = strongest_health.argmax(axis=1)
+        has_strongest = strongest_health.max(axis=1) > 0
+
+        actions = np.full(self.num_games, 2 * n)  # Default: defend
+        actions = np.where(has_strongest & (self.partner[:, agent_id] < 0), strongest + n, actions)
+        actions = np.where(min_health <= 1, weakest, actions)
+        actions = np.where(health[:, agent_id] <= 1, 2 * n + 1, actions)  # Recover action
+        return actions
+
+    def choose_actions_rl(self, states):
+        """Epsilon-greedy actions of every RL agent in every game from one batched forward pass"""
+        rl_ids = np.array(self.rl_ids)
+        for i in rl_ids:
+            self.actions[:, i] = self.random_actions(i)
+        epsilon = np.array([self.agents_list[i].epsilon for i in rl_ids])
+        exploit = (self.t >= self.policy_inference.explore_threshold)[:, None] & \
+            (self.random_stream.uniform((self.num_games, len(rl_ids))) >= epsilon[None, :])
+        exploit &= self.alive[:, rl_ids]
+        games, columns = np.nonzero(exploit)
+        if len(games):
+            agent_ids = rl_ids[columns]
+            self.actions[games, agent_ids] = self.policy_inference.select(states[games, agent_ids], agent_ids)
+
+        # Decay epsilon once per lockstep step, for the agents alive in some game (as Agent.choose_action
+        # only decays for a living agent)
+        for i in rl_ids:
+            agent = self.agents_list[i]
+            if agent.epsilon > agent.min_epsilon and self.alive[:, i].any():
+                agent.epsilon *= agent.epsilon_decay
+
+    def finished(self):
+        """(K,) flags for games that are won: one agent left, or two allied agents left"""
+        alive_count = self.alive.sum(axis=1)
+        ids = np.arange(self.number_of_agents)
+        mutual = (self.partner >= 0) & \
+            (np.take_along_axis(self.partner, np.clip(self.partner, 0, None), axis=1) == ids)
+        allied_alive = self.alive & mutual & \
+            np.take_along_axis(self.alive, np.clip(self.partner, 0, None), axis=1)
+        return (alive_count <= 1) | ((alive_count == 2) & (allied_alive.sum(axis=1) == 2))
+
+    def stalemates(self):
+        """(K,) flags for games that only revisit recent states (see StalemateDetector)"""
+        allied = self.partner >= 0
+        return np.array([detector.observe_arrays(self.health[k], self.partner[k], allied[k], self.alive[k])
+                         for k, detector in enumerate(self.stalemate_detectors)])
+
+    def step(self):
+        """Step all K games, feed RL experiences to the shared policy and auto-reset finished games.
+
+        Returns the number of games that finished during this step.
+        """
+        states = self.observations()
+        self.choose_actions(states)
+        acting = self.alive.copy()
+        rewards = self.resolve(self.health, self.observed, self.partner,
+                               self.animosity, self.alive, self.actions)
+        next_states = self.observations()
+
+        # Learn from every game's experience through the shared policy, in the games the agent was alive in
+        for i in self.rl_ids:
+            agent = self.agents_list[i]
+            for k in np.flatnonzero(acting[:, i]):
+                agent.learn(states[k, i], int(self.actions[k, i]), float(rewards[k, i]),
+                            next_states[k, i], not self.alive[k, i])
+
+        self.t += 1
+        done = self.finished() | (self.t >= self.settings.max_iteration) | self.stalemates()
+        finished_games = np.nonzero(done)[0]
+        if len(finished_games):
+            self.reset(finished_games)
+        return len(finished_games)
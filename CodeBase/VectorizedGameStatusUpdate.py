@@ -0,0 +1,183 @@
+import numpy as np
+from CodeBase.RandomStream import RandomStream
+from CodeBase.TransitionTables import TransitionTables, CASE_DEFEND
+
+
+class VectorizedGameStatusUpdate:
+    """Combat resolution kernel for a batch of stacked games.
+
+    Resolves the same five action cases as GameStatusUpdate (defend, recover,
+    attack, propose, accept) with boolean masks and pre-drawn random matrices.
+    Agents take their turns in id order as in the loop engine, so a turn sees
+    the deaths, health and alliances of the turns before it; within a turn all
+    of the agent's opponent pairs are resolved as one array operation, with
+    the agent's death cutting off the pairs after it. Each pair uses the same
+    probability and the same random draw as the loop engine, so both engines
+    produce identical steps from the same RandomStream.
+
+    The kernel (resolve) works on arrays with a leading batch dimension and is
+    meant for VectorEnvironment, where one call steps all the lockstep games
+    and the Python loop over turns is paid once for the whole batch. On a
+    single game (update) it is slower than the loop engine; it is kept as a
+    combat_engine for checking the kernel against the loop engine.
+    """
+
+    def __init__(self, settings, random_stream=None, transition_tables=None):
+        self.settings = settings
+        self.random_stream = random_stream if random_stream is not None else RandomStream(settings.seed)
+        self.tables = transition_tables if transition_tables is not None else TransitionTables(settings)
+
+    def update(self, dynamic_env):
+        """Drop-in replacement for GameStatusUpdate.update on a single Environment"""
+        agents = dynamic_env.agents_list
+        n = dynamic_env.number_of_agents
+        state = dynamic_env.state
+        actions = np.array([[agent.latest_action for agent in agents]], dtype=np.int64)
+        alive_before = state.alive.copy()
+        partner_before = state.partner.copy()
+
+        # resolving on batch-of-one views of the environment's state arrays:
+        rewards = self.resolve(state.health_ticks[None], state.observed_ticks[None], state.partner[None],
+                               state.animosity[None], state.alive[None], actions)
+        state.record_bulk_update(alive_before, partner_before)
+        state.alliance_status[:] = np.where(state.partner >= 0, self.settings.alliance_status_weight, 1.0)
+
+        for agent in agents:
+            if n <= agent.latest_action < 2 * n:
+                agent.proposal_request = agent.latest_action - n
+            else:
+                agent.proposal_request = None
+            agent.current_reward = float(rewards[0, agent.agent_id])
+
+    def resolve(self, health, observed, partner, animosity, alive, actions, draws=None):
+        """Resolve one step for a batch of games in place and return the rewards.
+
+        health:    (B, N) true health of every agent, in integer ticks
+        observed:  (B, N, N) each agent's knowledge of every agent's health, in ticks
+        partner:   (B, N) alliance partner index, -1 for none
+        animosity: (B, N, N) integer animosity levels (diagonal unused)
+        alive:     (B, N) alive flags
+        actions:   (B, N) latest action of every agent
+        """
+        s = self.settings
+        tables = self.tables
+        batch_size, n = health.shape
+        if draws is None:
+            draws = self.random_stream.step_draws(batch_size, n)
+        rand_health, rand_anim, rand_alliance = draws
+
+        games = np.arange(batch_size)
+        ids = np.arange(n)
+        case = tables.cases(actions, n)
+
+        # action categories (order of actions = n_attacks + n_alliances + defend + recover + n_accept_alliances):
+        defend = actions == 2 * n
+        recover = actions == 2 * n + 1
+        attack = actions < n
+        propose = (actions >= n) & (actions < 2 * n)
+        accept = actions >= 2 * n + 2
+        target = np.where(attack, actions,
+                          np.where(propose, actions - n,
+                                   np.where(accept, actions - 2 * n - 2, -1)))
+        safe_target = np.clip(target, 0, n - 1)
+        max_ticks = tables.number_of_levels - 1
+        ticks_per_unit = 1.0 / s.health_granularity
+        rewards = np.zeros(health.shape)
+
+        for i in range(n):
+            # only an agent's own turn can kill it, so it takes its turn if it was alive at the start of the step:
+            turn = alive[:, i].copy()
+            if not turn.any():
+                continue
+            t = target[:, i]
+            t_safe = safe_target[:, i]
+            own = health[:, i].copy()
+            allied = (partner >= 0).astype(np.int64)
+
+            # living opponents at the start of the turn; agents before i have already taken theirs:
+            opponents = alive & (ids != i)[None, :] & turn[:, None]
+            attacked = opponents & (actions == i)  # opponent attacks agent
+            targeted = ids[None, :] == t[:, None]  # agent's action points at opponent
+
+            # an accepted proposal forms its alliance at the target's pair, which resets the statuses
+            # of the betrayed allies for the pairs after it:
+            anim_to_target = animosity[games, i, t_safe]
+            target_decrease = (rand_anim[games, i, t_safe] < s.animosity_decrease_prob_alliance_proposal) & \
+                (anim_to_target > 0)
+            forms = turn & accept[:, i] & alive[games, t_safe] & (actions[games, t_safe] == n + i) & \
+                (rand_alliance[:, i] < tables.alliance_prob[anim_to_target - target_decrease])
+            betrayed = (ids[None, :] == partner[:, i, None]) | (ids[None, :] == partner[games, t_safe][:, None])
+            attacker_allied = np.where(forms[:, None] & betrayed & (ids[None, :] > t[:, None]), 0, allied)
+
+            # handling health_transition, pair by pair in opponent order:
+            prob = tables.under_attack[case[:, i, None], health, own[:, None], attacker_allied, allied[:, i, None]]
+            prob = np.where(attacked, prob, tables.baseline[case[:, i]][:, None])
+            hit = (rand_health[:, i, :] < prob) & opponents
+            # a defender's odds depend on its own health, which drops during its turn:
+            defending = turn & defend[:, i]
+            current = own.copy()
+            for j in np.flatnonzero((attacked & defending[:, None]).any(axis=0)):
+                p = tables.under_attack[CASE_DEFEND, health[:, j], current, allied[:, j], allied[:, i]]
+                hit[:, j] = np.where(defending, attacked[:, j] & (rand_health[:, i, j] < p), hit[:, j])
+                current = np.maximum(current - (defending & hit[:, j]), 0)
+
+            # the agent resolves pairs until it dies (a damaging action dies at the threshold-th hit):
+            healing = recover[:, i]
+            threshold = np.maximum(own, 1)
+            hits_before = np.cumsum(hit, axis=1) - hit
+            reached = turn[:, None] & (ids != i)[None, :] & \
+                (healing[:, None] | (hits_before < threshold[:, None]))
+            resolved = reached & opponents
+            hits = (hit & resolved).sum(axis=1)
+            new_health = np.where(healing, np.minimum(own + hits, max_ticks), np.maximum(own - hits, 0))
+            new_health = np.where(turn, new_health, own)
+            died = turn & ~healing & (hits >= threshold)
+
+            # updating agent's knowledge of opponents' actual health:
+            reveal = resolved & ((attacked & (defend | recover)[:, i, None]) | (targeted & attack[:, i, None]))
+            observed[:, i, :] = np.where(reveal, health, observed[:, i, :])
+            observed[:, i, i] = np.where(new_health != own, new_health, observed[:, i, i])
+            health[:, i] = new_health
+
+            # handling animosity:
+            row = animosity[:, i, :]
+            anim_draw = rand_anim[:, i, :]
+            decrease = (healing[:, None] & (anim_draw < s.animosity_decrease_prob)) | \
+                ((propose | accept)[:, i, None] & targeted &
+                 (anim_draw < s.animosity_decrease_prob_alliance_proposal))
+            decrease &= resolved & (row > 0)
+            increase = attack[:, i, None] & (anim_draw < s.animosity_increase_prob) & resolved & (row < 2)
+            row -= decrease
+            row += increase
+
+            # action-based rewards, per resolved pair as in the loop engine:
+            resolved_count = resolved.sum(axis=1)
+            E = np.zeros(batch_size)
+            E -= s.attack_dead_opponent_penalty * (attack[:, i] & reached[games, t_safe] & ~alive[games, t_safe])
+            E -= s.attack_alliance_member_penalty * resolved_count * \
+                (attack[:, i] & (partner[:, i] >= 0) & (t == partner[:, i]))
+            E -= s.propose_alliance_member_penalty * resolved_count * propose[:, i]
+
+            # alliance handling at the target's pair, dissolving existing alliances first:
+            for b in np.flatnonzero(forms & resolved[games, t_safe]):
+                j = t[b]
+                for member in (i, j):
+                    old_ally = partner[b, member]
+                    if old_ally >= 0:
+                        # increasing animosity with the betrayed ally:
+                        animosity[b, member, old_ally] = 2
+                        partner[b, old_ally] = -1
+                partner[b, i] = j
+                partner[b, j] = i
+            alive[:, i] &= ~died
+
+            # calculating the reward at the end of the turn, from the agent's perspective, in float health:
+            a = observed[:, i, i] / ticks_per_unit
+            own_partner = partner[:, i]
+            b_health = np.where(own_partner >= 0,
+                                observed[games, i, np.clip(own_partner, 0, n - 1)] / ticks_per_unit, 0.0)
+            c_health = observed[games, i, t_safe] / ticks_per_unit
+            with np.errstate(divide='ignore'):
+                c = np.where(attack[:, i] & (c_health != 0), 1.0 / c_health, 0.0)
+            rewards[:, i] = np.where(turn, a + b_health + c + E, 0.0)
+        return rewards
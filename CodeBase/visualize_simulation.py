@@ -105,7 +105,7 @@ class SimulationVisualizer:
         self.screen.blit(text_surface, (self.width - self.sidebar_width - self.margin + 15, self.margin + 50))
         
         # Draw alive agents count
-        alive_count = sum(1 for agent in self.env.agents_list if agent.is_alive)
+        alive_count = self.env.state.alive_count
         alive_text = f"Agents Alive: {alive_count}/{self.num_agents}"
         alive_surface = self.font.render(alive_text, True, TEXT_COLOR)
         self.screen.blit(alive_surface, (self.width - self.sidebar_width - self.margin + 15, self.margin + 80))
@@ -339,6 +339,9 @@ class SimulationVisualizer:
     
     def run(self):
         """Main visualization loop"""
+        # start the final game from the last committed state
+        self.simulation.start_final_game()
+        
         while self.running and self.simulation.game_is_on:
             # Handle events
             self.handle_events()
@@ -373,7 +376,7 @@ class SimulationVisualizer:
         self.screen.blit(overlay, (0, 0))
         
         # Check for winners
-        alive_agents = [agent for agent in self.env.agents_list if agent.is_alive]
+        alive_agents = self.env.state.alive_agents()
         
         if len(alive_agents) == 1:
             winner_text = f"Winner: Agent {alive_agents[0].agent_id}"
@@ -3,7 +3,8 @@
 Flask web application for Multi-Agent War Simulation
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
+from werkzeug.wsgi import ClosingIterator
 import matplotlib
 matplotlib.use('Agg')  # Use Agg backend for generating static images
 import matplotlib.pyplot as plt
@@ -13,9 +14,17 @@ import os
 from web_visualizer import WebSimulationVisualizer
 from CodeBase.Settings import Settings
 from CodeBase.Simulation import Simulation
+import simulation_jobs
+from job_queue import JobQueue, QueueFull
+import threading
+import json
 
 app = Flask(__name__)
 
+# Long-running simulations run as background jobs (see get_job_queue)
+job_queue = None
+job_queue_lock = threading.Lock()
+
 @app.route('/')
 def index():
     """Render the main page"""
@@ -28,60 +37,8 @@ def index():
 
 @app.route('/run_simulation', methods=['POST'])
 def run_simulation():
-    """Run a simulation with the given parameters"""
-    # Get parameters from request
-    data = request.json
-    
-    # Set up settings
-    settings = Settings(auto_config=True)
-    
-    # Override settings with user input if provided
-    if 'num_agents' in data:
-        settings.number_of_agents = int(data['num_agents'])
-    if 'max_iteration' in data:
-        settings.max_iteration = int(data['max_iteration'])
-    if 'agent_types' in data:
-        settings.agent_types = data['agent_types']
-    if 'health_config' in data:
-        settings.starting_health_config = int(data['health_config'])
-    if 'anim_profile' in data:
-        settings.anim_profile = int(data['anim_profile'])
-    if 'beta' in data:
-        settings.beta = float(data['beta'])
-    
-    # Apply alpha (main learning rate) if provided
-    if 'alpha' in data:
-        settings.alpha = float(data['alpha'])
-    
-    # Apply RL settings if provided
-    if 'learning_rate' in data:
-        settings.learning_rate = float(data['learning_rate'])
-    if 'target_update_frequency' in data:
-        settings.target_update_frequency = int(data['target_update_frequency'])
-    if 'replay_buffer_size' in data:
-        settings.replay_buffer_size = int(data['replay_buffer_size'])
-    if 'batch_size' in data:
-        settings.batch_size = int(data['batch_size'])
-    if 'initial_epsilon' in data:
-        settings.initial_epsilon = float(data['initial_epsilon'])
-    if 'epsilon_decay' in data:
-        settings.epsilon_decay = float(data['epsilon_decay'])
-    if 'min_epsilon' in data:
-        settings.min_epsilon = float(data['min_epsilon'])
-    if 'hidden_size' in data:
-        settings.hidden_size = int(data['hidden_size'])
-    
-    # Initialize simulation
-    simulation = Simulation(settings)
-    
-    # Create visualizer
-    visualizer = WebSimulationVisualizer(simulation)
-    
-    # Get HTML animation
-    html_animation = visualizer.get_html_animation()
-    
-    # Return HTML animation
-    return jsonify({'animation_html': html_animation})
+    """Queue a simulation with the given parameters (same as POST /jobs/run_simulation)"""
+    return submit_job('run_simulation')
 
 @app.route('/static_image', methods=['POST'])
 def static_image():
@@ -125,65 +82,77 @@ def static_image():
 
 @app.route('/train_and_run', methods=['POST'])
 def train_and_run():
-    """Train agents and run a full simulation"""
-    # Get parameters from request
-    data = request.json
-    
-    # Set up settings
-    settings = Settings(auto_config=True)
-    
-    # Override settings with user input if provided
-    if 'num_agents' in data:
-        settings.number_of_agents = int(data['num_agents'])
-    if 'max_iteration' in data:
-        settings.max_iteration = int(data['max_iteration'])
-    if 'agent_types' in data:
-        settings.agent_types = data['agent_types']
-    if 'health_config' in data:
-        settings.starting_health_config = int(data['health_config'])
-    if 'anim_profile' in data:
-        settings.anim_profile = int(data['anim_profile'])
-    if 'beta' in data:
-        settings.beta = float(data['beta'])
-    
-    # Apply alpha (main learning rate) if provided
-    if 'alpha' in data:
-        settings.alpha = float(data['alpha'])
-    
-    # Apply RL settings if provided
-    if 'learning_rate' in data:
-        settings.learning_rate = float(data['learning_rate'])
-    if 'target_update_frequency' in data:
-        settings.target_update_frequency = int(data['target_update_frequency'])
-    if 'replay_buffer_size' in data:
-        settings.replay_buffer_size = int(data['replay_buffer_size'])
-    if 'batch_size' in data:
-        settings.batch_size = int(data['batch_size'])
-    if 'initial_epsilon' in data:
-        settings.initial_epsilon = float(data['initial_epsilon'])
-    if 'epsilon_decay' in data:
-        settings.epsilon_decay = float(data['epsilon_decay'])
-    if 'min_epsilon' in data:
-        settings.min_epsilon = float(data['min_epsilon'])
-    if 'hidden_size' in data:
-        settings.hidden_size = int(data['hidden_size'])
-    
-    # Initialize simulation
-    simulation = Simulation(settings)
-    
-    # Train agents
-    simulation.train()
-    
-    # Create visualizer for the final game
-    visualizer = WebSimulationVisualizer(simulation)
-    
-    # Get HTML animation
-    html_animation = visualizer.get_html_animation()
-    
-    # Return HTML animation
-    return jsonify({'animation_html': html_animation})
+    """Queue training and a full simulation (same as POST /jobs/train_and_run)"""
+    return submit_job('train_and_run')
+
+@app.route('/stream/<kind>', methods=['POST'])
+def stream_simulation(kind):
+    """Play a run_simulation or train_and_run request step by step, streaming one JSON record per line (NDJSON)"""
+    if kind not in simulation_jobs.STREAMS:
+        return jsonify({'error': f'Unknown stream kind: {kind}'}), 404
+    # The game is played by a job worker process; closing the response (the client went away) cancels it
+    try:
+        records = get_job_queue().stream(kind, request.json)
+    except QueueFull as error:
+        return jsonify({'error': f'Too many queued jobs, try again later ({error})'}), 429
+    lines = (json.dumps(record) + '\n' for record in records)
+    # Each record is sent as soon as it is produced; ask proxies not to buffer the response
+    return Response(ClosingIterator(lines, records.close), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def get_job_queue():
+    """The background job queue, started on first use (so spawned worker processes never start one)"""
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = JobQueue(simulation_jobs.JOBS, simulation_jobs.STREAMS,
+                                 max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+                                 max_queued=int(os.environ.get('JOB_QUEUE_SIZE', 8)))
+        return job_queue
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    """Queue a run_simulation or train_and_run job and return its id at once"""
+    if kind not in simulation_jobs.JOBS:
+        return jsonify({'error': f'Unknown job kind: {kind}'}), 404
+    try:
+        job_id = get_job_queue().submit(kind, request.json)
+    except QueueFull as error:
+        return jsonify({'error': f'Too many queued jobs, try again later ({error})'}), 429
+    return jsonify({'job_id': job_id}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """State and progress of a job"""
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Result of a finished job (202 with the status while it is not done)"""
+    status, result = get_job_queue().result(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if status['state'] != 'done':
+        return jsonify(status), 202 if status['state'] in ('queued', 'running') else 410
+    return jsonify(result)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    status = get_job_queue().cancel(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status)
 
 # Run the Flask app
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
+    # Start the job workers before serving, so no request waits for their startup
+    # (the reloader runs the app in a child process; only that one serves)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_job_queue()
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
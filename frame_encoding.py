@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Delta encoding of animation frames
+Turns consecutive compact frames (see WebSimulationVisualizer.capture_current_state) into periodic keyframes,
+deltas holding only the agents that changed, and runs of unchanged steps; static/js/script.js decodes the same records
+"""
+
+# Per-agent fields of a frame, in the order a delta lists an agent's values
+FIELDS = ('health', 'alive', 'ally')
+
+# Steps between keyframes, which also caps the length of a run of unchanged steps
+KEYFRAME_INTERVAL = 50
+
+
+def encode_frames(frames, keyframe_interval=KEYFRAME_INTERVAL):
+    """
+    Yield the records encoding consecutive frames:
+    - keyframe: the full frame, first, every keyframe_interval steps and wherever a step was skipped
+    - delta: {'changes': [[agent, health, alive, ally], ...]} for the agents that changed since the step before
+    - run: {'repeat': n}, n more steps in which nothing changed
+    Any other keys of a frame (game_over_message, duration) are kept on its record, and such a frame
+    is never folded into a run.
+    """
+    previous = None
+    since_keyframe = 0
+    run = 0
+    for frame in frames:
+        extra = {key: value for key, value in frame.items() if key not in FIELDS and key != 'step'}
+        if previous is None or since_keyframe >= keyframe_interval or frame['step'] != previous['step'] + 1:
+            record = dict(frame)
+            since_keyframe = 0
+        else:
+            changes = [[agent] + [frame[field][agent] for field in FIELDS]
+                       for agent in range(len(frame['alive']))
+                       if any(frame[field][agent] != previous[field][agent] for field in FIELDS)]
+            if not changes and not extra:
+                run += 1
+                since_keyframe += 1
+                previous = frame
+                continue
+            record = dict(extra, changes=changes)
+        if run:
+            yield {'repeat': run}
+            run = 0
+        yield record
+        previous = frame
+        since_keyframe += 1
+    if run:
+        yield {'repeat': run}
+
+
+class FrameDecoder:
+    """Rebuilds full frames from the records of encode_frames, applied in order"""
+
+    def __init__(self):
+        self.frame = None
+
+    def apply(self, record):
+        """Apply one record and return the full frame after it; a run of n steps advances n steps at once"""
+        if 'repeat' in record:
+            frame = {field: self.frame[field] for field in FIELDS}
+            frame['step'] = self.frame['step'] + record['repeat']
+        elif 'changes' in record:
+            frame = {key: value for key, value in record.items() if key != 'changes'}
+            for field in FIELDS:
+                frame[field] = list(self.frame[field])
+            for agent, *values in record['changes']:
+                for field, value in zip(FIELDS, values):
+                    frame[field][agent] = value
+            frame['step'] = self.frame['step'] + 1
+        else:
+            frame = dict(record)
+        self.frame = frame
+        return frame
+
+
+def decode_frames(records):
+    """Yield every step's full frame; the inverse of encode_frames"""
+    decoder = FrameDecoder()
+    for record in records:
+        if 'repeat' in record:
+            for _ in range(record['repeat']):
+                yield decoder.apply({'repeat': 1})
+        else:
+            yield decoder.apply(record)
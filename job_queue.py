@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Background job queue for long-running simulation requests
+Runs jobs on a fixed pool of long-lived worker processes, with progress polling, results and cancellation;
+stream jobs hand their records back to the web process as they are produced
+"""
+
+import atexit
+import collections
+import inspect
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+import uuid
+from multiprocessing.connection import wait
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+def run_job(runner, data, connection):
+    """Run one job in a worker process and send its progress and outcome through the connection;
+    a stream job's runner is a generator, whose records are sent one by one before the outcome"""
+    def progress(phase, completed=None, total=None):
+        connection.send(('progress', {'phase': phase, 'completed': completed, 'total': total}))
+
+    try:
+        result = runner(data, progress)
+        if inspect.isgenerator(result):
+            for record in result:
+                connection.send(('record', record))
+            result = None
+        connection.send(('result', result))
+    except Exception:
+        connection.send(('error', traceback.format_exc()))
+
+
+def run_worker(runners, streams, connection):
+    """Worker process: run the jobs received through the connection, one after another, until it closes.
+    Unpickling the runners imports their modules (torch included) when the worker starts, not per job"""
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        stream, kind, data = message
+        run_job((streams if stream else runners)[kind], data, connection)
+
+
+class Worker:
+    """A long-lived worker process of the pool, and the job it is running"""
+
+    def __init__(self, context, runners, streams):
+        self.connection, child_connection = context.Pipe()
+        # not a daemon, since a job may start processes of its own (parallel training modes):
+        self.process = context.Process(target=run_worker, args=(runners, streams, child_connection))
+        self.process.start()
+        child_connection.close()
+        self.job = None
+
+
+class Job:
+    def __init__(self, kind, data, runner, records=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.data = data
+        self.runner = runner
+        self.records = records  # stream jobs: bounded queue of the records for the web process, None at the end
+        self.state = 'queued'  # queued, running, done, failed or cancelled
+        self.progress = {'phase': None, 'completed': None, 'total': None}
+        self.result = None
+        self.error = None
+        self.worker = None
+        self.submitted = time.time()
+        self.finished = None
+
+    def status(self):
+        return {'job_id': self.id, 'kind': self.kind, 'state': self.state, 'progress': dict(self.progress),
+                'error': self.error, 'submitted': self.submitted, 'finished': self.finished}
+
+
+class JobStream:
+    """Iterator over a stream job's records, as the worker produces them.
+
+    Progress is reported as {'type': 'progress', 'phase', 'completed', 'total'}
+    records among the stream's own ones, and a failed job raises RuntimeError
+    after its last record. close() cancels the job, so a stream whose client
+    went away stops using its worker.
+    """
+
+    def __init__(self, job_queue, job):
+        self.job_queue = job_queue
+        self.job = job
+        self.job_id = job.id
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        record = self.job.records.get()
+        if self.job.records.qsize() == self.job_queue.stream_buffer - 1:
+            self.job_queue.wake()  # the buffer was full, so the collector stopped reading this stream
+        if record is None:
+            self.job.records.put(None)  # keep the end marker for any later call
+            self.close()
+            if self.job.state == 'failed':
+                raise RuntimeError(f"Stream job {self.job_id} failed:\n{self.job.error}")
+            raise StopIteration
+        return record
+
+    def close(self):
+        self.job_queue.cancel(self.job_id)
+
+
+class JobQueue:
+    """Fixed pool of long-lived worker processes running submitted jobs.
+
+    runners maps each job kind to a module-level function runner(data,
+    progress) returning the job's result; it runs in a spawned worker, so
+    torch and the GIL never serialize jobs and the web threads stay free.
+    streams maps each stream kind to a module-level generator function
+    taking the same arguments; see stream(). The max_workers workers are
+    started with the queue and run one job after another, so a job pays
+    neither a process start nor the torch import. At most max_queued jobs
+    wait for a worker; submitting beyond that raises QueueFull. A collector
+    thread receives every job's progress and outcome over its worker's pipe.
+    Cancelling a running job terminates its worker and starts a replacement.
+    Finished jobs are kept, for their results, up to keep_finished of them.
+
+    A stream buffers at most stream_buffer records in the web process: while
+    its client is behind, the collector stops reading the worker's pipe, so
+    the worker blocks once the pipe is full instead of the web process
+    holding the whole game.
+
+    Jobs live in the serving process: run the web app as one process (with
+    threads) so every status poll reaches the process that owns the job.
+    """
+
+    def __init__(self, runners, streams=None, max_workers=2, max_queued=8, keep_finished=32, stream_buffer=64):
+        self.runners = runners
+        self.streams = streams or {}
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self.stream_buffer = stream_buffer
+        self.context = mp.get_context('spawn')
+        self.jobs = {}
+        self.pending = collections.deque()
+        self.finished = collections.deque()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.retired = []  # pipes of replaced workers, closed by the collector while it is not waiting on them
+        # wakes the collector when the set of pipes it should read changes:
+        self.wake_receiver, self.wake_sender = self.context.Pipe(duplex=False)
+        self.wake_lock = threading.Lock()
+        self.workers = [Worker(self.context, self.runners, self.streams) for _ in range(max_workers)]
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, kind, data):
+        """Queue a job and return its id at once"""
+        if kind not in self.runners:
+            raise KeyError(kind)
+        return self.add(Job(kind, data, self.runners[kind])).id
+
+    def stream(self, kind, data):
+        """Queue a stream job and return a JobStream over its records"""
+        if kind not in self.streams:
+            raise KeyError(kind)
+        # one slot more than the collector fills, for the end marker:
+        records = queue.Queue(maxsize=self.stream_buffer + 1)
+        return JobStream(self, self.add(Job(kind, data, self.streams[kind], records=records)))
+
+    def add(self, job):
+        """Queue a job, starting it if a worker is free"""
+        with self.lock:
+            if len(self.pending) >= self.max_queued:
+                raise QueueFull(f"{len(self.pending)} jobs are already waiting")
+            self.jobs[job.id] = job
+            self.pending.append(job)
+            self.schedule()
+        return job
+
+    def schedule(self):
+        """Hand waiting jobs to idle workers (lock held)"""
+        for worker in self.workers:
+            if not self.pending:
+                break
+            if worker.job is None:
+                job = self.pending.popleft()
+                try:
+                    worker.connection.send((job.records is not None, job.kind, job.data))
+                except OSError:
+                    pass  # the worker just died; the collector fails the job when it reads the pipe
+                worker.job = job
+                job.worker = worker
+                job.state = 'running'
+
+    def replace(self, worker):
+        """Terminate a worker and start another in its place; returns the old process, to be joined
+        once the lock is released (lock held)"""
+        worker.process.terminate()
+        self.retired.append(worker.connection)
+        self.workers[self.workers.index(worker)] = Worker(self.context, self.runners, self.streams)
+        self.wake()
+        return worker.process
+
+    def finish(self, job, state):
+        """Move a job out of its worker (lock held)"""
+        job.state = state
+        job.finished = time.time()
+        if job.worker is not None:
+            job.worker.job = None
+            job.worker = None
+        if job.records is not None:
+            job.records.put(None)
+        self.finished.append(job)
+        while len(self.finished) > self.keep_finished:
+            self.jobs.pop(self.finished.popleft().id, None)
+
+    def wake(self):
+        """Make the collector rebuild the set of pipes it reads"""
+        with self.wake_lock:
+            self.wake_sender.send(None)
+
+    def readable(self, worker):
+        """Whether the collector reads the worker's pipe: not while its stream's buffer is full (lock held)"""
+        job = worker.job
+        return job is None or job.records is None or job.records.qsize() < self.stream_buffer
+
+    def collect(self):
+        """Collector thread: receive the running jobs' messages and replace workers that died"""
+        while True:
+            with self.lock:
+                for connection in self.retired:
+                    connection.close()
+                self.retired = []
+                if self.closed:
+                    return
+                watched = {worker.connection: worker for worker in self.workers if self.readable(worker)}
+            ready = wait(list(watched) + [self.wake_receiver])
+            stopped = []
+            with self.lock:
+                for connection in ready:
+                    if connection is self.wake_receiver:
+                        while connection.poll():
+                            connection.recv()
+                        continue
+                    worker = watched[connection]
+                    if worker not in self.workers:
+                        continue  # replaced meanwhile (its job was cancelled)
+                    job = worker.job
+                    try:
+                        kind, payload = connection.recv()
+                    except (EOFError, OSError):
+                        # the process ended (killed, out of memory), with or without a job:
+                        if job is not None:
+                            job.error = f"Worker process exited with code {worker.process.exitcode}"
+                            self.finish(job, 'failed')
+                        stopped.append(self.replace(worker))
+                        continue
+                    if kind == 'progress':
+                        job.progress = payload
+                        if job.records is not None:
+                            job.records.put(dict(payload, type='progress'))
+                    elif kind == 'record':
+                        job.records.put(payload)
+                    elif kind == 'result':
+                        job.result = payload
+                        self.finish(job, 'done')
+                    else:
+                        job.error = payload
+                        self.finish(job, 'failed')
+                self.schedule()
+            for process in stopped:
+                process.join()
+
+    def status(self, job_id):
+        """Status of a job, None if unknown; queued jobs also report their place in the queue"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            status = job.status()
+            if job.state == 'queued':
+                status['queue_position'] = list(self.pending).index(job) + 1
+            return status
+
+    def result(self, job_id):
+        """(status, result) of a job; the result is None until the job is done"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None, None
+            return job.status(), job.result
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns its status, None if unknown"""
+        stopped = None
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.state == 'queued':
+                self.pending.remove(job)
+                self.finish(job, 'cancelled')
+            elif job.state == 'running':
+                stopped = self.replace(job.worker)
+                self.finish(job, 'cancelled')
+                self.schedule()
+            status = job.status()
+        if stopped is not None:
+            stopped.join()
+        return status
+
+    def shutdown(self):
+        """Cancel every job and stop the workers (at interpreter exit)"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            while self.pending:
+                self.finish(self.pending.popleft(), 'cancelled')
+            for worker in self.workers:
+                if worker.job is not None:
+                    self.finish(worker.job, 'cancelled')
+                worker.process.terminate()
+                self.retired.append(worker.connection)
+            workers, self.workers = self.workers, []
+        self.wake()
+        for worker in workers:
+            worker.process.join()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Registry of trained policies for the web endpoints
+Caches the shared RL policy trained for each distinct training configuration on local disk,
+so repeat requests skip training and go straight to the final game
+"""
+
+import glob
+import hashlib
+import json
+import os
+import time
+import torch
+
+from CodeBase.Agent import Agent
+
+# Settings that shape the trained policy: the game, the rewards, the learner and the replay buffer.
+# Only these make up the key; serving, engine, parallelism, seeding and checkpoint settings are left out
+TRAINING_FIELDS = (
+    'number_of_agents', 'agent_types', 'starting_health_config', 'anim_profile', 'max_iteration',
+    'health_granularity', 'max_health', 'alpha', 'beta',
+    'baseline_att_prob', 'baseline_def_prob', 'baseline_recover_prob', 'baseline_underattack_attack_multiplier',
+    'baseline_notunderattack_attack_prob', 'attack_dead_opponent_penalty', 'attack_alliance_member_penalty',
+    'propose_alliance_member_penalty', 'animosity_decrease_prob', 'animosity_decrease_prob_alliance_proposal',
+    'animosity_increase_prob', 'alliance_prob_with_some_animosity_baseline', 'alliance_prob_with_no_animosity',
+    'alliance_status_weight', 'stalemate_window', 'stalemate_patience',
+    'learning_rate', 'target_update_frequency', 'replay_buffer_size', 'batch_size', 'initial_epsilon',
+    'epsilon_decay', 'min_epsilon', 'hidden_size', 'updates_per_step', 'gradient_steps', 'soft_target_tau',
+    'grad_clip_norm', 'prioritized_replay', 'per_alpha', 'per_beta', 'per_beta_increment', 'per_epsilon',
+)
+
+
+def settings_key(settings):
+    """Canonical hash of the training Settings fields (TRAINING_FIELDS)"""
+    fields = {name: getattr(settings, name, None) for name in TRAINING_FIELDS}
+    canonical = json.dumps(fields, sort_keys=True, default=repr)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PolicyRegistry:
+    """Trained policies on local disk, keyed by settings_key, with LRU eviction.
+
+    An entry holds the shared policy's weights and every agent's exploration
+    rate at the end of training (the final game still explores with it).
+    Entries are written atomically, a cache hit refreshes the entry's
+    modification time, and storing beyond capacity evicts the entries used
+    least recently; using file times keeps the order shared between web
+    worker processes.
+    """
+
+    def __init__(self, directory='policy_cache', capacity=32):
+        if capacity < 1:
+            raise ValueError(f"Policy cache capacity must be at least 1, got {capacity}")
+        self.directory = directory
+        self.capacity = capacity
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pt")
+
+    def restore(self, simulation):
+        """Load the cached policy for the simulation's settings; True on a hit.
+
+        The shared policy left by earlier simulations in this process is first replaced
+        with a fresh one for this simulation's agents, so a miss trains from scratch.
+        """
+        Agent.reset_shared_policy(simulation.env.agents_list, simulation.settings)
+        path = self.path(settings_key(simulation.settings))
+        try:
+            entry = torch.load(path, map_location='cpu')
+        except (FileNotFoundError, RuntimeError, EOFError):
+            return False
+        if entry['policy'] is not None:
+            if Agent.shared_policy_net is None:
+                return False
+            Agent.shared_policy_net.load_state_dict(entry['policy'])
+            Agent.shared_policy_version += 1
+            Agent.shared_target_net.load_state_dict(entry['policy'])
+            Agent.shared_target_version += 1
+        for agent, epsilon in zip(simulation.env.agents_list, entry['epsilons']):
+            agent.epsilon = epsilon
+        os.utime(path)
+        return True
+
+    def store(self, simulation):
+        """Cache the simulation's trained policy and evict the least recently used entries"""
+        policy = None
+        if Agent.shared_policy_net is not None:
+            policy = {name: tensor.detach().cpu() for name, tensor in Agent.shared_policy_net.state_dict().items()}
+        entry = {'policy': policy, 'epsilons': [agent.epsilon for agent in simulation.env.agents_list],
+                 'stored': time.time()}
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(settings_key(simulation.settings))
+        temporary = f"{path}.{os.getpid()}.tmp"
+        torch.save(entry, temporary)
+        os.replace(temporary, path)
+
+        entries = sorted(glob.glob(os.path.join(self.directory, '*.pt')), key=os.path.getmtime)
+        for old in entries[:len(entries) - self.capacity]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Simulation work behind the web endpoints
+Each job takes the request's JSON settings and an optional progress callback, and returns the response payload;
+the jobs run in the long-lived worker processes of job_queue;
+the stream functions take the same arguments but yield the game step by step as it is played, and run as stream
+jobs (see JobQueue.stream)
+"""
+
+import os
+import matplotlib
+matplotlib.use('Agg')  # Use Agg backend, jobs may run in worker processes without a display
+from web_visualizer import WebSimulationVisualizer
+from CodeBase.Agent import Agent
+from CodeBase.Settings import Settings
+from CodeBase.Simulation import Simulation
+from policy_registry import PolicyRegistry
+from frame_encoding import encode_frames
+
+# Trained policies cached by training configuration, so repeat requests skip training
+policy_registry = PolicyRegistry(os.environ.get('POLICY_CACHE_DIR', 'policy_cache'),
+                                 int(os.environ.get('POLICY_CACHE_SIZE', 32)))
+
+
+def settings_from_request(data):
+    """Settings for a simulation request, overriding the defaults with the user input provided"""
+    settings = Settings(auto_config=True)
+
+    if 'num_agents' in data:
+        settings.number_of_agents = int(data['num_agents'])
+    if 'max_iteration' in data:
+        settings.max_iteration = int(data['max_iteration'])
+    if 'agent_types' in data:
+        settings.agent_types = data['agent_types']
+    if 'health_config' in data:
+        settings.starting_health_config = int(data['health_config'])
+    if 'anim_profile' in data:
+        settings.anim_profile = int(data['anim_profile'])
+    if 'beta' in data:
+        settings.beta = float(data['beta'])
+
+    # Apply alpha (main learning rate) if provided
+    if 'alpha' in data:
+        settings.alpha = float(data['alpha'])
+
+    # Apply RL settings if provided
+    if 'learning_rate' in data:
+        settings.learning_rate = float(data['learning_rate'])
+    if 'target_update_frequency' in data:
+        settings.target_update_frequency = int(data['target_update_frequency'])
+    if 'replay_buffer_size' in data:
+        settings.replay_buffer_size = int(data['replay_buffer_size'])
+    if 'batch_size' in data:
+        settings.batch_size = int(data['batch_size'])
+    if 'initial_epsilon' in data:
+        settings.initial_epsilon = float(data['initial_epsilon'])
+    if 'epsilon_decay' in data:
+        settings.epsilon_decay = float(data['epsilon_decay'])
+    if 'min_epsilon' in data:
+        settings.min_epsilon = float(data['min_epsilon'])
+    if 'hidden_size' in data:
+        settings.hidden_size = int(data['hidden_size'])
+
+    return settings
+
+
+def no_progress(phase, completed=None, total=None):
+    pass
+
+
+def new_simulation(data):
+    """A Simulation for the request whose RL agents start from a fresh shared policy; the shared policy is
+    process-wide, and a worker process runs many jobs, for other numbers of agents too"""
+    simulation = Simulation(settings_from_request(data))
+    Agent.reset_shared_policy(simulation.env.agents_list, simulation.settings)
+    return simulation
+
+
+def run_simulation(data, progress=no_progress):
+    """Run a simulation with the given parameters"""
+    progress('setup')
+    simulation = new_simulation(data)
+
+    # Play the game and return its frames for the browser to draw
+    progress('playing')
+    visualizer = WebSimulationVisualizer(simulation)
+    return {'animation': visualizer.get_animation()}
+
+
+def train_and_run(data, progress=no_progress):
+    """Train agents and run a full simulation"""
+    progress('setup')
+    simulation = new_simulation(data)
+
+    # Train agents, unless a policy trained with the same settings is cached
+    if not policy_registry.restore(simulation):
+        progress('training', 0, None)
+        simulation.train(progress=lambda completed, total: progress('training', completed, total))
+        policy_registry.store(simulation)
+
+    # Play the final game and return its frames for the browser to draw
+    progress('playing')
+    visualizer = WebSimulationVisualizer(simulation)
+    return {'animation': visualizer.get_animation()}
+
+
+# Job kinds the web endpoints accept
+JOBS = {
+    'run_simulation': run_simulation,
+    'train_and_run': train_and_run,
+}
+
+
+def stream_game(simulation):
+    """Yield the final game as records: 'start' with the agents, the delta-encoded frames as they are played, then 'end'"""
+    visualizer = WebSimulationVisualizer(simulation)
+    yield dict(type='start', **visualizer.describe_agents())
+    for record in encode_frames(visualizer.stream_states()):
+        yield {'type': 'frame', 'frame': record}
+    yield {'type': 'end'}
+
+
+def stream_simulation(data, progress=no_progress):
+    """Run a simulation with the given parameters, yielding its steps as they are played"""
+    simulation = new_simulation(data)
+    yield from stream_game(simulation)
+
+
+def stream_train_and_run(data, progress=no_progress):
+    """Train agents (reporting progress) unless a cached policy exists, then yield the final game's steps"""
+    simulation = new_simulation(data)
+    if not policy_registry.restore(simulation):
+        progress('training', 0, None)
+        simulation.train(progress=lambda completed, total: progress('training', completed, total))
+        policy_registry.store(simulation)
+    yield from stream_game(simulation)
+
+
+# Streams the web endpoints accept, by the same names as the job kinds
+STREAMS = {
+    'run_simulation': stream_simulation,
+    'train_and_run': stream_train_and_run,
+}
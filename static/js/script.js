@@ -56,8 +56,9 @@ document.addEventListener('DOMContentLoaded', function() {
     const minEpsilonValue = document.getElementById('min-epsilon-value');
     const hiddenSizeValue = document.getElementById('hidden-size-value');
     
-    // Store the last animation data for reloading
-    let lastAnimationData = null;
+    let currentJobId = null; // Background job of the simulation in progress
+    let currentStream = null; // AbortController of the simulation being streamed
+    let currentPlayer = null; // Canvas player of the streamed simulation
     
     // Check if running on local machine
     const isLocalMachine = window.location.hostname === 'localhost' || 
@@ -362,41 +363,6 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 200);
     }
     
-    // Helper: inject HTML with scripts
-    function injectHTMLWithScripts(target, htmlString) {
-        // Insert the HTML
-        target.innerHTML = htmlString;
-
-        // Reactivate each <script> tag
-        target.querySelectorAll('script').forEach(old => {
-            const s = document.createElement('script');
-            if (old.src)   s.src   = old.src;
-            if (old.type)  s.type  = old.type;
-            if (old.id)    s.id    = old.id;
-            if (old.async) s.async = old.async;
-            s.textContent = old.textContent;
-            old.replaceWith(s);
-        });
-        
-        // Format end messages better and maintain bar chart size
-        setTimeout(() => {
-            // Handle end messages
-            const endMessages = target.querySelectorAll('.js-plotly-plot + div');
-            endMessages.forEach(msg => {
-                if (msg.textContent && !msg.classList.contains('end-message')) {
-                    msg.className = 'end-message';
-                }
-            });
-            
-            // Ensure plotly charts maintain their size
-            const plotlyCharts = target.querySelectorAll('.js-plotly-plot');
-            plotlyCharts.forEach(chart => {
-                chart.style.minHeight = '450px';
-                chart.style.width = '100%';
-            });
-        }, 500);
-    }
-    
     /**
      * Runs the simulation with current settings
      * @param {boolean} withTraining - Whether to train agents before running
@@ -423,109 +389,540 @@ document.addEventListener('DOMContentLoaded', function() {
         // Update status
         setStatus('Processing', 'warning');
         
-        // Use the appropriate endpoint based on whether training is needed
-        const endpoint = withTraining ? '/train_and_run' : '/run_simulation';
+        // Use the appropriate request kind based on whether training is needed
+        const kind = withTraining ? 'train_and_run' : 'run_simulation';
         
-        // Send request to server
-        fetch(endpoint, {
+        // Stop the previous simulation, if any
+        if (currentStream) {
+            currentStream.abort();
+            currentStream = null;
+        }
+        if (currentPlayer) {
+            currentPlayer.stop();
+            currentPlayer = null;
+        }
+        
+        // Stream the game step by step when the browser can read responses incrementally
+        if (window.ReadableStream && window.TextDecoder && window.AbortController) {
+            streamSimulation(kind, settings);
+            return;
+        }
+        
+        // Otherwise run it on the server as a background job
+        runJob(kind, settings)
+        .then(data => {
+            // Play the returned frames on a canvas
+            const animation = data.animation;
+            showAnimationContainer();
+            currentPlayer = createFramePlayer(animation);
+            animationContainer.appendChild(currentPlayer.canvas);
+            animation.frames.forEach(record => currentPlayer.push(record));
+            currentPlayer.finish();
+            
+            // Update status
+            setStatus('Complete', 'success');
+        })
+        .catch(error => {
+            // A newer simulation took over the display
+            if (error.message === 'Job replaced') {
+                return;
+            }
+            showSimulationError(error);
+        });
+    }
+    
+    /**
+     * Streams a simulation from the server, drawing each step as soon as it arrives
+     * @param {string} kind - Stream kind ('run_simulation' or 'train_and_run')
+     * @param {Object} settings - The simulation settings
+     */
+    function streamSimulation(kind, settings) {
+        const controller = new AbortController();
+        currentStream = controller;
+        let player = null;
+        let ended = false;
+        
+        fetch(`/stream/${kind}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify(settings),
+            signal: controller.signal,
         })
         .then(response => {
             if (!response.ok) {
                 throw new Error(`HTTP error! Status: ${response.status}`);
             }
-            return response.json();
+            return readRecords(response, record => {
+                if (record.type === 'progress') {
+                    statusBadge.textContent = describeJobProgress({ state: 'running', progress: record });
+                } else if (record.type === 'start') {
+                    // Show the game as soon as its first step arrives
+                    player = createFramePlayer(record);
+                    currentPlayer = player;
+                    showAnimationContainer();
+                    animationContainer.appendChild(player.canvas);
+                    setStatus('Streaming', 'info');
+                } else if (record.type === 'frame') {
+                    player.push(record.frame);
+                } else if (record.type === 'end') {
+                    player.finish();
+                    ended = true;
+                }
+            });
         })
-        .then(data => {
-            // Store animation data for potential reuse
-            lastAnimationData = data.animation_html;
-            
-            // Hide loading spinner with fade-out
-            loadingSpinner.style.opacity = '0';
-            setTimeout(() => {
-                loadingSpinner.style.display = 'none';
-            }, 300);
-            
-            // Clear existing content to prevent display issues
-            animationContainer.innerHTML = '';
-            
-            // Show animation container with fade-in
-            animationContainer.style.display = 'block';
-            animationContainer.style.opacity = '0';
-            setTimeout(() => {
-                animationContainer.style.transition = 'opacity 0.5s ease';
-                animationContainer.style.opacity = '1';
-                staticPreview.style.display = 'none';
-            }, 10);
-            
-            // Inject animation HTML with scripts
-            injectHTMLWithScripts(animationContainer, data.animation_html);
-            
-            // Update status
+        .then(() => {
+            // the server stops sending without an 'end' record if the simulation failed
+            if (!ended) {
+                throw new Error('Simulation stream ended early');
+            }
+            if (currentStream === controller) {
+                currentStream = null;
+            }
             setStatus('Complete', 'success');
-            
-            // Scroll to animation if needed
-            const rect = animationContainer.getBoundingClientRect();
-            if (rect.top < 0 || rect.bottom > window.innerHeight) {
-                animationContainer.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        })
+        .catch(error => {
+            // A newer simulation took over the display
+            if (error.name === 'AbortError') {
+                return;
+            }
+            if (player) {
+                player.stop();
+            }
+            showSimulationError(error);
+        });
+    }
+    
+    /**
+     * Reads a newline-delimited JSON response, handing each record over as soon as its line is complete
+     * @param {Response} response - The fetch response
+     * @param {Function} onRecord - Called with each parsed record
+     * @returns {Promise} Resolves once the response has been read to the end
+     */
+    function readRecords(response, onRecord) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        
+        const read = () => reader.read().then(({ done, value }) => {
+            buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+            if (!done) {
+                return read();
+            }
+            if (buffered.trim()) {
+                onRecord(JSON.parse(buffered));
+            }
+        });
+        return read();
+    }
+    
+    /**
+     * Creates a canvas that plays delta-encoded frames (see frame_encoding.py) as they are pushed, decoding them
+     * as it goes; a frame stays visible for its duration, by default 250ms like the matplotlib animation.
+     * Click it to pause or resume
+     * @param {Object} start - The agents, the health scale and the frame interval (see WebSimulationVisualizer.describe_agents)
+     * @returns {Object} The player: its canvas, push(record), finish() and stop()
+     */
+    function createFramePlayer(start) {
+        const canvas = document.createElement('canvas');
+        canvas.className = 'simulation-canvas';
+        canvas.width = Math.max(800, 500 + start.agents.length * 50);
+        canvas.height = 560;
+        
+        const records = [];
+        let position = -1;  // index of the record being played
+        let repeated = 0;   // steps of that record's run played so far
+        let frame = null;   // the decoded frame on display
+        let finished = false;
+        let paused = false;
+        let timer = null;
+        
+        // Decode the next step into frame; false when no record is left to play
+        const advance = () => {
+            const current = records[position];
+            if (current && current.repeat !== undefined && repeated < current.repeat) {
+                repeated++;
+                frame = decodeRecord({ repeat: 1 }, frame);
+                return true;
+            }
+            if (position + 1 >= records.length) {
+                return false;
+            }
+            position++;
+            repeated = 0;
+            if (records[position].repeat !== undefined) {
+                return advance();
+            }
+            frame = decodeRecord(records[position], frame);
+            return true;
+        };
+        
+        const tick = () => {
+            timer = null;
+            if (advance()) {
+                drawFrame(canvas, start, frame);
+                timer = setTimeout(tick, frame.duration || start.frame_interval);
+            } else if (finished && records.length > 0) {
+                // play again from the first record, a keyframe
+                position = -1;
+                repeated = 0;
+                tick();
+            }
+            // otherwise wait for the next record to arrive
+        };
+        
+        const schedule = () => {
+            if (!timer && !paused) {
+                timer = setTimeout(tick, 0);
             }
+        };
+        
+        canvas.addEventListener('click', () => {
+            paused = !paused;
+            if (paused) {
+                clearTimeout(timer);
+                timer = null;
+            } else {
+                schedule();
+            }
+        });
+        
+        return {
+            canvas: canvas,
+            push(record) {
+                records.push(record);
+                schedule();
+            },
+            finish() {
+                finished = true;
+                schedule();
+            },
+            stop() {
+                paused = true;
+                clearTimeout(timer);
+                timer = null;
+            },
+        };
+    }
+    
+    /**
+     * Decodes one record of a delta-encoded frame sequence (see frame_encoding.py) on the frame before it
+     * @param {Object} record - A keyframe (a full frame), a delta ({changes}) or a run of unchanged steps ({repeat})
+     * @param {Object} previous - The frame before the record
+     * @returns {Object} The frame after the record
+     */
+    function decodeRecord(record, previous) {
+        if (record.repeat !== undefined) {
+            return { step: previous.step + record.repeat, health: previous.health, alive: previous.alive, ally: previous.ally };
+        }
+        if (record.changes) {
+            const frame = Object.assign({}, record, {
+                step: previous.step + 1,
+                health: previous.health.slice(),
+                alive: previous.alive.slice(),
+                ally: previous.ally.slice(),
+            });
+            delete frame.changes;
+            record.changes.forEach(([agent, health, alive, ally]) => {
+                frame.health[agent] = health;
+                frame.alive[agent] = alive;
+                frame.ally[agent] = ally;
+            });
+            return frame;
+        }
+        return record;
+    }
+    
+    /**
+     * Draws one frame: health bars, alliance links, step and alive counters, and the game over message
+     * @param {HTMLCanvasElement} canvas - The canvas to draw on
+     * @param {Object} start - The agents and the health scale
+     * @param {Object} frame - The frame: per-agent health ticks, alive flags and allies
+     */
+    function drawFrame(canvas, start, frame) {
+        const context = canvas.getContext('2d');
+        const width = canvas.width;
+        const height = canvas.height;
+        const plot = { left: 80, right: width - 30, top: 70, bottom: height - 80 };
+        const numAgents = start.agents.length;
+        const maxValue = start.max_health * 1.1; // 10% margin at the top
+        const slot = (plot.right - plot.left) / numAgents;
+        const barWidth = slot * 0.6;
+        const x = i => plot.left + slot * (i + 0.5);
+        const y = value => plot.bottom - (value / maxValue) * (plot.bottom - plot.top);
+        
+        // Background and title
+        context.fillStyle = '#14141E';
+        context.fillRect(0, 0, width, height);
+        context.fillStyle = '#DCDCDC';
+        context.textAlign = 'center';
+        context.textBaseline = 'middle';
+        context.font = '20px sans-serif';
+        context.fillText('Multi-Agent War Simulation', width / 2, 30);
+        
+        // Health axis with grid lines
+        context.font = '12px sans-serif';
+        context.strokeStyle = 'rgba(220, 220, 220, 0.15)';
+        context.lineWidth = 1;
+        for (let i = 0; i <= 4; i++) {
+            const value = start.max_health * i / 4;
+            context.beginPath();
+            context.moveTo(plot.left, y(value));
+            context.lineTo(plot.right, y(value));
+            context.stroke();
+            context.textAlign = 'right';
+            context.fillText(value.toFixed(1), plot.left - 8, y(value));
+        }
+        context.save();
+        context.translate(24, (plot.top + plot.bottom) / 2);
+        context.rotate(-Math.PI / 2);
+        context.textAlign = 'center';
+        context.font = '14px sans-serif';
+        context.fillText('Health', 0, 0);
+        context.restore();
+        
+        // Health bars with their value, agent and type labels
+        start.agents.forEach((info, i) => {
+            const alive = frame.alive[i];
+            const health = alive ? frame.health[i] * start.health_unit : 0.05; // small red bar for a dead agent
+            context.globalAlpha = 0.7;
+            context.fillStyle = alive ? info.color : '#FF6464';
+            context.fillRect(x(i) - barWidth / 2, y(health), barWidth, plot.bottom - y(health));
+            context.globalAlpha = 1;
             
-            // Add MutationObserver to monitor for end messages and maintain chart size
-            const observer = new MutationObserver((mutations) => {
-                mutations.forEach((mutation) => {
-                    if (mutation.addedNodes.length > 0) {
-                        mutation.addedNodes.forEach((node) => {
-                            if (node.nodeType === 1) { // Element node
-                                // Check for end messages
-                                if (node.textContent && node.previousElementSibling && 
-                                    node.previousElementSibling.classList.contains('js-plotly-plot')) {
-                                    node.className = 'end-message';
-                                }
-                                
-                                // Check for plotly charts
-                                if (node.classList && node.classList.contains('js-plotly-plot')) {
-                                    node.style.minHeight = '450px';
-                                    node.style.width = '100%';
-                                }
-                            }
-                        });
-                    }
+            context.textAlign = 'center';
+            context.textBaseline = 'bottom';
+            context.font = '13px sans-serif';
+            context.fillStyle = alive ? '#DCDCDC' : '#FF6464';
+            context.fillText(alive ? health.toFixed(1) : 'DEAD', x(i), y(health) - 4);
+            
+            context.textBaseline = 'middle';
+            context.fillStyle = info.color;
+            context.beginPath();
+            context.arc(x(i), plot.bottom + 16, 6, 0, 2 * Math.PI);
+            context.fill();
+            context.fillStyle = '#DCDCDC';
+            context.font = '12px sans-serif';
+            context.fillText(info.type, x(i), plot.bottom + 36);
+            context.fillText(`Agent ${info.id}`, x(i), plot.bottom + 56);
+        });
+        
+        // Alliance links between the bottoms of the allied bars, drawn once per pair
+        context.strokeStyle = '#FF8800';
+        context.lineWidth = 3;
+        context.setLineDash([10, 4]);
+        frame.ally.forEach((ally, i) => {
+            if (frame.alive[i] && ally >= 0 && i < ally) {
+                const distance = x(ally) - x(i);
+                context.beginPath();
+                context.moveTo(x(i), plot.bottom);
+                context.quadraticCurveTo((x(i) + x(ally)) / 2, plot.bottom - distance * 0.3, x(ally), plot.bottom);
+                context.stroke();
+                [x(i), x(ally)].forEach(end => {
+                    context.setLineDash([]);
+                    context.fillStyle = '#FF8800';
+                    context.beginPath();
+                    context.arc(end, plot.bottom, 5, 0, 2 * Math.PI);
+                    context.fill();
+                    context.strokeStyle = 'white';
+                    context.lineWidth = 1;
+                    context.stroke();
+                    context.strokeStyle = '#FF8800';
+                    context.lineWidth = 3;
+                    context.setLineDash([10, 4]);
                 });
+            }
+        });
+        context.setLineDash([]);
+        
+        // Step and alive counters in the top-left corner
+        context.textAlign = 'left';
+        context.textBaseline = 'middle';
+        context.font = '13px sans-serif';
+        const aliveCount = frame.alive.reduce((count, alive) => count + alive, 0);
+        [`Step: ${frame.step}`, `Alive: ${aliveCount}/${numAgents}`].forEach((text, line) => {
+            const top = plot.top + 8 + line * 28;
+            context.fillStyle = 'rgba(30, 30, 40, 0.7)';
+            context.fillRect(plot.left + 8, top, context.measureText(text).width + 16, 22);
+            context.fillStyle = '#DCDCDC';
+            context.fillText(text, plot.left + 16, top + 11);
+        });
+        
+        // Game over message at the center
+        if (frame.game_over_message) {
+            const lines = frame.game_over_message.split('\n');
+            context.font = 'bold 16px sans-serif';
+            const boxWidth = Math.max(...lines.map(line => context.measureText(line).width)) + 48;
+            const boxHeight = lines.length * 26 + 28;
+            const centerY = (plot.top + plot.bottom) / 2;
+            context.globalAlpha = 0.95;
+            context.fillStyle = '#2D2D44';
+            context.fillRect(width / 2 - boxWidth / 2, centerY - boxHeight / 2, boxWidth, boxHeight);
+            context.globalAlpha = 1;
+            context.strokeStyle = '#666666';
+            context.lineWidth = 2;
+            context.strokeRect(width / 2 - boxWidth / 2, centerY - boxHeight / 2, boxWidth, boxHeight);
+            context.textAlign = 'center';
+            context.fillStyle = '#FFFFFF';
+            lines.forEach((line, i) => {
+                context.fillText(line, width / 2, centerY - (lines.length - 1) * 13 + i * 26);
             });
-            
-            // Start observing the animation container
-            observer.observe(animationContainer, { childList: true, subtree: true });
+            context.fillStyle = '#FFD700';
+            context.font = 'bold 18px sans-serif';
+            context.fillText('SIMULATION COMPLETED', width / 2, centerY - boxHeight / 2 - 24);
+        }
+    }
+    
+    /**
+     * Hides the loading spinner and fades in the animation container
+     */
+    function showAnimationContainer() {
+        // Hide loading spinner with fade-out
+        loadingSpinner.style.opacity = '0';
+        setTimeout(() => {
+            loadingSpinner.style.display = 'none';
+        }, 300);
+        
+        // Clear existing content to prevent display issues
+        animationContainer.innerHTML = '';
+        
+        // Show animation container with fade-in
+        animationContainer.style.display = 'block';
+        animationContainer.style.opacity = '0';
+        setTimeout(() => {
+            animationContainer.style.transition = 'opacity 0.5s ease';
+            animationContainer.style.opacity = '1';
+            staticPreview.style.display = 'none';
+        }, 10);
+        
+        // Scroll to animation if needed
+        const rect = animationContainer.getBoundingClientRect();
+        if (rect.top < 0 || rect.bottom > window.innerHeight) {
+            animationContainer.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        }
+    }
+    
+    /**
+     * Shows the error state after a failed simulation
+     * @param {Error} error - The failure
+     */
+    function showSimulationError(error) {
+        console.error('Error:', error);
+        
+        // Hide loading spinner
+        loadingSpinner.style.opacity = '0';
+        setTimeout(() => {
+            loadingSpinner.style.display = 'none';
+        }, 300);
+        
+        // Show preview content again
+        animationContainer.style.display = 'none';
+        staticPreview.style.display = 'block';
+        staticPreview.style.opacity = '0';
+        setTimeout(() => {
+            staticPreview.style.opacity = '1';
+        }, 10);
+        
+        // Update preview message
+        const messageElement = staticPreview.querySelector('p');
+        messageElement.textContent = "Error processing simulation. Please try again.";
+        messageElement.style.color = 'var(--danger)';
+        
+        // Update status
+        setStatus('Error', 'danger');
+    }
+    
+    /**
+     * Submits a background job, cancelling the previous one if it is still running
+     * @param {string} kind - Job kind ('run_simulation' or 'train_and_run')
+     * @param {Object} settings - The simulation settings
+     * @returns {Promise<Object>} The job's result
+     */
+    function runJob(kind, settings) {
+        if (currentJobId) {
+            fetch(`/jobs/${currentJobId}`, { method: 'DELETE' });
+            currentJobId = null;
+        }
+        return fetch(`/jobs/${kind}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(settings),
         })
-        .catch(error => {
-            console.error('Error:', error);
-            
-            // Hide loading spinner
-            loadingSpinner.style.opacity = '0';
-            setTimeout(() => {
-                loadingSpinner.style.display = 'none';
-            }, 300);
-            
-            // Show preview content again
-            staticPreview.style.display = 'block';
-            staticPreview.style.opacity = '0';
-            setTimeout(() => {
-                staticPreview.style.opacity = '1';
-            }, 10);
-            
-            // Update preview message
-            const messageElement = staticPreview.querySelector('p');
-            messageElement.textContent = "Error processing simulation. Please try again.";
-            messageElement.style.color = 'var(--danger)';
-            
-            // Update status
-            setStatus('Error', 'danger');
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(response.status === 429 ? 'Server busy, too many queued simulations' :
+                                `HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            currentJobId = data.job_id;
+            return pollJob(data.job_id);
+        });
+    }
+    
+    /**
+     * Polls a job's status every second, showing its progress, until it finishes
+     * @param {string} jobId - The job's id
+     * @returns {Promise<Object>} The job's result
+     */
+    function pollJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                // a newer job replaced this one
+                if (jobId !== currentJobId) {
+                    reject(new Error('Job replaced'));
+                    return;
+                }
+                fetch(`/jobs/${jobId}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! Status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(status => {
+                    if (status.state === 'done') {
+                        currentJobId = null;
+                        return fetch(`/jobs/${jobId}/result`).then(response => response.json()).then(resolve);
+                    }
+                    if (status.state === 'failed' || status.state === 'cancelled') {
+                        throw new Error(`Job ${status.state}`);
+                    }
+                    statusBadge.textContent = describeJobProgress(status);
+                    setTimeout(poll, 1000);
+                })
+                .catch(reject);
+            };
+            poll();
         });
     }
     
+    /**
+     * Short text for a running or queued job's status badge
+     * @param {Object} status - The job status reported by the server
+     * @returns {string} The progress text
+     */
+    function describeJobProgress(status) {
+        const progress = status.progress;
+        if (status.state === 'queued') {
+            return `Queued (#${status.queue_position})`;
+        }
+        if (progress.phase === 'training' && progress.total) {
+            return `Training ${progress.completed}/${progress.total}`;
+        }
+        if (progress.phase === 'playing') {
+            return 'Playing';
+        }
+        return 'Processing';
+    }
+    
     /**
      * Gets all current simulation settings from the form
      * @returns {Object} The simulation settings
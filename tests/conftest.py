@@ -0,0 +1,43 @@
+import contextlib
+import io
+
+import pytest
+
+from CodeBase.Agent import Agent
+from CodeBase.Settings import Settings
+from CodeBase.Simulation import Simulation
+
+
+@pytest.fixture(autouse=True)
+def fresh_shared_policy():
+    """Every test starts without the class-level shared RL state of earlier tests"""
+    yield
+    Agent.shared_policy_net = Agent.shared_target_net = Agent.shared_optimizer = None
+    Agent.shared_memory = Agent.shared_schedule = Agent.shared_inference = Agent.frozen_policy = None
+    Agent.shared_update_counter = 0
+
+
+@pytest.fixture
+def make_simulation():
+    """Factory of quiet simulations built from the auto-config settings with seed 0 and any settings overridden.
+
+    Given agent_types, number_of_agents follows it; given number_of_agents
+    alone, the agents are one RL agent and Random ones. fresh_policy=True
+    restarts the shared RL state from the seed, as a new training would.
+    """
+    def make(fresh_policy=False, **overrides):
+        settings = Settings(auto_config=True)
+        settings.seed = 0
+        if "agent_types" in overrides:
+            overrides["agent_types"] = list(overrides["agent_types"])
+            settings.number_of_agents = len(overrides["agent_types"])
+        elif "number_of_agents" in overrides:
+            settings.agent_types = ["RL"] + ["Random"] * (overrides["number_of_agents"] - 1)
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        with contextlib.redirect_stdout(io.StringIO()):
+            simulation = Simulation(settings)
+        if fresh_policy:
+            Agent.reset_shared_policy(simulation.env.agents_list, settings)
+        return simulation
+    return make
@@ -0,0 +1,67 @@
+"""Resumable training checkpoints"""
+import contextlib
+import io
+import os
+import time
+
+import pytest
+import torch
+
+from CodeBase.Agent import Agent
+from CodeBase.CheckpointManager import CheckpointManager
+
+
+class Interrupted(Exception):
+    pass
+
+
+TRAINING = dict(agent_types=["RL"] * 3, max_iteration=2000,  # 20 training subgames
+                hidden_size=16, checkpoint_interval=3, fresh_policy=True)
+
+
+def train(simulation, progress=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.train(progress=progress)
+
+
+def stop_after(subgames):
+    def progress(completed, total):
+        if completed == subgames:
+            raise Interrupted
+    return progress
+
+
+def test_resumed_training_matches_an_uninterrupted_run(tmp_path, monkeypatch, make_simulation):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    uninterrupted = make_simulation(checkpoint_dir=str(tmp_path / "uninterrupted"), **TRAINING)
+    train(uninterrupted)
+    weights = {name: tensor.clone() for name, tensor in Agent.shared_policy_net.state_dict().items()}
+    epsilons = [agent.epsilon for agent in uninterrupted.env.agents_list]
+
+    # interrupted during subgame 7, after the checkpoint of subgame 6:
+    interrupted = make_simulation(checkpoint_dir=str(tmp_path / "interrupted"), **TRAINING)
+    with pytest.raises(Interrupted):
+        train(interrupted, stop_after(7))
+    interrupted.checkpoints.wait()
+    resumed = make_simulation(checkpoint_dir=str(tmp_path / "interrupted"), resume_training=True, **TRAINING)
+    train(resumed)
+
+    assert [agent.epsilon for agent in resumed.env.agents_list] == epsilons
+    stream, expected = resumed.random_stream.state_dict(), uninterrupted.random_stream.state_dict()
+    assert (stream["generator"], stream["position"]) == (expected["generator"], expected["position"])
+    for name, tensor in Agent.shared_policy_net.state_dict().items():
+        assert torch.equal(tensor, weights[name]), name
+
+
+def test_only_the_newest_checkpoints_are_kept(tmp_path, make_simulation):
+    simulation = make_simulation(checkpoint_dir=str(tmp_path), **TRAINING)
+    checkpoints = CheckpointManager(str(tmp_path), keep=1)
+    for subgame_count in (3, 6, 9):
+        checkpoints.save(simulation, subgame_count)
+    checkpoints.wait()
+    assert os.listdir(tmp_path) == ["checkpoint_000009.pt"]
+
+
+def test_keeping_no_checkpoints_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        CheckpointManager(str(tmp_path), keep=0)
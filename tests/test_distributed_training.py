@@ -0,0 +1,116 @@
+"""Supervision of the parallel training modes' worker processes
+
+The worker functions live at module level for the spawn start method; CodeBase.DistributedTraining
+(and with it torch) is imported inside the tests so the spawned workers start quickly.
+"""
+import multiprocessing as mp
+import os
+
+import pytest
+
+
+def finish_worker(worker_id, queue, subgames):
+    for _ in range(subgames):
+        queue.put(('subgame', worker_id))
+    queue.put(('done', worker_id))
+
+
+def crash_worker(worker_id, queue, subgames):
+    queue.put(('subgame', worker_id))
+    os._exit(3)
+
+
+def start(context, queue, targets):
+    processes = [context.Process(target=target, args=(worker_id, queue, 2), daemon=True)
+                 for worker_id, target in enumerate(targets)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def test_split_subgames():
+    from CodeBase.DistributedTraining import split_subgames
+    assert split_subgames(10, 3) == [4, 3, 3]
+    assert sum(split_subgames(7, 4)) == 7
+
+
+def test_supervise_workers_reports_progress():
+    from CodeBase.DistributedTraining import supervise_workers
+    context = mp.get_context('spawn')
+    queue = context.Queue()
+    processes = start(context, queue, [finish_worker, finish_worker])
+    reports = []
+    supervise_workers(queue, processes, 4, progress=lambda done, total: reports.append((done, total)),
+                      poll_interval=0.1)
+    assert reports == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert all(process.exitcode == 0 for process in processes)
+
+
+def test_supervise_workers_raises_when_a_worker_dies():
+    from CodeBase.DistributedTraining import supervise_workers
+    context = mp.get_context('spawn')
+    queue = context.Queue()
+    processes = start(context, queue, [finish_worker, crash_worker])
+    with pytest.raises(RuntimeError, match="Worker 1 exited with code 3"):
+        supervise_workers(queue, processes, 4, poll_interval=0.1)
+    assert not any(process.is_alive() for process in processes)
+
+
+def test_hogwild_trainer_raises_when_a_worker_dies(monkeypatch, make_simulation):
+    from CodeBase import DistributedTraining
+    from CodeBase.Agent import Agent
+
+    simulation = make_simulation()
+    trainer = DistributedTraining.HogwildTrainer(simulation, 2)
+    monkeypatch.setattr(DistributedTraining, "start_workers",
+                        lambda context, target, settings, max_subgames, num_workers, queue, *args:
+                        start(context, queue, [finish_worker, crash_worker]))
+    target_version = Agent.shared_target_version
+    with pytest.raises(RuntimeError, match="partial update"):
+        trainer.train(4)
+    assert Agent.shared_target_version == target_version
+
+
+def train_in_workers(make_simulation, training_mode, monkeypatch):
+    """Train two RL agents with two real worker processes; returns the simulation and the policy before training"""
+    import contextlib
+    import io
+    import time
+    from CodeBase.Agent import Agent
+
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    simulation = make_simulation(agent_types=["RL", "RL"], max_iteration=2000,  # 20 training subgames
+                                 hidden_size=16, training_mode=training_mode, num_workers=2, fresh_policy=True)
+    before = {name: tensor.clone() for name, tensor in Agent.shared_policy_net.state_dict().items()}
+    version = Agent.shared_policy_version
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.train()
+    assert Agent.shared_policy_version > version
+    return simulation, before
+
+
+def assert_trained(simulation, before):
+    import torch
+    from CodeBase.Agent import Agent
+    settings = simulation.settings
+    # the workers' exploration decay carries over to the final game:
+    for agent in simulation.env.agents_list:
+        assert settings.min_epsilon <= agent.epsilon < settings.initial_epsilon
+    assert any(not torch.equal(tensor, before[name]) for name, tensor in Agent.shared_policy_net.state_dict().items())
+
+
+def test_distributed_training_trains_the_simulations_agents(monkeypatch, make_simulation):
+    assert_trained(*train_in_workers(make_simulation, "distributed", monkeypatch))
+
+
+def test_hogwild_training_trains_the_simulations_agents(monkeypatch, make_simulation):
+    assert_trained(*train_in_workers(make_simulation, "hogwild", monkeypatch))
+
+
+def test_worker_epsilon_decay_is_combined(make_simulation):
+    from CodeBase.DistributedTraining import merge_epsilons
+
+    simulation = make_simulation(agent_types=["RL", "Random", "RL"], initial_epsilon=1.0)
+    merge_epsilons(simulation, [[0.5, None, 0.9], [0.5, None, 0.01]])
+    assert [agent.epsilon for agent in simulation.env.agents_list] == [
+        0.25, 1.0, simulation.settings.min_epsilon]
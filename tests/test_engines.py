@@ -0,0 +1,112 @@
+"""Seeded equivalence of the combat engines (GameStatusUpdate is the reference)"""
+import numpy as np
+import pytest
+
+from CodeBase.SparseGameStatusUpdate import LivingAgents
+
+
+def random_game(make_simulation, engine, seed, number_of_agents=6, starting_health_config=1, anim_profile=1):
+    return make_simulation(agent_types=["Random"] * number_of_agents, starting_health_config=starting_health_config,
+                           anim_profile=anim_profile, combat_engine=engine, seed=seed)
+
+
+def play(simulation, max_steps=200):
+    """Step a game with random agents; returns the state and rewards after every step"""
+    steps = []
+    for t in range(max_steps):
+        simulation.env.buffers.begin()
+        simulation.choose_actions(t)
+        simulation.game_status_update.update(simulation.env)
+        simulation.env.buffers.commit()
+        state = simulation.env.state
+        steps.append({
+            "health": state.health_ticks.copy(),
+            "observed": state.observed_ticks.copy(),
+            "partner": state.partner.copy(),
+            "animosity": state.animosity.copy(),
+            "alive": state.alive.copy(),
+            "alliance_status": state.alliance_status.copy(),
+            "reward": np.array([agent.current_reward for agent in simulation.env.agents_list]),
+        })
+        if state.alive_count <= 1:
+            break
+    return steps
+
+
+@pytest.mark.parametrize("config", [(6, 1, 1), (5, 2, 3), (8, 3, 2)])
+def test_vectorized_engine_reproduces_loop_engine(config, make_simulation):
+    for seed in range(10):
+        loop = play(random_game(make_simulation, "loop", seed, *config))
+        vectorized = play(random_game(make_simulation, "vectorized", seed, *config))
+        assert len(loop) == len(vectorized)
+        for t, (expected, actual) in enumerate(zip(loop, vectorized)):
+            for key in expected:
+                assert np.allclose(expected[key], actual[key]), (seed, t, key)
+
+
+# (health ticks, alliance pairs, actions) of single steps; with 6 agents, action 6 + j proposes to j,
+# 12 defends, 13 recovers and 14 + j accepts j's proposal
+SCENARIOS = [
+    # attackers that kill each other, a defender and a recovering agent under attack:
+    ([1, 2, 1, 3, 20, 2], [], [1, 0, 12, 2, 13, 4]),
+    # an accepted proposal that betrays an existing alliance, the betrayed ally attacking late in the turn:
+    ([2, 1, 3, 2, 4, 3], [(2, 5)], [6 + 2, 14 + 0, 0, 1, 13, 2]),
+    # everyone attacking a weak agent that defends:
+    ([3, 2, 2, 2, 2, 2], [(1, 2)], [12, 0, 0, 0, 0, 0]),
+]
+
+
+def step_outcomes(make_simulation, engine, scenario, repeats, seed=0):
+    """Outcomes of one scenario step, repeated from the same state with fresh draws"""
+    health, pairs, actions = scenario
+    simulation = random_game(make_simulation, engine, seed, number_of_agents=len(health))
+    env = simulation.env
+    state = env.state
+    env.buffers.begin()
+    state.health_ticks[:] = health
+    state.observed_ticks[:] = np.array(health)[None, :]
+    for i, j in pairs:
+        env.agents_list[i].alliance_pair = env.agents_list[j]
+        env.agents_list[j].alliance_pair = env.agents_list[i]
+        state.alliance_status[[i, j]] = simulation.settings.alliance_status_weight
+    env.buffers.commit()
+
+    outcomes = []
+    for _ in range(repeats):
+        env.buffers.begin()
+        for agent, action in zip(env.agents_list, actions):
+            agent.latest_action = action
+        simulation.game_status_update.update(env)
+        outcomes.append(np.concatenate([
+            state.health_ticks, state.alive, state.partner, state.animosity.ravel(),
+            state.observed_ticks.ravel(), [agent.current_reward for agent in env.agents_list]]))
+    env.buffers.rollback()
+    return np.array(outcomes, dtype=float)
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "sparse"])
+@pytest.mark.parametrize("scenario", range(len(SCENARIOS)))
+def test_engine_outcome_distributions_match_loop_engine(engine, scenario, make_simulation):
+    repeats = 3000
+    expected = step_outcomes(make_simulation, "loop", SCENARIOS[scenario], repeats, seed=1)
+    actual = step_outcomes(make_simulation, engine, SCENARIOS[scenario], repeats, seed=2)
+    standard_error = np.sqrt((expected.var(axis=0) + actual.var(axis=0)) / repeats)
+    difference = np.abs(expected.mean(axis=0) - actual.mean(axis=0))
+    assert np.all(difference <= 5 * standard_error + 1e-9)
+
+
+
+def test_living_agents_count_and_index_the_agents_alive_now():
+    alive = np.array([True, False, True, True, True, False, True, True])
+    living = LivingAgents(alive)
+    living.kill(2)
+    living.kill(4)
+    now = [0, 3, 6, 7]
+    assert living.count(0, 8) == 4
+    assert living.count(3, 7) == 2
+    assert living.count(5, 6) == 0
+    for start in range(8):
+        for excluded in (None, 3, 6):
+            expected = [j for j in now if j >= start and j != excluded]
+            got = [living.nth(start, k, -1 if excluded is None else excluded) for k in range(len(expected))]
+            assert got == expected
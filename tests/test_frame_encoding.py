@@ -0,0 +1,42 @@
+"""Delta encoding of animation frames"""
+import numpy as np
+
+from frame_encoding import decode_frames, encode_frames
+
+
+def make_frames(steps=120, agents=6, seed=0):
+    """Frames of a game in which agents change rarely, with a skipped step and a final frame with extra keys"""
+    generator = np.random.default_rng(seed)
+    health, alive, ally = [10] * agents, [1] * agents, [-1] * agents
+    frames = []
+    for step in range(steps):
+        if generator.random() < 0.3:
+            agent = int(generator.integers(agents))
+            health[agent] = max(0, health[agent] - 1)
+            alive[agent] = int(health[agent] > 0)
+            ally[agent] = int(generator.integers(-1, agents))
+        frames.append({'step': step + (step >= 70), 'health': list(health), 'alive': list(alive),
+                       'ally': list(ally)})
+    frames[-1].update(game_over_message='Agent 0 wins', duration=5000)
+    return frames
+
+
+def test_decoding_restores_every_frame():
+    frames = make_frames()
+    records = list(encode_frames(frames, keyframe_interval=25))
+    assert list(decode_frames(records)) == frames
+    assert any('repeat' in record for record in records)
+    assert len(records) < len(frames)
+
+
+def test_keyframes_are_full_frames_at_the_interval_and_after_a_skipped_step():
+    frames = make_frames()
+    steps, keyframes = 0, []
+    for record in encode_frames(frames, keyframe_interval=25):
+        if 'repeat' in record:
+            steps += record['repeat']
+            continue
+        if 'changes' not in record:
+            keyframes.append(steps)
+        steps += 1
+    assert keyframes == [0, 25, 50, 70, 95]
@@ -0,0 +1,68 @@
+"""Frozen inference policies of the final game"""
+import contextlib
+import io
+
+from CodeBase.Agent import Agent
+from CodeBase.Settings import Settings
+
+
+def test_final_game_runs_the_eager_policy_by_default():
+    settings = Settings(auto_config=True)
+    assert settings.inference_backend == "eager"
+    assert settings.export_formats == ()
+
+
+def test_frozen_policy_is_built_once_per_weights_version(make_simulation):
+    simulation = make_simulation(max_iteration=30, batch_size=4, inference_backend="torchscript")
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.start_final_game()
+        frozen = Agent.shared_inference
+        assert frozen is not None
+        simulation.start_final_game()
+        assert Agent.shared_inference is frozen
+
+        # training changes the weights, so the next final game freezes them again:
+        version = Agent.shared_policy_version
+        simulation.play_training_subgame()
+        assert Agent.shared_policy_version > version
+        simulation.start_final_game()
+        assert Agent.shared_inference is not frozen
+    Agent.use_inference_backend("eager", simulation.settings.number_of_agents)
+
+
+def test_quantized_policy_exports_and_loads_back(tmp_path):
+    import torch
+    from CodeBase.DQNModel import AgentNetwork
+    from CodeBase.PolicyExport import export_policy, load_backend, quantize_policy, valid_action_masks
+
+    torch.manual_seed(0)
+    policy_net = AgentNetwork(5, 16, 14)
+    quantized = quantize_policy(policy_net)
+    assert any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in quantized.modules())
+
+    masks = valid_action_masks(4)
+    path = str(tmp_path / "agent")
+    assert export_policy(path, policy_net, masks, formats=("quantized",)) == [f"{path}_shared_policy_int8.pt"]
+    loaded = load_backend(path, "quantized")
+    states = torch.rand(8, 5)
+    agent_ids = torch.arange(8) % 4
+    q_values = loaded(states, agent_ids)
+    # the agents' own attack, proposal and acceptance stay masked, the rest is close to the float policy:
+    assert torch.equal(torch.isinf(q_values), ~torch.as_tensor(masks)[agent_ids])
+    expected = policy_net(states)
+    valid = ~torch.isinf(q_values)
+    assert torch.allclose(q_values[valid], expected[valid], atol=0.05)
+
+
+def test_policy_evaluation_compares_the_backend_with_the_float_policy(make_simulation):
+    from CodeBase.PolicyEvaluation import PolicyEvaluation
+
+    simulation = make_simulation(agent_types=["RL", "RL", "Random", "Random"], max_iteration=50, fresh_policy=True)
+    health = list(simulation.env.health_list)
+
+    result = PolicyEvaluation(simulation, games=3).evaluate("quantized")
+    assert result["games"] == 3 and result["decisions"] > 0
+    for name in ("action_agreement", "float_win_rate", "backend_win_rate"):
+        assert 0.0 <= result[name] <= 1.0
+    # the simulation is left at its initial state:
+    assert list(simulation.env.health_list) == health
@@ -0,0 +1,129 @@
+"""JobQueue job states, capacity, cancellation and stream jobs (runners are module level for spawn)"""
+import os
+import time
+
+import pytest
+
+from job_queue import JobQueue, QueueFull
+
+
+def echo(data, progress):
+    progress('working', 1, 2)
+    return {'echo': data}
+
+
+def sleep(data, progress):
+    time.sleep(60)
+
+
+def pid(data, progress):
+    return os.getpid()
+
+
+def fail(data, progress):
+    raise ValueError('boom')
+
+
+def count(data, progress):
+    progress('counting')
+    for i in range(data['n']):
+        yield {'i': i}
+
+
+def endless(data, progress):
+    i = 0
+    while True:
+        yield {'i': i}
+        i += 1
+        time.sleep(0.01)
+
+
+RUNNERS = {'echo': echo, 'pid': pid, 'sleep': sleep, 'fail': fail}
+STREAMS = {'count': count, 'endless': endless}
+
+
+@pytest.fixture
+def jobs():
+    job_queue = JobQueue(RUNNERS, STREAMS, max_workers=1, max_queued=1, stream_buffer=4)
+    yield job_queue
+    job_queue.shutdown()
+
+
+def wait_for(job_queue, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = job_queue.status(job_id)
+        if status['state'] not in ('queued', 'running'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result_and_progress(jobs):
+    job_id = jobs.submit('echo', {'x': 1})
+    status = wait_for(jobs, job_id)
+    assert status['state'] == 'done'
+    assert status['progress'] == {'phase': 'working', 'completed': 1, 'total': 2}
+    assert jobs.result(job_id)[1] == {'echo': {'x': 1}}
+
+
+def test_failed_job_reports_the_error(jobs):
+    job_id = jobs.submit('fail', {})
+    status = wait_for(jobs, job_id)
+    assert status['state'] == 'failed'
+    assert 'ValueError: boom' in status['error']
+
+
+def test_queue_full_and_cancel(jobs):
+    with pytest.raises(KeyError):
+        jobs.submit('unknown', {})
+    running = jobs.submit('sleep', {})
+    queued = jobs.submit('sleep', {})
+    assert jobs.status(running)['state'] == 'running'
+    assert jobs.status(queued)['queue_position'] == 1
+    with pytest.raises(QueueFull):
+        jobs.submit('sleep', {})
+
+    assert jobs.cancel(queued)['state'] == 'cancelled'
+    process = jobs.jobs[running].worker.process
+    assert jobs.cancel(running)['state'] == 'cancelled'
+    assert not process.is_alive()
+    assert jobs.cancel('unknown') is None
+
+
+def test_stream_yields_progress_then_records(jobs):
+    stream = jobs.stream('count', {'n': 3})
+    assert list(stream) == [{'phase': 'counting', 'completed': None, 'total': None, 'type': 'progress'},
+                            {'i': 0}, {'i': 1}, {'i': 2}]
+    assert jobs.status(stream.job_id)['state'] == 'done'
+
+
+def test_closing_a_stream_cancels_its_job(jobs):
+    stream = jobs.stream('endless', {})
+    assert next(stream) == {'i': 0}
+    process = jobs.jobs[stream.job_id].worker.process
+    stream.close()
+    assert jobs.status(stream.job_id)['state'] == 'cancelled'
+    assert not process.is_alive()
+    # the worker is free for the next job:
+    assert wait_for(jobs, jobs.submit('echo', {}))['state'] == 'done'
+
+
+def test_workers_are_reused_and_replaced_after_a_cancel(jobs):
+    worker = jobs.workers[0].process.pid
+    assert [jobs.result(wait_for(jobs, jobs.submit('pid', {}))['job_id'])[1] for _ in range(2)] == [worker, worker]
+    jobs.cancel(jobs.submit('sleep', {}))
+    replacement = jobs.result(wait_for(jobs, jobs.submit('pid', {}))['job_id'])[1]
+    assert replacement != worker
+    assert len(jobs.workers) == 1
+
+
+def test_stream_blocks_the_worker_while_the_client_is_behind(jobs):
+    stream = jobs.stream('count', {'n': 20000})
+    assert next(stream)['type'] == 'progress'
+    time.sleep(1)
+    # the web process holds at most the buffer (and the end marker slot), the worker waits on its pipe:
+    assert jobs.status(stream.job_id)['state'] == 'running'
+    assert stream.job.records.qsize() <= 4
+    assert sum(1 for _ in stream) == 20000
+    assert jobs.status(stream.job_id)['state'] == 'done'
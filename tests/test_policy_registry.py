@@ -0,0 +1,65 @@
+"""Trained-policy registry of the web endpoints"""
+import os
+import time
+
+import pytest
+import torch
+
+from CodeBase.Agent import Agent
+from CodeBase.Settings import Settings
+from policy_registry import PolicyRegistry, settings_key
+
+
+def test_key_only_depends_on_training_fields():
+    settings = Settings(auto_config=True)
+    key = settings_key(settings)
+    for name, value in [('combat_engine', 'sparse'), ('num_parallel_games', 8), ('training_mode', 'hogwild'),
+                        ('seed', 7), ('inference_backend', 'torchscript'), ('checkpoint_interval', 5)]:
+        setattr(settings, name, value)
+    assert settings_key(settings) == key
+    settings.learning_rate = 0.01
+    assert settings_key(settings) != key
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, make_simulation):
+    registry = PolicyRegistry(str(tmp_path), capacity=2)
+    simulations = [make_simulation(number_of_agents=4, hidden_size=size) for size in (8, 16, 32)]
+    for simulation in simulations[:2]:
+        registry.restore(simulation)
+        registry.store(simulation)
+        time.sleep(0.02)
+    assert registry.restore(simulations[0])  # a hit makes the first entry the most recently used
+    time.sleep(0.02)
+    registry.restore(simulations[2])
+    registry.store(simulations[2])
+
+    cached = set(os.listdir(tmp_path))
+    assert cached == {f"{settings_key(simulations[i].settings)}.pt" for i in (0, 2)}
+
+
+def test_miss_trains_from_a_fresh_policy_sized_for_the_request(tmp_path, make_simulation):
+    registry = PolicyRegistry(str(tmp_path))
+    small = make_simulation(number_of_agents=4)
+    assert not registry.restore(small)
+    with torch.no_grad():
+        for parameter in Agent.shared_policy_net.parameters():
+            parameter.fill_(0.5)
+    registry.store(small)
+
+    # another configuration in the same process starts over, with its own network shape:
+    large = make_simulation(number_of_agents=6)
+    assert not registry.restore(large)
+    agent = large.env.agents_list[0]
+    assert agent.policy_net is Agent.shared_policy_net
+    assert Agent.shared_policy_net(torch.zeros(1, agent.state_size)).shape == (1, agent.action_size)
+    assert not all(torch.all(parameter == 0.5) for parameter in Agent.shared_policy_net.parameters())
+
+    # and the first configuration's cached policy still loads:
+    again = make_simulation(number_of_agents=4)
+    assert registry.restore(again)
+    assert all(torch.all(parameter == 0.5) for parameter in Agent.shared_policy_net.parameters())
+
+
+def test_capacity_below_one_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        PolicyRegistry(str(tmp_path), capacity=0)
@@ -0,0 +1,35 @@
+"""Sum-tree backed prioritized experience replay"""
+import numpy as np
+
+from CodeBase.DQNModel import PrioritizedReplayBuffer, SumTree
+
+
+def test_sum_tree_finds_the_leaf_covering_each_prefix_sum():
+    generator = np.random.default_rng(0)
+    tree = SumTree(100)
+    priorities = generator.random(100)
+    priorities[::7] = 0.0
+    tree.update(np.arange(100), priorities)
+    # updating some leaves again, with repeats in one call:
+    indices = generator.integers(100, size=40)
+    priorities[indices] = generator.random(40)
+    tree.update(indices, priorities[indices])
+
+    assert np.isclose(tree.total(), priorities.sum())
+    values = generator.random(10000) * priorities.sum()
+    expected = np.searchsorted(np.cumsum(priorities), values, side='right')
+    assert np.array_equal(tree.find(values), expected)
+    assert not np.isin(tree.find(values), np.flatnonzero(priorities == 0)).any()
+
+
+def test_sampling_follows_priorities_and_weights_correct_for_them():
+    buffer = PrioritizedReplayBuffer(4, alpha=1.0, epsilon=0.0)
+    for action in range(4):
+        buffer.push(np.zeros(2), action, 0.0, np.zeros(2), False)
+    buffer.update_priorities(np.arange(4), [1.0, 2.0, 3.0, 4.0])
+
+    np.random.seed(0)
+    counts = np.bincount(np.concatenate([buffer.sample_indices(4) for _ in range(5000)]), minlength=4)
+    assert np.allclose(counts / counts.sum(), [0.1, 0.2, 0.3, 0.4], atol=0.01)
+    buffer.beta = 1.0
+    assert np.allclose(buffer.importance_weights(np.arange(4)), [1.0, 0.5, 1 / 3, 0.25])
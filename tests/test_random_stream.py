@@ -0,0 +1,47 @@
+"""Per-simulation seeded random streams"""
+import contextlib
+import io
+
+import torch
+
+from CodeBase.Agent import Agent
+
+
+def final_game(make_simulation, seed, agent_types=("Random",) * 5):
+    # random starting health, drawn from the stream too:
+    simulation = make_simulation(agent_types=agent_types, starting_health_config=3, hidden_size=16, seed=seed)
+    simulation.start_final_game()
+    return simulation
+
+
+def step(simulation):
+    """Play one step and return what it did: every agent's action, health and alive flag"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.update_time_step()
+    return ([agent.latest_action for agent in simulation.env.agents_list], list(simulation.env.health_list),
+            [agent.is_alive for agent in simulation.env.agents_list])
+
+
+def test_same_seed_replays_the_same_game_while_another_simulation_runs(make_simulation):
+    first, second, other = (final_game(make_simulation, seed) for seed in (3, 3, 4))
+    first_steps, second_steps, other_steps = [], [], []
+    # stepping the simulations in turn, as concurrent requests in one web worker would:
+    for _ in range(30):
+        first_steps.append(step(first))
+        other_steps.append(step(other))
+        second_steps.append(step(second))
+    assert first_steps == second_steps
+    assert first_steps != other_steps
+
+
+def test_same_seed_trains_the_same_policy(make_simulation):
+    weights = []
+    for _ in range(2):
+        simulation = final_game(make_simulation, 3, ("RL", "RL", "Random", "Random"))
+        Agent.reset_shared_policy(simulation.env.agents_list, simulation.settings)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(3):
+                simulation.play_training_subgame()
+        weights.append({name: tensor.clone() for name, tensor in Agent.shared_policy_net.state_dict().items()})
+    for name, tensor in weights[0].items():
+        assert torch.equal(tensor, weights[1][name]), name
@@ -0,0 +1,66 @@
+"""Rolling-hash stalemate detection, on its own and in the lockstep VectorEnvironment"""
+import contextlib
+import io
+
+import numpy as np
+
+from CodeBase.Settings import Settings
+from CodeBase.Simulation import Simulation
+from CodeBase.StalemateDetector import StalemateDetector
+from CodeBase.VectorEnvironment import VectorEnvironment
+
+
+def make_settings(window=8, patience=3):
+    settings = Settings(auto_config=True)
+    settings.stalemate_window = window
+    settings.stalemate_patience = patience
+    return settings
+
+
+def test_incremental_hash_matches_a_fresh_hash():
+    rng = np.random.default_rng(0)
+    n = 12
+    detector = StalemateDetector(n, make_settings())
+    health = rng.integers(0, 21, n)
+    partner = np.full(n, -1)
+    alive = np.ones(n, dtype=bool)
+    for _ in range(200):
+        agent = rng.integers(n)
+        health[agent] = rng.integers(0, 21)
+        alive[agent] = rng.random() < 0.8
+        partner[agent] = rng.integers(-1, n)
+        allied = partner >= 0
+        fresh = StalemateDetector(n, make_settings())
+        assert detector.update_hash(health, partner, allied, alive) == fresh.update_hash(health, partner, allied, alive)
+
+
+def test_window_one_only_counts_unchanged_states():
+    n = 3
+    alive = np.ones(n, dtype=bool)
+    partner = np.full(n, -1)
+    states = [np.array([5, 5, 5]), np.array([4, 5, 5])]
+
+    cycling = StalemateDetector(n, make_settings(window=1, patience=3))
+    assert not any(cycling.observe_arrays(states[t % 2], partner, partner >= 0, alive) for t in range(20))
+
+    cycling = StalemateDetector(n, make_settings(window=8, patience=3))
+    flags = [cycling.observe_arrays(states[t % 2], partner, partner >= 0, alive) for t in range(6)]
+    assert flags == [False, False, False, False, True, True]
+    assert cycling.period == 2
+
+    unchanged = StalemateDetector(n, make_settings(window=1, patience=3))
+    flags = [unchanged.observe_arrays(states[0], partner, partner >= 0, alive) for t in range(5)]
+    assert flags == [False, False, False, True, True]
+
+
+def test_vector_environment_resets_stalemated_games():
+    settings = make_settings(patience=2)
+    settings.agent_types = ["Random"] * settings.number_of_agents
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation = Simulation(settings)
+    vector_env = VectorEnvironment(simulation.env, 3, settings, simulation.transition_tables)
+    # a kernel under which nothing ever changes:
+    vector_env.resolve = lambda *arrays: np.zeros(vector_env.health.shape)
+
+    assert [vector_env.step() for _ in range(3)] == [0, 0, 3]
+    assert np.all(vector_env.t == 0)
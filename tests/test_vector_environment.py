@@ -0,0 +1,70 @@
+"""Lockstep training on a VectorEnvironment"""
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+
+from CodeBase.Agent import Agent
+from CodeBase.SparseGameStatusUpdate import SparseGameStatusUpdate
+from CodeBase.VectorEnvironment import VectorEnvironment
+from CodeBase.VectorizedGameStatusUpdate import VectorizedGameStatusUpdate
+
+
+@pytest.mark.parametrize("engine, kernel", [("loop", VectorizedGameStatusUpdate),
+                                            ("vectorized", VectorizedGameStatusUpdate),
+                                            ("sparse", SparseGameStatusUpdate)])
+def test_vector_environment_uses_the_combat_engine(engine, kernel, make_simulation):
+    simulation = make_simulation(combat_engine=engine, agent_types=["Random"] * 6)
+    vector_env = VectorEnvironment(simulation.env, 3, simulation.settings, simulation.transition_tables,
+                                   simulation.settings.combat_engine)
+    assert isinstance(vector_env.kernel, kernel)
+    for _ in range(20):
+        vector_env.step()
+    assert np.all(vector_env.health >= 0)
+
+
+def test_lockstep_training_writes_checkpoints(tmp_path, make_simulation):
+    simulation = make_simulation(max_iteration=100, num_parallel_games=4, checkpoint_interval=5, checkpoint_keep=3,
+                                 checkpoint_dir=str(tmp_path))
+    simulation.max_subgames = 12
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.train_vectorized()
+    names = sorted(os.listdir(tmp_path))
+    assert names[-1] == "checkpoint_000012.pt"
+    assert len(names) <= 3
+
+
+def make_vector_env(make_simulation, num_games=3, agent_types=("RL", "RL", "Random", "Random", "Heuristic", "Random")):
+    simulation = make_simulation(agent_types=agent_types, fresh_policy=True)
+    return VectorEnvironment(simulation.env, num_games, simulation.settings, simulation.transition_tables)
+
+
+def test_step_learns_one_transition_per_game_an_rl_agent_was_alive_in(make_simulation):
+    vector_env = make_vector_env(make_simulation)
+    vector_env.step()
+    assert len(Agent.shared_memory) == 3 * 2
+
+    # agent 1 is dead in game 0 only, agent 0 in every game:
+    vector_env.reset()
+    vector_env.alive[0, 1] = False
+    vector_env.alive[:, 0] = False
+    epsilons = [agent.epsilon for agent in vector_env.agents_list[:2]]
+    vector_env.step()
+    assert len(Agent.shared_memory) == 6 + 2
+    # exploration only decays for an agent still playing some game, as in the single-game path:
+    assert vector_env.agents_list[0].epsilon == epsilons[0]
+    assert vector_env.agents_list[1].epsilon < epsilons[1]
+
+
+def test_finished_games_are_reset_while_the_others_keep_going(make_simulation):
+    vector_env = make_vector_env(make_simulation, num_games=3, agent_types=("Random",) * 6)
+    vector_env.step()
+    vector_env.alive[0, 1:] = False  # game 0 is won by agent 0
+    vector_env.t[1] = vector_env.settings.max_iteration - 1  # game 1 reaches max_iteration
+    vector_env.step()
+    assert vector_env.t.tolist() == [0, 0, 2]
+    for k in (0, 1):
+        assert np.array_equal(vector_env.health[k], vector_env.initial_health)
+        assert np.array_equal(vector_env.alive[k], vector_env.initial_alive)